@@ -0,0 +1,458 @@
+"""SQLite 数据库管理器命令行模式：复用 Database_Engine 中的功能，不加载 PyQt5，适合计划任务和脚本
+
+退出码: 0 成功；1 检查未通过（完整性检查、备份验证失败或比较发现差异）；2 出错；130 已取消。
+
+示例:
+    python Database_CLI.py backup app.db app.db.backup --mode incremental
+    python Database_CLI.py export app.db dump.sql.gz
+    python Database_CLI.py query app.db "SELECT * FROM users LIMIT 10" --format markdown
+"""
+import argparse
+import csv
+import io
+import os
+import pathlib
+import signal
+import sqlite3
+import statistics
+import sys
+import time
+
+from Database_Engine import (ProjectInfo, OperationCanceled, COPY_FORMATS, perform_backup, verify_backup,
+                             restore_backup_online, is_encrypted_file, analyze_csv_file, import_csv_file,
+                             analyze_jsonl_file, import_jsonl_file, import_sql_file, iter_sql_statements,
+                             export_plan, export_query, export_tables_parallel, default_export_workers,
+                             list_export_tables, write_cursor_jsonl, format_rows, quote_identifier,
+                             diff_databases, format_diff_report)
+
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+EXIT_CANCELED = 130
+
+
+class ProgressPrinter:
+    """在标准错误输出的同一行上显示进度；不是终端或指定 --quiet 时不显示"""
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last = ""
+    
+    def __call__(self, percent, message=None):
+        if not self.enabled:
+            return
+        line = f"\r{percent:3d}% {message or ''}"
+        if line != self.last:
+            sys.stderr.write(line + " " * max(0, len(self.last) - len(line)))
+            sys.stderr.flush()
+            self.last = line
+    
+    def finish(self):
+        if self.enabled and self.last:
+            sys.stderr.write("\n")
+            self.last = ""
+
+
+class CancelOnInterrupt:
+    """第一次按 Ctrl+C 时请求取消，由引擎在安全点停止并回滚；再次按下时立即中断"""
+    def __init__(self):
+        self.canceled = False
+    
+    def __enter__(self):
+        self.previous = signal.signal(signal.SIGINT, self.handle)
+        return self
+    
+    def __exit__(self, *exc_info):
+        signal.signal(signal.SIGINT, self.previous)
+    
+    def handle(self, signum, frame):
+        if self.canceled:
+            raise KeyboardInterrupt()
+        self.canceled = True
+        sys.stderr.write("\n正在取消...\n")
+    
+    def __call__(self):
+        return self.canceled
+
+
+def open_database(db_path, read_only=False, create=False):
+    """打开数据库文件；加密文件和不存在的文件给出明确的错误
+    
+    只有 create 为 True 时（导入、恢复）才会创建新数据库，避免路径写错时对一个空库执行备份等操作。
+    """
+    if not create and not os.path.exists(db_path):
+        raise FileNotFoundError(f"数据库文件不存在: {db_path}")
+    if os.path.exists(db_path) and is_encrypted_file(db_path):
+        raise ValueError(f"{db_path} 是加密文件，请先在图形界面中解密")
+    if read_only:
+        uri = f"{pathlib.Path(os.path.abspath(db_path)).as_uri()}?mode=ro"
+        return sqlite3.connect(uri, uri=True, isolation_level=None)
+    return sqlite3.connect(db_path, isolation_level=None, timeout=30)
+
+
+def csv_options(args):
+    """由命令行参数得到 CSV 导出选项"""
+    dialect = {'delimiter': "\t" if args.delimiter == "\\t" else args.delimiter}
+    if args.quote_all:
+        dialect['quoting'] = csv.QUOTE_ALL
+    return {'encoding': args.encoding, 'dialect': dialect, 'header': args.header}
+
+
+def command_backup(args, progress, is_canceled):
+    # 先检查源数据库：文件不存在时 perform_backup 会创建并备份一个空库
+    open_database(args.database, read_only=True).close()
+    _, note = perform_backup(args.database, args.destination, args.mode, pages_per_step=args.pages_per_step,
+                             sleep_ms=args.sleep_ms, max_chain=args.max_chain,
+                             progress=progress, is_canceled=is_canceled)
+    progress.finish()
+    print(f"备份完成{note}")
+    return EXIT_OK
+
+
+def command_verify(args, progress, is_canceled):
+    ok, report = verify_backup(args.backup, args.quick_check, progress=progress, is_canceled=is_canceled)
+    progress.finish()
+    print("\n".join(report))
+    return EXIT_OK if ok else EXIT_FAILED
+
+
+def command_restore(args, progress, is_canceled):
+    conn = open_database(args.database, create=True)
+    try:
+        pages = restore_backup_online(args.backup, conn, os.path.dirname(os.path.abspath(args.database)),
+                                      args.pages_per_step, progress=progress, is_canceled=is_canceled)
+    finally:
+        conn.close()
+    progress.finish()
+    print(f"数据库恢复成功，共恢复 {pages} 页")
+    return EXIT_OK
+
+
+def command_export(args, progress, is_canceled):
+    start = time.time()
+    if args.query:
+        file_format = export_plan(args.output, single_table=True)[0]
+        options = csv_options(args) if file_format == 'csv' else {}
+        if file_format == 'sql' and args.table_name:
+            options['table_name'] = args.table_name
+        conn = open_database(args.database, read_only=True)
+        try:
+            count = export_query(conn, args.query, args.output, file_format, options,
+                                 progress=progress, is_canceled=is_canceled)
+        finally:
+            conn.close()
+    else:
+        conn = open_database(args.database, read_only=True)
+        try:
+            tables = list_export_tables(conn, args.table)
+        finally:
+            conn.close()
+        missing = set(args.table or []) - set(tables)
+        if missing:
+            raise ValueError(f"数据库中没有表: {', '.join(sorted(missing))}")
+        
+        file_format, target, options = export_plan(args.output, single_table=len(args.table or []) == 1)
+        if file_format == 'csv':
+            options.update(csv_options(args))
+        # 未指定表时传 None，整库导出（SQL 格式）才会包含视图
+        count = export_tables_parallel(args.database, target, args.table or None, file_format,
+                                       args.workers or default_export_workers(len(tables)), options,
+                                       progress=progress, is_canceled=is_canceled)
+    progress.finish()
+    print(f"已导出 {count} 行到 {args.output}，用时 {time.time() - start:.1f} 秒")
+    return EXIT_OK
+
+
+def command_import(args, progress, is_canceled):
+    file_format = args.format
+    lower_path = args.file.lower()
+    if file_format == 'auto':
+        if lower_path.endswith('.sql'):
+            file_format = 'sql'
+        elif lower_path.endswith(('.jsonl', '.ndjson')):
+            file_format = 'jsonl'
+        else:
+            file_format = 'csv'
+    table_name = args.table or os.path.splitext(os.path.basename(args.file))[0]
+    
+    start = time.time()
+    conn = open_database(args.database, create=True)
+    try:
+        if file_format == 'sql':
+            count = import_sql_file(conn, args.file, args.encoding, keep_partial=args.keep_partial,
+                                    bulk_load=args.bulk_load, progress=progress, is_canceled=is_canceled)
+            unit = "条语句"
+        elif file_format == 'jsonl':
+            analysis = analyze_jsonl_file(args.file)
+            columns = [(col['key'], col['name'], col['type']) for col in analysis['columns']]
+            count = import_jsonl_file(conn, args.file, table_name, columns, args.batch_size,
+                                      bulk_load=args.bulk_load, progress=progress, is_canceled=is_canceled)
+            unit = "行"
+        else:
+            analysis = analyze_csv_file(args.file, args.encoding, args.header)
+            columns = [(col['name'], col['type']) for col in analysis['columns']]
+            count = import_csv_file(conn, args.file, table_name, columns, encoding=analysis['encoding'],
+                                    dialect=analysis['dialect'], has_header=analysis['has_header'],
+                                    batch_size=args.batch_size, bulk_load=args.bulk_load, workers=args.workers,
+                                    progress=progress, is_canceled=is_canceled)
+            unit = "行"
+    finally:
+        conn.close()
+    progress.finish()
+    print(f"已从 {args.file} 导入 {count} {unit}，用时 {time.time() - start:.1f} 秒")
+    return EXIT_OK
+
+
+def command_vacuum(args, progress, is_canceled):
+    conn = open_database(args.database)
+    size = os.path.getsize(args.database)
+    try:
+        if args.into:
+            conn.execute("VACUUM INTO ?", (args.into,))
+        else:
+            conn.execute("VACUUM")
+        if args.analyze:
+            conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    new_size = os.path.getsize(args.into or args.database)
+    print(f"整理完成: {size / 1024 / 1024:.1f} MB → {new_size / 1024 / 1024:.1f} MB")
+    return EXIT_OK
+
+
+def command_integrity_check(args, progress, is_canceled):
+    conn = open_database(args.database, read_only=True)
+    try:
+        pragma = "quick_check" if args.quick else "integrity_check"
+        result = [row[0] for row in conn.execute(f"PRAGMA {pragma}({int(args.max_errors)})")]
+    finally:
+        conn.close()
+    if result == ["ok"]:
+        print("完整性检查通过: 数据库没有损坏")
+        return EXIT_OK
+    print("\n".join(result))
+    return EXIT_FAILED
+
+
+def write_query_result(out, cursor, file_format, table_name, fetch_size=1000):
+    """输出查询结果；TSV、CSV、INSERT 与 JSON Lines 按批次流式输出，Markdown 与 JSON 读取全部结果后输出"""
+    if file_format == 'jsonl':
+        write_cursor_jsonl(out, cursor, fetch_size)
+        return
+    
+    columns = [description[0] for description in cursor.description]
+    if file_format in ('markdown', 'json'):
+        out.write(format_rows(columns, cursor.fetchall(), file_format, table_name) + "\n")
+        return
+    
+    first = True
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if rows or first:
+            text = format_rows(columns, rows, file_format, table_name, header=first)
+            if text:
+                out.write(text + "\n")
+        if not rows:
+            break
+        first = False
+
+
+def command_query(args, progress, is_canceled):
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') if args.file != "-" else sys.stdin as f:
+            sql = f.read()
+    elif args.sql:
+        sql = args.sql
+    else:
+        raise ValueError("请给出 SQL 语句或用 --file 指定脚本")
+    
+    conn = open_database(args.database, read_only=args.read_only)
+    try:
+        for statement, _ in iter_sql_statements(io.StringIO(sql)):
+            changes = conn.total_changes
+            cursor = conn.execute(statement)
+            if cursor.description:
+                write_query_result(sys.stdout, cursor, args.format, args.table_name)
+            elif conn.total_changes != changes:
+                print(f"影响 {conn.total_changes - changes} 行", file=sys.stderr)
+    finally:
+        conn.close()
+    return EXIT_OK
+
+
+def command_benchmark(args, progress, is_canceled):
+    conn = open_database(args.database)
+    try:
+        statements = args.sql or [f"SELECT * FROM {quote_identifier(table)}" for table in list_export_tables(conn)]
+        print("耗时(毫秒): 最短\t中位数\t最长\t行数\t行/秒\t语句")
+        for statement in statements:
+            timings = []
+            rows = 0
+            for run in range(args.warmup + args.repeat):
+                if is_canceled():
+                    raise OperationCanceled()
+                # 每次执行后回滚，写语句不会修改数据库，多次执行的结果也一致
+                conn.execute("BEGIN")
+                try:
+                    start = time.perf_counter()
+                    cursor = conn.execute(statement)
+                    rows = 0
+                    while True:
+                        batch = cursor.fetchmany(10000)
+                        if not batch:
+                            break
+                        rows += len(batch)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    conn.execute("ROLLBACK")
+                if run >= args.warmup:
+                    timings.append(elapsed * 1000)
+            
+            median = statistics.median(timings)
+            rate = f"{rows / median * 1000:.0f}" if rows and median else "-"
+            print(f"{min(timings):.2f}\t{median:.2f}\t{max(timings):.2f}\t{rows}\t{rate}\t{' '.join(statement.split())}")
+    finally:
+        conn.close()
+    return EXIT_OK
+
+
+def command_diff(args, progress, is_canceled):
+    for path in (args.source, args.target):
+        open_database(path, read_only=True).close()
+    start = time.time()
+    diffs = diff_databases(args.source, args.target, args.table, sync_script=args.script, apply=args.apply,
+                           progress=progress, is_canceled=is_canceled)
+    progress.finish()
+    print(format_diff_report(diffs, args.limit))
+    print(f"\n比较用时 {time.time() - start:.1f} 秒", file=sys.stderr)
+    if args.apply or all(diff.status == 'same' for diff in diffs):
+        return EXIT_OK
+    return EXIT_FAILED
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Database_CLI.py", description=f"{ProjectInfo.NAME} 命令行模式（不加载图形界面）",
+        epilog="退出码: 0 成功；1 检查未通过或有差异；2 出错；130 已取消")
+    parser.add_argument("--version", action="version", version=ProjectInfo.get_header())
+    parser.add_argument("-q", "--quiet", action="store_true", help="不显示进度")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="命令")
+    
+    command = commands.add_parser("backup", help="备份数据库")
+    command.add_argument("database", help="要备份的数据库")
+    command.add_argument("destination", help="备份文件；repository 方式下为备份仓库目录")
+    command.add_argument("--mode", choices=["full", "incremental", "gzip", "zstd", "repository"], default="full",
+                         help="备份方式（默认 full）")
+    command.add_argument("--pages-per-step", type=int, default=1024, help="在线备份每一步复制的页数")
+    command.add_argument("--sleep-ms", type=int, default=10, help="两步之间的间隔（毫秒），期间其他连接可写入源数据库")
+    command.add_argument("--max-chain", type=int, help="增量备份链的最大长度，超过时改为完整备份")
+    command.set_defaults(handler=command_backup)
+    
+    command = commands.add_parser("verify", help="验证备份的校验和")
+    command.add_argument("backup", help="备份文件或备份仓库中的快照")
+    command.add_argument("--quick-check", action="store_true", help="同时对还原出的副本执行 PRAGMA quick_check")
+    command.set_defaults(handler=command_verify)
+    
+    command = commands.add_parser("restore", help="将备份恢复到数据库（先核对校验和）")
+    command.add_argument("backup", help="备份文件或备份仓库中的快照")
+    command.add_argument("database", help="恢复到的数据库，不存在时创建")
+    command.add_argument("--pages-per-step", type=int, default=1024, help="每一步恢复的页数")
+    command.set_defaults(handler=command_restore)
+    
+    command = commands.add_parser(
+        "export", help="导出数据",
+        description="按输出文件的扩展名选择格式: .sql/.sql.gz、.csv/.csv.gz、.zip（CSV 压缩包）、.jsonl/.jsonl.gz、"
+                    ".parquet、.arrow。导出多个表时，除 .sql 和 .zip 外每个表写入以文件名命名的目录。")
+    command.add_argument("database", help="数据库文件")
+    command.add_argument("output", help="输出文件")
+    command.add_argument("-t", "--table", action="append", help="要导出的表，可重复指定；默认全部表")
+    command.add_argument("--query", help="导出这条查询的结果，而不是表")
+    command.add_argument("--table-name", help="导出查询为 SQL 时 INSERT 的表名（默认 query_result）")
+    command.add_argument("--workers", type=int, help="并行导出的线程数")
+    command.add_argument("--delimiter", default=",", help="CSV 分隔符，制表符写作 \\t")
+    command.add_argument("--quote-all", action="store_true", help="CSV 所有字段都加引号")
+    command.add_argument("--encoding", default="utf-8", help="CSV 编码（默认 utf-8）")
+    command.add_argument("--header", action=argparse.BooleanOptionalAction, default=True, help="CSV 第一行写入列名")
+    command.set_defaults(handler=command_export)
+    
+    command = commands.add_parser("import", help="导入 SQL 脚本、CSV 或 JSON Lines 文件")
+    command.add_argument("database", help="数据库文件，不存在时创建")
+    command.add_argument("file", help="要导入的文件")
+    command.add_argument("--format", choices=["auto", "sql", "csv", "jsonl"], default="auto",
+                         help="文件格式，默认按扩展名判断")
+    command.add_argument("--table", help="CSV/JSON Lines 导入的表名，默认为文件名")
+    command.add_argument("--encoding", help="文件编码，默认自动检测")
+    command.add_argument("--header", action=argparse.BooleanOptionalAction, default=None,
+                         help="CSV 首行是否为表头，默认自动检测")
+    command.add_argument("--batch-size", type=int, default=10000, help="每批写入的行数")
+    command.add_argument("--workers", type=int, default=1, help="CSV 解析进程数")
+    command.add_argument("--bulk-load", action="store_true",
+                         help="导入期间使用批量加载模式 (synchronous=OFF, journal_mode=MEMORY)，"
+                              "中途崩溃可能损坏数据库，仅用于可重新导入的场景")
+    command.add_argument("--keep-partial", action="store_true", help="SQL 脚本出错或取消时保留已完成的部分")
+    command.set_defaults(handler=command_import)
+    
+    command = commands.add_parser("vacuum", help="整理数据库（VACUUM 与 ANALYZE）")
+    command.add_argument("database", help="数据库文件")
+    command.add_argument("--into", help="整理后写入新文件 (VACUUM INTO)，原数据库不变")
+    command.add_argument("--analyze", action=argparse.BooleanOptionalAction, default=True,
+                         help="整理后更新统计信息")
+    command.set_defaults(handler=command_vacuum)
+    
+    command = commands.add_parser("integrity-check", help="完整性检查")
+    command.add_argument("database", help="数据库文件")
+    command.add_argument("--quick", action="store_true", help="使用 PRAGMA quick_check，不检查索引内容")
+    command.add_argument("--max-errors", type=int, default=100, help="最多报告的问题数")
+    command.set_defaults(handler=command_integrity_check)
+    
+    command = commands.add_parser("query", help="执行 SQL 并输出结果")
+    command.add_argument("database", help="数据库文件")
+    command.add_argument("sql", nargs="?", help="SQL 语句，可包含多条")
+    command.add_argument("-f", "--file", help="从文件读取 SQL，- 表示标准输入")
+    command.add_argument("--format", choices=[name for name, _ in COPY_FORMATS] + ["jsonl"], default="tsv",
+                         help="输出格式（默认 tsv）")
+    command.add_argument("--table-name", default="query_result", help="insert 格式使用的表名")
+    command.add_argument("--read-only", action="store_true", help="以只读方式打开数据库")
+    command.set_defaults(handler=command_query)
+    
+    command = commands.add_parser("benchmark", help="测量查询耗时（每次执行后回滚）")
+    command.add_argument("database", help="数据库文件")
+    command.add_argument("sql", nargs="*", help="要测量的语句，默认对每个表执行 SELECT *")
+    command.add_argument("-n", "--repeat", type=int, default=5, help="计时的执行次数")
+    command.add_argument("--warmup", type=int, default=1, help="计时前的预热次数")
+    command.set_defaults(handler=command_benchmark)
+    
+    command = commands.add_parser("diff", help="比较两个数据库的数据，可生成或执行同步")
+    command.add_argument("source", help="源数据库")
+    command.add_argument("target", help="目标数据库")
+    command.add_argument("-t", "--table", action="append", help="要比较的表，可重复指定；默认全部表")
+    command.add_argument("--script", help="写出使目标数据库与源数据库一致的 SQL 脚本")
+    command.add_argument("--apply", action="store_true", help="直接同步目标数据库")
+    command.add_argument("--limit", type=int, default=20, help="每类差异最多列出的键数")
+    command.set_defaults(handler=command_diff)
+    
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    progress = ProgressPrinter(not args.quiet and sys.stderr.isatty())
+    try:
+        with CancelOnInterrupt() as is_canceled:
+            return args.handler(args, progress, is_canceled)
+    except (OperationCanceled, KeyboardInterrupt):
+        progress.finish()
+        print("操作已取消", file=sys.stderr)
+        return EXIT_CANCELED
+    except BrokenPipeError:
+        # 输出被 head 等命令提前关闭
+        sys.stderr.close()
+        return EXIT_OK
+    except Exception as e:
+        progress.finish()
+        print(f"错误: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3848 @@
+"""数据库引擎：备份与恢复、加密、导入导出、复制与比较等不依赖 Qt 的功能，供图形界面和命令行共用"""
+import os
+import csv
+import gzip
+import io
+import sqlite3
+import zlib
+import hashlib
+import hmac
+import json
+import math
+import random
+import re
+import codecs
+import multiprocessing
+import pathlib
+import collections
+import itertools
+import queue
+import zipfile
+import concurrent.futures
+import shutil
+import threading
+import struct
+import time
+from datetime import datetime, timedelta
+
+
+class ProjectInfo:
+    """项目信息元数据（集中管理所有项目相关信息）"""
+    VERSION = "3.0.0"
+    BUILD_DATE = "2025-05-26"
+    AUTHOR = "杜玛"
+    LICENSE = "MIT"
+    COPYRIGHT = "© 永久 杜玛"
+    URL = "https://github.com/duma520"
+    MAINTAINER_EMAIL = "support@duma520.com"
+    NAME = "SQLite 数据库管理器 Pro"
+    DESCRIPTION = "增强版 SQLite 数据库管理器，支持多种高级功能"
+    HELP_TEXT = """
+使用说明:
+
+1. 文件菜单:
+   - 打开/关闭数据库
+   - 备份/恢复数据库
+   - 导入/导出数据
+   - 多数据库管理
+
+2. 编辑菜单:
+   - SQL查询历史
+   - 数据编辑功能
+
+3. 视图菜单:
+   - 自定义界面布局
+   - 切换主题
+   - 数据可视化
+
+4. 工具菜单:
+   - 数据库优化
+   - 完整性检查
+   - 加密/解密
+
+5. 帮助菜单:
+   - 查看帮助文档
+   - 检查更新
+"""
+
+    @classmethod
+    def get_metadata(cls) -> dict:
+        """获取主要元数据字典"""
+        return {
+            'version': cls.VERSION,
+            'author': cls.AUTHOR,
+            'license': cls.LICENSE,
+            'url': cls.URL
+        }
+
+    @classmethod
+    def get_header(cls) -> str:
+        """生成标准化的项目头信息"""
+        return f"{cls.NAME} {cls.VERSION} | {cls.LICENSE} License | {cls.URL}"
+
+
+class OperationCanceled(Exception):
+    """操作被用户取消"""
+
+
+class SqlImportError(Exception):
+    """SQL 脚本中的某条语句执行失败，line_no 为该语句起始行号"""
+    def __init__(self, line_no, statement, error):
+        super().__init__(f"第 {line_no} 行的语句执行失败: {error}\n{statement.strip()[:300]}")
+        self.line_no = line_no
+        self.statement = statement
+        self.error = error
+
+
+def require_idle_connection(conn):
+    """连接上有未结束的事务时报错；引擎函数不替调用方提交或回滚它的事务"""
+    if conn.in_transaction:
+        raise ValueError("数据库连接上有未提交的事务，请先提交或回滚后再执行此操作")
+
+
+BACKUP_MANIFEST_MAGIC = b"SQLMAN1\n"
+INCREMENTAL_BACKUP_MAGIC = b"SQLINC1\n"
+PAGE_DIGEST_SIZE = 16
+
+
+def read_backup_meta(backup_path):
+    """读取备份元数据（.meta 文件）"""
+    with open(f"{backup_path}.meta", 'r') as f:
+        return json.load(f)
+
+
+def write_backup_meta(backup_path, backup_info):
+    """保存备份元数据（.meta 文件）"""
+    with open(f"{backup_path}.meta", 'w') as f:
+        json.dump(backup_info, f)
+
+
+class TreeHasher:
+    """分段 BLAKE2b 校验和
+    
+    数据按固定大小分段，先分别计算每段的摘要，再对全部段摘要计算总摘要。
+    写入备份时可以边写边算，校验时各段又可以并行计算，两种方式结果一致。
+    """
+    ALGORITHM = 'blake2b-tree'
+    BLOCK_SIZE = 64 * 1024 * 1024
+    
+    def __init__(self, block_size=None):
+        self.block_size = block_size or self.BLOCK_SIZE
+        self.block_digests = []
+        self.current = hashlib.blake2b()
+        self.current_size = 0
+    
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.block_size - self.current_size)
+            self.current.update(view[:take])
+            self.current_size += take
+            view = view[take:]
+            
+            if self.current_size == self.block_size:
+                self.block_digests.append(self.current.digest())
+                self.current = hashlib.blake2b()
+                self.current_size = 0
+    
+    def hexdigest(self):
+        digests = list(self.block_digests)
+        if self.current_size or not digests:
+            digests.append(self.current.digest())
+        return self.combine(digests)
+    
+    @staticmethod
+    def combine(block_digests):
+        """由各段摘要计算总摘要"""
+        return hashlib.blake2b(b"".join(block_digests)).hexdigest()
+
+
+def hash_file_range(file_path, start, length, buffer_size=1024 * 1024):
+    """计算文件中一段数据的 BLAKE2b 摘要（hashlib 计算时释放 GIL，可多线程并行）"""
+    hasher = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(buffer_size, length))
+            if not data:
+                break
+            hasher.update(data)
+            length -= len(data)
+    return hasher.digest()
+
+
+def calculate_checksum(file_path, algorithm=TreeHasher.ALGORITHM, workers=None,
+                       progress=None, is_canceled=None):
+    """计算文件校验和；分段 BLAKE2b 按段并行计算，旧备份使用的 MD5 顺序计算"""
+    if algorithm == 'md5':
+        hasher = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    
+    block_size = TreeHasher.BLOCK_SIZE
+    file_size = os.path.getsize(file_path)
+    block_count = max(1, -(-file_size // block_size))
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(hash_file_range, file_path, i * block_size, block_size)
+                   for i in range(block_count)]
+        
+        for done, _ in enumerate(concurrent.futures.as_completed(futures), 1):
+            if is_canceled and is_canceled():
+                for future in futures:
+                    future.cancel()
+                raise OperationCanceled()
+            if progress:
+                progress(int(done * 100 / block_count), f"正在计算校验和... ({done}/{block_count} 段)")
+        
+        return TreeHasher.combine([future.result() for future in futures])
+
+
+class IOThrottle:
+    """令牌桶限速，后台任务按字节数调用 consume 以限制磁盘读写速度"""
+    
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = bytes_per_second
+        self.last = time.monotonic()
+    
+    def consume(self, size):
+        if not self.rate:
+            return
+        
+        now = time.monotonic()
+        self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+        self.last = now
+        self.allowance -= size
+        if self.allowance < 0:
+            time.sleep(-self.allowance / self.rate)
+
+
+class DatabaseSnapshot:
+    """数据库一致性快照
+    
+    持有读事务期间其他连接无法改写主数据库文件，因此可以直接按页读取文件。
+    WAL 模式下先执行截断检查点，确保已提交的页都已写回主文件。
+    """
+    
+    def __init__(self, db_path, retries=5):
+        self.db_path = db_path
+        self.retries = retries
+        self.conn = None
+        self.file = None
+        self.page_size = 0
+        self.page_count = 0
+    
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            wal_mode = self.conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+            wal_path = f"{self.db_path}-wal"
+            
+            for attempt in range(self.retries):
+                if wal_mode:
+                    self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                
+                self.conn.execute("BEGIN")
+                self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                
+                # WAL 为空说明快照完全位于主文件中，且检查点在读事务结束前不会改写它
+                if not wal_mode or not os.path.exists(wal_path) or os.path.getsize(wal_path) == 0:
+                    break
+                
+                self.conn.execute("ROLLBACK")
+                time.sleep(0.05 * (attempt + 1))
+            else:
+                raise sqlite3.OperationalError("数据库正忙，无法获得一致快照，请稍后重试")
+            
+            self.page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+            self.page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            self.file = open(self.db_path, 'rb')
+        except Exception:
+            self.conn.close()
+            raise
+        
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.file:
+            self.file.close()
+        self.conn.execute("ROLLBACK")
+        self.conn.close()
+        return False
+    
+    @property
+    def size(self):
+        """快照的字节数"""
+        return self.page_size * self.page_count
+    
+    def iter_chunks(self, pages_per_read=256):
+        """按块读取快照内容，每块包含整数个页"""
+        self.file.seek(0)
+        page_no = 0
+        while page_no < self.page_count:
+            count = min(pages_per_read, self.page_count - page_no)
+            data = self.file.read(count * self.page_size)
+            if len(data) != count * self.page_size:
+                raise IOError("数据库文件长度与页数不符")
+            
+            yield data
+            page_no += count
+    
+    def iter_pages(self, pages_per_read=256):
+        """依次返回 (页号, 页内容)，页号从 0 开始"""
+        page_no = 0
+        for data in self.iter_chunks(pages_per_read):
+            for offset in range(0, len(data), self.page_size):
+                yield page_no, data[offset:offset + self.page_size]
+                page_no += 1
+
+
+class PageManifest:
+    """备份页清单：按页记录摘要，用于比较两次备份之间变化的页"""
+    
+    def __init__(self, page_size, digests=None):
+        self.page_size = page_size
+        self.digests = bytearray(digests or b"")
+    
+    @property
+    def page_count(self):
+        return len(self.digests) // PAGE_DIGEST_SIZE
+    
+    @staticmethod
+    def page_digest(page):
+        """计算单页摘要"""
+        return hashlib.blake2b(page, digest_size=PAGE_DIGEST_SIZE).digest()
+    
+    def add(self, page):
+        """追加一页并返回其摘要"""
+        digest = self.page_digest(page)
+        self.digests += digest
+        return digest
+    
+    def extend(self, digests):
+        """追加一批已计算好的页摘要"""
+        self.digests += digests
+    
+    def digest(self, page_no):
+        """获取指定页的摘要，超出范围时返回 None"""
+        if page_no >= self.page_count:
+            return None
+        offset = page_no * PAGE_DIGEST_SIZE
+        return bytes(self.digests[offset:offset + PAGE_DIGEST_SIZE])
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(BACKUP_MANIFEST_MAGIC)
+            f.write(struct.pack('<II', self.page_size, self.page_count))
+            f.write(self.digests)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(BACKUP_MANIFEST_MAGIC)) != BACKUP_MANIFEST_MAGIC:
+                raise ValueError(f"无效的页清单文件: {path}")
+            page_size, page_count = struct.unpack('<II', f.read(8))
+            digests = f.read(page_count * PAGE_DIGEST_SIZE)
+        return cls(page_size, digests)
+    
+    @classmethod
+    def from_file(cls, db_path, page_size, hasher=None):
+        """扫描数据库文件生成页清单，可顺带更新文件校验和"""
+        manifest = cls(page_size)
+        with open(db_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(page_size * 256), b""):
+                if hasher:
+                    hasher.update(chunk)
+                for offset in range(0, len(chunk), page_size):
+                    manifest.add(chunk[offset:offset + page_size])
+        return manifest
+
+
+def find_latest_backup(directory, source_path):
+    """在目录中查找同一源数据库最近一次带页清单的备份"""
+    latest_path, latest_time = None, ""
+    source_path = os.path.abspath(source_path)
+    
+    for name in os.listdir(directory or "."):
+        if not name.endswith('.meta'):
+            continue
+        
+        backup_path = os.path.join(directory, name[:-len('.meta')])
+        if not os.path.exists(backup_path) or not os.path.exists(f"{backup_path}.manifest"):
+            continue
+        
+        try:
+            info = read_backup_meta(backup_path)
+        except (OSError, ValueError):
+            continue
+        
+        if os.path.abspath(info.get('source', '')) != source_path:
+            continue
+        
+        if info.get('timestamp', '') > latest_time:
+            latest_path, latest_time = backup_path, info.get('timestamp', '')
+    
+    return latest_path
+
+
+def load_backup_chain(backup_path):
+    """读取备份链，返回按应用顺序排列的文件路径（第一个为完整备份）"""
+    chain_path = f"{backup_path}.chain"
+    if not os.path.exists(chain_path):
+        return [os.path.abspath(backup_path)]
+    
+    with open(chain_path, 'r') as f:
+        chain = json.load(f)
+    
+    base_dir = os.path.dirname(os.path.abspath(backup_path))
+    return [os.path.normpath(os.path.join(base_dir, path))
+            for path in [chain['base']] + chain['increments']]
+
+
+def save_backup_chain(backup_path, chain_paths):
+    """保存备份链，路径相对于备份文件所在目录保存，便于整体移动备份目录"""
+    base_dir = os.path.dirname(os.path.abspath(backup_path))
+    relative = [os.path.relpath(path, base_dir) for path in chain_paths]
+    
+    with open(f"{backup_path}.chain", 'w') as f:
+        json.dump({'base': relative[0], 'increments': relative[1:]}, f, indent=2)
+
+
+def create_full_backup(source_path, dest_path, pages_per_step=1024, sleep_ms=10,
+                       progress=None, is_canceled=None, throttle=None):
+    """使用在线备份 API 创建完整备份，返回备份元数据"""
+    copied_pages = 0
+    
+    def on_backup_progress(status, remaining, total):
+        nonlocal copied_pages
+        # 在回调中抛出异常即可中止复制
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        
+        copied = total - remaining
+        if throttle:
+            throttle.consume((copied - copied_pages) * source_page_size)
+        copied_pages = copied
+        
+        if progress:
+            percent = int(copied * 80 / total) if total else 80
+            progress(percent, f"正在备份数据... ({copied}/{total} 页)")
+        # 回调在每步之后执行，此时源库的锁已释放；backup() 的 sleep 参数只在遇到 BUSY/LOCKED 时才等待
+        if sleep_ms and remaining:
+            time.sleep(sleep_ms / 1000.0)
+    
+    # 先写入临时文件，完成后再原子替换，避免留下半成品备份
+    temp_path = f"{dest_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    
+    source_conn = sqlite3.connect(source_path)
+    try:
+        source_page_size = source_conn.execute("PRAGMA page_size").fetchone()[0]
+        dest_conn = sqlite3.connect(temp_path)
+        try:
+            # 按页分步复制，每步之间释放源库锁并暂停 sleep_ms，其他连接仍可写入
+            if progress:
+                progress(0, "正在备份数据...")
+            source_conn.backup(dest_conn, pages=pages_per_step,
+                               progress=on_backup_progress, sleep=sleep_ms / 1000.0)
+            page_size = dest_conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            dest_conn.close()
+        
+        # 页由 SQLite 写入，校验和与页清单在同一次读取中完成
+        if progress:
+            progress(80, "计算校验和...")
+        hasher = TreeHasher()
+        manifest = PageManifest.from_file(temp_path, page_size, hasher)
+        
+        os.replace(temp_path, dest_path)
+    finally:
+        source_conn.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    manifest.save(f"{dest_path}.manifest")
+    if os.path.exists(f"{dest_path}.chain"):
+        os.remove(f"{dest_path}.chain")
+    
+    backup_info = {
+        'source': source_path,
+        'timestamp': datetime.now().isoformat(),
+        'checksum': hasher.hexdigest(),
+        'checksum_algorithm': TreeHasher.ALGORITHM,
+        'version': ProjectInfo.VERSION,
+        'type': 'full',
+        'page_size': page_size,
+        'page_count': manifest.page_count
+    }
+    write_backup_meta(dest_path, backup_info)
+    return backup_info
+
+
+def create_incremental_backup(source_path, dest_path, parent_path, progress=None, is_canceled=None,
+                              throttle=None):
+    """创建页级增量备份：只写入与上一次备份页清单不同的页，返回备份元数据"""
+    parent_manifest = PageManifest.load(f"{parent_path}.manifest")
+    if os.path.abspath(parent_path) == os.path.abspath(dest_path):
+        raise ValueError("增量备份不能覆盖其所依赖的上一次备份")
+    
+    temp_path = f"{dest_path}.tmp"
+    hasher = TreeHasher()
+    changed_pages = 0
+    
+    try:
+        with DatabaseSnapshot(source_path) as snapshot:
+            if snapshot.page_size != parent_manifest.page_size:
+                raise ValueError("数据库页大小已变化，请先执行完整备份")
+            
+            manifest = PageManifest(snapshot.page_size)
+            with open(temp_path, 'wb') as f:
+                header = INCREMENTAL_BACKUP_MAGIC + struct.pack('<II', snapshot.page_size, snapshot.page_count)
+                f.write(header)
+                hasher.update(header)
+                
+                report_every = max(1, snapshot.page_count // 100)
+                for page_no, page in snapshot.iter_pages():
+                    if throttle:
+                        throttle.consume(len(page))
+                    digest = manifest.add(page)
+                    if digest != parent_manifest.digest(page_no):
+                        record = struct.pack('<I', page_no) + page
+                        f.write(record)
+                        hasher.update(record)
+                        changed_pages += 1
+                    
+                    if page_no % report_every == 0:
+                        if is_canceled and is_canceled():
+                            raise OperationCanceled()
+                        if progress:
+                            progress(int(page_no * 95 / snapshot.page_count),
+                                     f"正在比较数据页... (已变化 {changed_pages} 页)")
+        
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    manifest.save(f"{dest_path}.manifest")
+    save_backup_chain(dest_path, load_backup_chain(parent_path) + [os.path.abspath(dest_path)])
+    
+    backup_info = {
+        'source': source_path,
+        'timestamp': datetime.now().isoformat(),
+        'checksum': hasher.hexdigest(),
+        'checksum_algorithm': TreeHasher.ALGORITHM,
+        'version': ProjectInfo.VERSION,
+        'type': 'incremental',
+        'parent': os.path.relpath(os.path.abspath(parent_path), os.path.dirname(os.path.abspath(dest_path))),
+        'page_size': manifest.page_size,
+        'page_count': manifest.page_count,
+        'changed_pages': changed_pages
+    }
+    write_backup_meta(dest_path, backup_info)
+    return backup_info
+
+
+COMPRESSED_BACKUP_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def load_zstandard():
+    """按需加载可选依赖 zstandard，未安装时返回 None"""
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def backup_compression(backup_path):
+    """返回备份文件的压缩格式（gzip/zstd），未压缩时返回 None"""
+    try:
+        compression = read_backup_meta(backup_path).get('compression')
+    except (OSError, ValueError):
+        compression = None
+    return compression or COMPRESSED_BACKUP_EXTENSIONS.get(os.path.splitext(backup_path)[1].lower())
+
+
+def compress_chunk(data, compression, level):
+    """压缩一个数据块，每块都是独立的 gzip 成员或 zstd 帧"""
+    if compression == 'zstd':
+        return load_zstandard().ZstdCompressor(level=level).compress(data)
+    
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_chunk(data, compression):
+    """解压一个由 compress_chunk 生成的数据块"""
+    if compression == 'zstd':
+        return load_zstandard().ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def compress_snapshot_chunk(data, page_size, compression, level):
+    """在工作线程中压缩快照块，并顺带计算其中每页的摘要"""
+    digests = b"".join(PageManifest.page_digest(data[offset:offset + page_size])
+                       for offset in range(0, len(data), page_size))
+    return compress_chunk(data, compression, level), digests
+
+
+def create_compressed_backup(source_path, dest_path, compression='gzip', level=None,
+                             chunk_size=4 * 1024 * 1024, workers=None,
+                             progress=None, is_canceled=None, throttle=None):
+    """流式创建压缩备份，返回备份元数据
+    
+    从一致性快照中按大块读取，多线程并行压缩（zlib/zstd 压缩时释放 GIL），
+    再按原顺序写出并记录块索引。校验和在写出的同时计算。
+    """
+    if compression == 'zstd' and load_zstandard() is None:
+        raise RuntimeError("zstd 压缩需要安装 zstandard 模块")
+    if level is None:
+        level = 3 if compression == 'zstd' else 6
+    workers = workers or os.cpu_count() or 1
+    
+    temp_path = f"{dest_path}.tmp"
+    hasher = TreeHasher()
+    chunks = []
+    
+    try:
+        with DatabaseSnapshot(source_path) as snapshot, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            manifest = PageManifest(snapshot.page_size)
+            pages_per_chunk = max(1, chunk_size // snapshot.page_size)
+            pending = collections.deque()
+            written = 0
+            
+            with open(temp_path, 'wb') as f:
+                def write_next():
+                    nonlocal written
+                    raw_size, future = pending.popleft()
+                    data, digests = future.result()
+                    f.write(data)
+                    hasher.update(data)
+                    manifest.extend(digests)
+                    chunks.append([written, len(data), raw_size])
+                    written += len(data)
+                
+                read = 0
+                for data in snapshot.iter_chunks(pages_per_chunk):
+                    if is_canceled and is_canceled():
+                        for _, future in pending:
+                            future.cancel()
+                        raise OperationCanceled()
+                    if throttle:
+                        throttle.consume(len(data))
+                    
+                    pending.append((len(data), pool.submit(
+                        compress_snapshot_chunk, data, snapshot.page_size, compression, level)))
+                    read += len(data)
+                    
+                    # 限制在途块数量，内存占用与文件大小无关
+                    while len(pending) >= workers * 2:
+                        write_next()
+                    
+                    if progress:
+                        progress(int(read * 95 / snapshot.size),
+                                 f"正在压缩备份... ({read // (1024 * 1024)}/{snapshot.size // (1024 * 1024)} MB)")
+                
+                while pending:
+                    write_next()
+        
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    manifest.save(f"{dest_path}.manifest")
+    if os.path.exists(f"{dest_path}.chain"):
+        os.remove(f"{dest_path}.chain")
+    
+    backup_info = {
+        'source': source_path,
+        'timestamp': datetime.now().isoformat(),
+        'checksum': hasher.hexdigest(),
+        'checksum_algorithm': TreeHasher.ALGORITHM,
+        'version': ProjectInfo.VERSION,
+        'type': 'full',
+        'compression': compression,
+        'page_size': manifest.page_size,
+        'page_count': manifest.page_count,
+        'size': manifest.page_size * manifest.page_count,
+        'chunks': chunks
+    }
+    write_backup_meta(dest_path, backup_info)
+    return backup_info
+
+
+def decompress_backup(backup_path, output_path, workers=None, progress=None, is_canceled=None):
+    """解压压缩备份；有块索引时多线程并行解压，否则按流顺序解压"""
+    compression = backup_compression(backup_path)
+    try:
+        chunks = read_backup_meta(backup_path).get('chunks')
+    except (OSError, ValueError):
+        chunks = None
+    workers = workers or os.cpu_count() or 1
+    
+    with open(backup_path, 'rb') as f_in, open(output_path, 'wb') as f_out:
+        if not chunks:
+            # 没有索引（例如外部工具生成的文件）时按流解压
+            if compression == 'zstd':
+                load_zstandard().ZstdDecompressor().copy_stream(f_in, f_out)
+            else:
+                with gzip.GzipFile(fileobj=f_in) as stream:
+                    shutil.copyfileobj(stream, f_out, 1024 * 1024)
+            return output_path
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            
+            def write_next():
+                raw_size, future = pending.popleft()
+                data = future.result()
+                if len(data) != raw_size:
+                    raise ValueError("压缩块长度与索引不符，备份可能已损坏")
+                f_out.write(data)
+            
+            for i, (offset, size, raw_size) in enumerate(chunks):
+                if is_canceled and is_canceled():
+                    for _, future in pending:
+                        future.cancel()
+                    raise OperationCanceled()
+                
+                f_in.seek(offset)
+                pending.append((raw_size, pool.submit(decompress_chunk, f_in.read(size), compression)))
+                while len(pending) >= workers * 2:
+                    write_next()
+                
+                if progress:
+                    progress(int(i * 100 / len(chunks)), f"正在解压备份... ({i + 1}/{len(chunks)} 块)")
+            
+            while pending:
+                write_next()
+    
+    return output_path
+
+
+REPOSITORY_CONFIG_NAME = "repository.json"
+
+
+def find_repository_snapshot(path):
+    """若路径是备份仓库中的快照清单（snapshots/<快照ID>.json），返回 (仓库目录, 快照ID)，否则返回 None"""
+    snapshots_dir, file_name = os.path.split(os.path.abspath(path))
+    root = os.path.dirname(snapshots_dir)
+    if (file_name.endswith('.json') and os.path.basename(snapshots_dir) == 'snapshots'
+            and os.path.isfile(os.path.join(root, REPOSITORY_CONFIG_NAME))):
+        return root, file_name[:-len('.json')]
+    return None
+
+
+class BackupRepository:
+    """内容寻址的去重备份仓库
+    
+    目录结构：repository.json、chunks/<前两位>/<块哈希>（zlib 压缩）、
+    snapshots/<快照ID>.json。数据按页对齐的内容定义分块：某页的 CRC32
+    满足边界条件时在该页之后切分，未变化的区域在各快照之间得到相同的块，
+    每个块只保存一次，创建快照时也只写入新块。
+    """
+    CHUNK_DIGEST_SIZE = 32
+    
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, REPOSITORY_CONFIG_NAME), 'r') as f:
+            self.config = json.load(f)
+    
+    @classmethod
+    def init(cls, root, avg_chunk_size=256 * 1024, min_chunk_size=64 * 1024,
+             max_chunk_size=1024 * 1024, level=6):
+        """打开备份仓库，不存在时创建"""
+        if not os.path.isfile(os.path.join(root, REPOSITORY_CONFIG_NAME)):
+            os.makedirs(os.path.join(root, 'chunks'), exist_ok=True)
+            os.makedirs(os.path.join(root, 'snapshots'), exist_ok=True)
+            config = {
+                'version': 1,
+                'chunk_hash': f"blake2b-{cls.CHUNK_DIGEST_SIZE * 8}",
+                'compression': 'zlib',
+                'level': level,
+                'avg_chunk_size': avg_chunk_size,
+                'min_chunk_size': min_chunk_size,
+                'max_chunk_size': max_chunk_size
+            }
+            with open(os.path.join(root, REPOSITORY_CONFIG_NAME), 'w') as f:
+                json.dump(config, f, indent=2)
+        return cls(root)
+    
+    def chunk_path(self, digest):
+        return os.path.join(self.root, 'chunks', digest[:2], digest)
+    
+    def snapshot_path(self, snapshot_id):
+        return os.path.join(self.root, 'snapshots', f"{snapshot_id}.json")
+    
+    def store_chunk(self, data):
+        """保存一个块，返回 (块哈希, 新写入的字节数)；块已存在时不再写入"""
+        digest = hashlib.blake2b(data, digest_size=self.CHUNK_DIGEST_SIZE).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        
+        compressed = zlib.compress(data, self.config.get('level', 6))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 同一快照中相同的块可能被多个线程同时写入，各自使用临时文件再原子替换
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+        return digest, len(compressed)
+    
+    def read_chunk(self, digest):
+        """读取并校验一个块"""
+        with open(self.chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.blake2b(data, digest_size=self.CHUNK_DIGEST_SIZE).hexdigest() != digest:
+            raise ValueError(f"块 {digest} 已损坏")
+        return data
+    
+    def split_chunks(self, pages, page_size):
+        """将页序列按内容定义的边界切分为块"""
+        min_pages = max(1, self.config['min_chunk_size'] // page_size)
+        max_pages = max(min_pages, self.config['max_chunk_size'] // page_size)
+        divisor = max(1, self.config['avg_chunk_size'] // page_size - min_pages)
+        
+        chunk = []
+        for page in pages:
+            chunk.append(page)
+            if len(chunk) >= max_pages or (len(chunk) >= min_pages and zlib.crc32(page) % divisor == 0):
+                yield b"".join(chunk)
+                chunk = []
+        if chunk:
+            yield b"".join(chunk)
+    
+    def snapshot_ids(self):
+        """按时间顺序返回所有快照ID"""
+        return sorted(name[:-len('.json')] for name in os.listdir(os.path.join(self.root, 'snapshots'))
+                      if name.endswith('.json'))
+    
+    def load_snapshot(self, snapshot_id):
+        with open(self.snapshot_path(snapshot_id), 'r') as f:
+            return json.load(f)
+    
+    def create_snapshot(self, source_path, workers=None, progress=None, is_canceled=None, throttle=None):
+        """从一致性快照创建仓库快照，只写入仓库中还没有的块，返回快照清单"""
+        workers = workers or os.cpu_count() or 1
+        snapshot_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        hasher = TreeHasher()
+        chunks = []
+        new_chunks = 0
+        new_bytes = 0
+        
+        with DatabaseSnapshot(source_path) as snapshot, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            
+            def store_next():
+                nonlocal new_chunks, new_bytes
+                raw_size, future = pending.popleft()
+                digest, written = future.result()
+                chunks.append([digest, raw_size])
+                if written:
+                    new_chunks += 1
+                    new_bytes += written
+            
+            read = 0
+            pages = (page for _, page in snapshot.iter_pages())
+            for data in self.split_chunks(pages, snapshot.page_size):
+                if is_canceled and is_canceled():
+                    for _, future in pending:
+                        future.cancel()
+                    raise OperationCanceled()
+                if throttle:
+                    throttle.consume(len(data))
+                
+                hasher.update(data)
+                pending.append((len(data), pool.submit(self.store_chunk, data)))
+                read += len(data)
+                
+                # 限制在途块数量，内存占用与数据库大小无关
+                while len(pending) >= workers * 2:
+                    store_next()
+                
+                if progress:
+                    progress(int(read * 95 / max(1, snapshot.size)),
+                             f"正在写入备份仓库... ({read // (1024 * 1024)}/{snapshot.size // (1024 * 1024)} MB)")
+            
+            while pending:
+                store_next()
+            
+            page_size, page_count = snapshot.page_size, snapshot.page_count
+        
+        info = {
+            'id': snapshot_id,
+            'source': source_path,
+            'timestamp': datetime.now().isoformat(),
+            'checksum': hasher.hexdigest(),
+            'checksum_algorithm': TreeHasher.ALGORITHM,
+            'version': ProjectInfo.VERSION,
+            'type': 'repository',
+            'page_size': page_size,
+            'page_count': page_count,
+            'size': page_size * page_count,
+            'new_chunks': new_chunks,
+            'new_bytes': new_bytes,
+            'chunks': chunks
+        }
+        # 清单最后写入，中途失败只会留下未被引用的块，可由 prune 清理
+        temp_path = f"{self.snapshot_path(snapshot_id)}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(info, f)
+        os.replace(temp_path, self.snapshot_path(snapshot_id))
+        return info
+    
+    def restore_snapshot(self, snapshot_id, output_path, workers=None, progress=None, is_canceled=None):
+        """多线程并行读取块，按顺序重组出数据库文件并核对校验和"""
+        info = self.load_snapshot(snapshot_id)
+        chunks = info['chunks']
+        workers = workers or os.cpu_count() or 1
+        hasher = TreeHasher()
+        
+        with open(output_path, 'wb') as f_out, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            
+            def write_next():
+                raw_size, future = pending.popleft()
+                data = future.result()
+                if len(data) != raw_size:
+                    raise ValueError("块长度与快照清单不符，备份仓库可能已损坏")
+                f_out.write(data)
+                hasher.update(data)
+            
+            for i, (digest, raw_size) in enumerate(chunks):
+                if is_canceled and is_canceled():
+                    for _, future in pending:
+                        future.cancel()
+                    raise OperationCanceled()
+                
+                pending.append((raw_size, pool.submit(self.read_chunk, digest)))
+                while len(pending) >= workers * 2:
+                    write_next()
+                
+                if progress:
+                    progress(int(i * 100 / len(chunks)), f"正在从备份仓库还原... ({i + 1}/{len(chunks)} 块)")
+            
+            while pending:
+                write_next()
+        
+        if hasher.hexdigest() != info['checksum']:
+            raise ValueError("还原结果与快照校验和不一致，备份仓库可能已损坏")
+        return output_path
+    
+    def verify_snapshot(self, snapshot_id, progress=None, is_canceled=None):
+        """校验快照引用的每个块，返回损坏或缺失的块列表"""
+        chunks = self.load_snapshot(snapshot_id)['chunks']
+        bad = []
+        for i, (digest, raw_size) in enumerate(chunks):
+            if is_canceled and is_canceled():
+                raise OperationCanceled()
+            try:
+                if len(self.read_chunk(digest)) != raw_size:
+                    bad.append(digest)
+            except (OSError, ValueError, zlib.error):
+                bad.append(digest)
+            if progress:
+                progress(int(i * 100 / max(1, len(chunks))), f"正在校验块... ({i + 1}/{len(chunks)})")
+        return bad
+    
+    def delete_snapshot(self, snapshot_id):
+        """删除快照清单，块需要再执行 prune 才会释放"""
+        os.remove(self.snapshot_path(snapshot_id))
+    
+    def prune(self):
+        """删除不再被任何快照引用的块，返回 (删除块数, 释放字节数)"""
+        referenced = set()
+        for snapshot_id in self.snapshot_ids():
+            referenced.update(digest for digest, _ in self.load_snapshot(snapshot_id)['chunks'])
+        
+        removed = 0
+        freed = 0
+        chunks_dir = os.path.join(self.root, 'chunks')
+        for prefix in os.listdir(chunks_dir):
+            for name in os.listdir(os.path.join(chunks_dir, prefix)):
+                if name not in referenced:
+                    path = os.path.join(chunks_dir, prefix, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+        return removed, freed
+
+
+def restore_backup_chain(backup_path, output_path, progress=None, is_canceled=None):
+    """将完整备份与其后的增量备份依次合并为一个完整的数据库文件"""
+    chain = load_backup_chain(backup_path)
+    
+    if progress:
+        progress(0, "正在复制完整备份...")
+    if backup_compression(chain[0]):
+        decompress_backup(chain[0], output_path, is_canceled=is_canceled)
+    else:
+        shutil.copyfile(chain[0], output_path)
+    
+    with open(output_path, 'r+b') as out:
+        for i, increment_path in enumerate(chain[1:], 1):
+            if is_canceled and is_canceled():
+                raise OperationCanceled()
+            if progress:
+                progress(int(i * 100 / len(chain)), f"正在应用增量备份 {i}/{len(chain) - 1}...")
+            
+            with open(increment_path, 'rb') as f:
+                if f.read(len(INCREMENTAL_BACKUP_MAGIC)) != INCREMENTAL_BACKUP_MAGIC:
+                    raise ValueError(f"无效的增量备份文件: {increment_path}")
+                page_size, page_count = struct.unpack('<II', f.read(8))
+                
+                while True:
+                    record = f.read(4)
+                    if not record:
+                        break
+                    page_no, = struct.unpack('<I', record)
+                    out.seek(page_no * page_size)
+                    out.write(f.read(page_size))
+            
+            # 数据库缩小时截掉多余的页
+            out.truncate(page_count * page_size)
+    
+    return output_path
+
+
+def materialize_backup(backup_path, work_dir, progress=None, is_canceled=None):
+    """获取可直接打开的数据库文件，返回 (路径, 是否为临时文件)"""
+    repository_snapshot = find_repository_snapshot(backup_path)
+    if repository_snapshot:
+        root, snapshot_id = repository_snapshot
+        temp_path = os.path.join(work_dir, f".{snapshot_id}.restore")
+        try:
+            BackupRepository(root).restore_snapshot(snapshot_id, temp_path, progress=progress, is_canceled=is_canceled)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return temp_path, True
+    
+    if os.path.exists(f"{backup_path}.chain") or backup_compression(backup_path):
+        temp_path = os.path.join(work_dir, f".{os.path.basename(backup_path)}.restore")
+        try:
+            if os.path.exists(f"{backup_path}.chain"):
+                restore_backup_chain(backup_path, temp_path, progress, is_canceled)
+            else:
+                decompress_backup(backup_path, temp_path, progress=progress, is_canceled=is_canceled)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return temp_path, True
+    
+    return backup_path, False
+
+
+def perform_backup(source_path, dest_path, mode='full', pages_per_step=1024, sleep_ms=10,
+                   max_chain=None, progress=None, is_canceled=None, throttle=None):
+    """按备份方式执行一次备份，返回 (备份元数据, 结果说明)
+    
+    增量备份找不到上一次备份、页大小变化或备份链超过 max_chain 时改为完整备份；
+    repository 方式下 dest_path 为备份仓库目录。
+    """
+    if mode == 'repository':
+        info = BackupRepository.init(dest_path).create_snapshot(
+            source_path, progress=progress, is_canceled=is_canceled, throttle=throttle)
+        return info, (f"（快照 {info['id']}，新写入 {info['new_chunks']}/{len(info['chunks'])} 块，"
+                      f"{info['new_bytes'] / (1024 * 1024):.1f} MB）")
+    
+    note = ""
+    parent_path = None
+    if mode == 'incremental':
+        parent_path = find_latest_backup(os.path.dirname(dest_path), source_path)
+        if parent_path and os.path.abspath(parent_path) == os.path.abspath(dest_path):
+            parent_path = None
+        if not parent_path:
+            note = "（未找到上一次备份，已执行完整备份）"
+        elif max_chain and len(load_backup_chain(parent_path)) >= max_chain:
+            parent_path = None
+            note = "（备份链已达到上限，已执行完整备份）"
+    
+    if parent_path:
+        try:
+            info = create_incremental_backup(
+                source_path, dest_path, parent_path,
+                progress=progress, is_canceled=is_canceled, throttle=throttle)
+            return info, f"（增量备份，写入 {info['changed_pages']}/{info['page_count']} 页）"
+        except ValueError as e:
+            note = f"（{e}，已执行完整备份）"
+    
+    if mode in ('gzip', 'zstd'):
+        info = create_compressed_backup(
+            source_path, dest_path, compression=mode,
+            progress=progress, is_canceled=is_canceled, throttle=throttle)
+        compressed_size = info['chunks'][-1][0] + info['chunks'][-1][1] if info['chunks'] else 0
+        return info, f"（压缩后 {compressed_size * 100 // max(1, info['size'])}%）"
+    
+    info = create_full_backup(
+        source_path, dest_path, pages_per_step=pages_per_step, sleep_ms=sleep_ms,
+        progress=progress, is_canceled=is_canceled, throttle=throttle)
+    return info, note
+
+
+class CronSchedule:
+    """简化的 cron 表达式：分 时 日 月 周（0 表示周日）
+    
+    每个字段支持 *、数字、a-b 范围、*/n 或 a-b/n 步长以及逗号分隔的列表。
+    """
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+    
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("cron 表达式需要 5 个字段: 分 时 日 月 周")
+        
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self.parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)]
+        # 与 cron 一致：日和周都有限制时，满足其一即可
+        self.day_or_weekday = fields[2] != '*' and fields[4] != '*'
+    
+    @staticmethod
+    def parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/', 1)
+                step = int(step)
+            
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step != 1 else start
+            
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"cron 字段超出范围: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def date_matches(self, dt):
+        weekday = (dt.weekday() + 1) % 7
+        if self.day_or_weekday:
+            day_match = dt.day in self.days or weekday in self.weekdays
+        else:
+            day_match = dt.day in self.days and weekday in self.weekdays
+        return dt.month in self.months and day_match
+    
+    def matches(self, dt):
+        return dt.minute in self.minutes and dt.hour in self.hours and self.date_matches(dt)
+    
+    def next_after(self, dt):
+        """返回 dt 之后第一个满足表达式的时间（精确到分钟），一年内无匹配时返回 None"""
+        candidate = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366)
+        while candidate < limit:
+            if not self.date_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        return None
+
+
+def backup_job_due(job, now):
+    """判断计划备份任务是否到期"""
+    last_run = datetime.fromisoformat(job['last_run']) if job.get('last_run') else None
+    
+    if job.get('cron'):
+        next_run = CronSchedule(job['cron']).next_after(last_run or now - timedelta(minutes=1))
+        return next_run is not None and next_run <= now
+    
+    interval = timedelta(minutes=job.get('interval_minutes', 60))
+    return last_run is None or now - last_run >= interval
+
+
+def delete_backup_files(backup_path):
+    """删除备份文件及其元数据、页清单和备份链文件"""
+    for suffix in ('', '.meta', '.manifest', '.chain'):
+        if os.path.exists(f"{backup_path}{suffix}"):
+            os.remove(f"{backup_path}{suffix}")
+
+
+def apply_retention_policy(directory, job_name, keep_last=1, keep_hourly=24, keep_daily=7, keep_weekly=0):
+    """按保留策略清理某个计划任务生成的备份，返回被删除的备份路径
+    
+    每个小时/天/周各保留其中最新的一个备份，分别保留最近 N 个时间段；
+    被保留的增量备份所依赖的完整备份和增量备份也会一并保留。
+    """
+    backups = []
+    for name in os.listdir(directory):
+        if not name.endswith('.meta'):
+            continue
+        
+        backup_path = os.path.abspath(os.path.join(directory, name[:-len('.meta')]))
+        try:
+            info = read_backup_meta(backup_path)
+        except (OSError, ValueError):
+            continue
+        
+        if info.get('job') == job_name and os.path.exists(backup_path):
+            backups.append((info['timestamp'], backup_path))
+    
+    backups.sort(reverse=True)
+    keep = set(path for _, path in backups[:keep_last])
+    
+    buckets = [
+        (keep_hourly, lambda ts: ts.strftime('%Y%m%d%H')),
+        (keep_daily, lambda ts: ts.strftime('%Y%m%d')),
+        (keep_weekly, lambda ts: ts.isocalendar()[:2]),
+    ]
+    for count, bucket_of in buckets:
+        seen = set()
+        for timestamp, backup_path in backups:
+            bucket = bucket_of(datetime.fromisoformat(timestamp))
+            if bucket in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(bucket)
+            keep.add(backup_path)
+    
+    for backup_path in list(keep):
+        keep.update(load_backup_chain(backup_path))
+    
+    deleted = []
+    for _, backup_path in backups:
+        if backup_path not in keep:
+            delete_backup_files(backup_path)
+            deleted.append(backup_path)
+    return deleted
+
+
+def run_backup_job(job, progress=None, is_canceled=None):
+    """执行一个计划备份任务并应用保留策略，返回 (备份路径, 结果说明)
+    
+    后台任务使用较小的复制步长并按 rate_limit_mb 限速，尽量不影响交互使用。
+    """
+    mode = job.get('mode', 'full')
+    if mode == 'repository':
+        # 每次以时间戳命名目标路径，仓库方式会每次新建一个仓库，无法去重
+        raise ValueError("计划备份任务不支持备份仓库方式，请使用完整、增量或压缩备份")
+    extension = {'gzip': '.gz', 'zstd': '.zst'}.get(mode, '.backup')
+    file_name = f"{os.path.basename(job['db_path'])}.{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+    dest_path = os.path.join(job['dest_dir'], file_name)
+    os.makedirs(job['dest_dir'], exist_ok=True)
+    
+    info, note = perform_backup(
+        job['db_path'], dest_path, mode, pages_per_step=256, sleep_ms=20,
+        max_chain=job.get('max_chain', 24), progress=progress, is_canceled=is_canceled,
+        throttle=IOThrottle(job.get('rate_limit_mb', 0) * 1024 * 1024))
+    
+    # 标记所属任务，保留策略只清理该任务生成的备份
+    info['job'] = job['name']
+    write_backup_meta(dest_path, info)
+    
+    retention = job.get('retention', {})
+    deleted = apply_retention_policy(
+        job['dest_dir'], job['name'],
+        keep_hourly=retention.get('hourly', 24),
+        keep_daily=retention.get('daily', 7),
+        keep_weekly=retention.get('weekly', 0))
+    if deleted:
+        note += f"（清理过期备份 {len(deleted)} 个）"
+    
+    return dest_path, note
+
+
+def run_quick_check(db_path):
+    """对数据库副本执行 PRAGMA quick_check（在独立进程中运行）"""
+    uri = f"{pathlib.Path(os.path.abspath(db_path)).as_uri()}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return [row[0] for row in conn.execute("PRAGMA quick_check")]
+    finally:
+        conn.close()
+
+
+def verify_backup(backup_path, quick_check=False, progress=None, is_canceled=None):
+    """验证备份，返回 (是否通过, 结果说明列表)
+    
+    逐个核对备份链中每个文件与 .meta 记录的校验和；可选在后台进程中
+    对还原出的副本执行 PRAGMA quick_check。
+    """
+    checksum_share = 80 if quick_check else 100
+    report = []
+    ok = True
+    
+    repository_snapshot = find_repository_snapshot(backup_path)
+    if repository_snapshot:
+        root, snapshot_id = repository_snapshot
+        bad = BackupRepository(root).verify_snapshot(
+            snapshot_id, is_canceled=is_canceled,
+            progress=lambda percent, message: progress(percent * checksum_share // 100, message) if progress else None)
+        if bad:
+            report.append(f"{snapshot_id}: {len(bad)} 个块损坏或缺失")
+            report.extend(bad[:20])
+            ok = False
+        else:
+            report.append(f"{snapshot_id}: 所有块校验一致")
+        chain = []
+    else:
+        chain = load_backup_chain(backup_path)
+    
+    for i, path in enumerate(chain):
+        name = os.path.basename(path)
+        try:
+            info = read_backup_meta(path)
+        except (OSError, ValueError):
+            report.append(f"{name}: 缺少元数据，无法核对校验和")
+            ok = False
+            continue
+        
+        def file_progress(percent, message):
+            if progress:
+                progress((i * 100 + percent) * checksum_share // (100 * len(chain)), f"{name}: {message}")
+        
+        algorithm = info.get('checksum_algorithm', 'md5')
+        checksum = calculate_checksum(path, algorithm, progress=file_progress, is_canceled=is_canceled)
+        if checksum == info.get('checksum'):
+            report.append(f"{name}: 校验和一致 ({algorithm})")
+        else:
+            report.append(f"{name}: 校验和不一致，备份可能已损坏")
+            ok = False
+    
+    if quick_check and ok:
+        if progress:
+            progress(checksum_share, "正在还原副本...")
+        db_path, is_temp = materialize_backup(
+            backup_path, os.path.dirname(os.path.abspath(backup_path)), is_canceled=is_canceled)
+        
+        try:
+            if progress:
+                progress(90, "正在执行 quick_check...")
+            
+            # 使用独立进程检查，不占用界面进程的 GIL，也便于中途终止
+            pool = multiprocessing.get_context('spawn').Pool(1)
+            try:
+                result = pool.apply_async(run_quick_check, (db_path,))
+                while not result.ready():
+                    if is_canceled and is_canceled():
+                        raise OperationCanceled()
+                    result.wait(0.2)
+                rows = result.get()
+            finally:
+                pool.terminate()
+        finally:
+            if is_temp and os.path.exists(db_path):
+                os.remove(db_path)
+        
+        if rows == ['ok']:
+            report.append("quick_check: 通过")
+        else:
+            report.append("quick_check: 发现问题")
+            report.extend(rows)
+            ok = False
+    
+    return ok, report
+
+
+def restore_backup_online(backup_path, target_conn, work_dir, pages_per_step=1024,
+                          progress=None, is_canceled=None):
+    """通过在线备份 API 将备份恢复到已打开的连接，返回恢复的页数
+    
+    有 .meta 时先核对校验和；复制分步进行，中途取消或失败时目标库回滚到恢复前的状态。
+    """
+    # 目标连接处于事务中时在线备份 API 会报 "destination database is in use"
+    require_idle_connection(target_conn)
+    if os.path.exists(f"{backup_path}.meta"):
+        if progress:
+            progress(0, "正在核对备份校验和...")
+        ok, report = verify_backup(
+            backup_path,
+            progress=lambda percent, message: progress(percent * 20 // 100, message) if progress else None,
+            is_canceled=is_canceled)
+        if not ok:
+            raise ValueError("备份校验失败:\n" + "\n".join(report))
+    
+    if progress:
+        progress(20, "正在准备备份文件...")
+    restore_path, is_temp = materialize_backup(backup_path, work_dir, is_canceled=is_canceled)
+    restored_pages = 0
+    
+    def on_restore_progress(status, remaining, total):
+        nonlocal restored_pages
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        restored_pages = total
+        if progress:
+            percent = 30 + int((total - remaining) * 70 / total) if total else 100
+            progress(percent, f"正在恢复数据... ({total - remaining}/{total} 页)")
+    
+    try:
+        source_conn = sqlite3.connect(f"file:{pathlib.Path(os.path.abspath(restore_path)).as_posix()}?mode=ro",
+                                      uri=True)
+        try:
+            source_conn.backup(target_conn, pages=pages_per_step, progress=on_restore_progress)
+        finally:
+            source_conn.close()
+    finally:
+        if is_temp and os.path.exists(restore_path):
+            os.remove(restore_path)
+    
+    return restored_pages
+
+
+ENCRYPTED_FILE_MAGIC = b"SQLENC01"
+ENCRYPTION_TAG_SIZE = 32
+ENCRYPTION_HEADER_FORMAT = '<8s16s16sIBII'  # 魔数、盐、文件随机数、块大小、scrypt 参数 log2(N)/r/p
+
+
+def derive_encryption_keys(password, salt, log2_n=15, r=8, p=1):
+    """由密码经 scrypt 派生 (加密密钥, 认证密钥)"""
+    key = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=1 << log2_n, r=r, p=p,
+                         maxmem=256 * 1024 * 1024, dklen=64)
+    return key[:32], key[32:]
+
+
+def xor_bytes(data, keystream):
+    """按大整数整体异或，避免逐字节的 Python 循环"""
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(keystream[:len(data)], 'little')).to_bytes(len(data), 'little')
+
+
+def chunk_tag(mac_key, header, index, final, ciphertext):
+    """块认证标签：覆盖文件头、块序号、是否为最后一块以及密文，防止篡改、重排和截断"""
+    mac = hashlib.blake2b(key=mac_key, digest_size=ENCRYPTION_TAG_SIZE)
+    mac.update(header)
+    mac.update(struct.pack('<QB', index, final))
+    mac.update(ciphertext)
+    return mac.digest()
+
+
+def seal_chunk(enc_key, mac_key, header, nonce, index, final, data):
+    """加密一个块并附加认证标签；每块的随机数为 文件随机数 + 块序号，密钥流由 SHAKE-256 生成"""
+    keystream = hashlib.shake_256(enc_key + nonce + struct.pack('<Q', index)).digest(len(data))
+    ciphertext = xor_bytes(data, keystream)
+    return ciphertext + chunk_tag(mac_key, header, index, final, ciphertext)
+
+
+def open_chunk(enc_key, mac_key, header, nonce, index, final, record):
+    """校验认证标签后解密一个块"""
+    ciphertext, tag = record[:-ENCRYPTION_TAG_SIZE], record[-ENCRYPTION_TAG_SIZE:]
+    if not hmac.compare_digest(tag, chunk_tag(mac_key, header, index, final, ciphertext)):
+        raise ValueError("密码错误或加密文件已损坏")
+    keystream = hashlib.shake_256(enc_key + nonce + struct.pack('<Q', index)).digest(len(ciphertext))
+    return xor_bytes(ciphertext, keystream)
+
+
+def crypto_executor(workers):
+    """多个工作者时使用进程池（异或与哈希都持有 GIL），否则在单个线程中处理"""
+    if workers > 1:
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+
+def default_crypto_workers(size):
+    """小文件启动进程池得不偿失，约每 64MB 使用一个工作进程"""
+    return max(1, min(os.cpu_count() or 1, size // (64 * 1024 * 1024)))
+
+
+def is_encrypted_file(path):
+    """判断文件是否为流式加密格式"""
+    with open(path, 'rb') as f:
+        return f.read(len(ENCRYPTED_FILE_MAGIC)) == ENCRYPTED_FILE_MAGIC
+
+
+def encrypt_chunks(chunks, f_out, password, chunk_size=1024 * 1024, workers=1, is_canceled=None):
+    """加密明文块序列并写入 f_out，返回写入的明文字节数
+    
+    除最后一块外每块长度必须为 chunk_size；最后一块带结束标记，
+    明文长度恰为块大小整数倍时追加一个空的结束块，解密时据此发现截断。
+    """
+    salt, nonce = os.urandom(16), os.urandom(16)
+    log2_n, r, p = 15, 8, 1
+    header = struct.pack(ENCRYPTION_HEADER_FORMAT, ENCRYPTED_FILE_MAGIC, salt, nonce, chunk_size, log2_n, r, p)
+    enc_key, mac_key = derive_encryption_keys(password, salt, log2_n, r, p)
+    f_out.write(header)
+    
+    total = 0
+    with crypto_executor(workers) as pool:
+        pending = collections.deque()
+        
+        def submit(index, final, data):
+            pending.append(pool.submit(seal_chunk, enc_key, mac_key, header, nonce, index, final, data))
+            # 限制在途块数量，内存占用与文件大小无关
+            while len(pending) >= workers * 2:
+                f_out.write(pending.popleft().result())
+        
+        index = 0
+        previous = None
+        for data in chunks:
+            if is_canceled and is_canceled():
+                for future in pending:
+                    future.cancel()
+                raise OperationCanceled()
+            if previous is not None:
+                submit(index, False, previous)
+                index += 1
+            previous = data
+            total += len(data)
+        
+        if previous is not None and len(previous) == chunk_size:
+            submit(index, False, previous)
+            index += 1
+            previous = b""
+        submit(index, True, previous if previous is not None else b"")
+        
+        while pending:
+            f_out.write(pending.popleft().result())
+    
+    return total
+
+
+def decrypt_chunks(f_in, password, workers=1, is_canceled=None):
+    """逐块解密 f_in（已位于文件开头），按顺序生成明文块"""
+    header = f_in.read(struct.calcsize(ENCRYPTION_HEADER_FORMAT))
+    if len(header) != struct.calcsize(ENCRYPTION_HEADER_FORMAT) or not header.startswith(ENCRYPTED_FILE_MAGIC):
+        raise ValueError("不是加密数据库文件")
+    _, salt, nonce, chunk_size, log2_n, r, p = struct.unpack(ENCRYPTION_HEADER_FORMAT, header)
+    enc_key, mac_key = derive_encryption_keys(password, salt, log2_n, r, p)
+    record_size = chunk_size + ENCRYPTION_TAG_SIZE
+    
+    with crypto_executor(workers) as pool:
+        pending = collections.deque()
+        index = 0
+        final = False
+        while not final:
+            if is_canceled and is_canceled():
+                for future in pending:
+                    future.cancel()
+                raise OperationCanceled()
+            
+            record = f_in.read(record_size)
+            if len(record) < ENCRYPTION_TAG_SIZE:
+                raise ValueError("加密文件不完整，可能已被截断")
+            final = len(record) < record_size
+            pending.append(pool.submit(open_chunk, enc_key, mac_key, header, nonce, index, final, record))
+            index += 1
+            
+            while len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        
+        while pending:
+            yield pending.popleft().result()
+    
+    if f_in.read(1):
+        raise ValueError("加密文件结尾有多余数据，可能已损坏")
+
+
+def legacy_xor_decrypt_chunks(f_in, password, chunk_size=1024 * 1024):
+    """解密旧版本生成的 SHA-256 循环异或文件"""
+    key = hashlib.sha256(password.encode()).digest()
+    keystream = key * (chunk_size // len(key))
+    for data in iter(lambda: f_in.read(chunk_size), b""):
+        yield xor_bytes(data, keystream)
+
+
+def decrypted_file_chunks(f_in, password, workers=1, is_canceled=None):
+    """按文件头识别流式加密格式或旧版异或格式，按顺序生成明文块"""
+    head = f_in.read(16)
+    f_in.seek(0)
+    if head.startswith(ENCRYPTED_FILE_MAGIC):
+        return decrypt_chunks(f_in, password, workers, is_canceled)
+    if head == b"SQLite format 3\x00":
+        raise ValueError("文件未加密")
+    return legacy_xor_decrypt_chunks(f_in, password)
+
+
+def read_file_chunks(f, chunk_size, progress=None, total=0, message=""):
+    """按固定大小读取文件并报告进度"""
+    done = 0
+    for data in iter(lambda: f.read(chunk_size), b""):
+        done += len(data)
+        if progress:
+            progress(int(done * 100 / max(1, total)), f"{message} ({done // (1024 * 1024)}/{total // (1024 * 1024)} MB)")
+        yield data
+
+
+def replace_file_atomically(temp_path, dest_path):
+    """落盘后原子替换目标文件"""
+    with open(temp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, dest_path)
+
+
+def encrypt_file(input_path, output_path, password, chunk_size=1024 * 1024, workers=None,
+                 progress=None, is_canceled=None):
+    """流式加密文件，写入临时文件后原子替换 output_path（可与 input_path 相同）"""
+    size = os.path.getsize(input_path)
+    workers = workers or default_crypto_workers(size)
+    temp_path = f"{output_path}.tmp"
+    try:
+        with open(input_path, 'rb') as f_in, open(temp_path, 'wb') as f_out:
+            encrypt_chunks(read_file_chunks(f_in, chunk_size, progress, size, "正在加密数据库..."),
+                           f_out, password, chunk_size, workers, is_canceled)
+        replace_file_atomically(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def decrypt_file(input_path, output_path, password, workers=None, progress=None, is_canceled=None):
+    """流式解密文件，认证全部通过后才原子替换 output_path；旧版异或格式自动识别"""
+    size = os.path.getsize(input_path)
+    workers = workers or default_crypto_workers(size)
+    temp_path = f"{output_path}.tmp"
+    try:
+        with open(input_path, 'rb') as f_in, open(temp_path, 'wb') as f_out:
+            for data in decrypted_file_chunks(f_in, password, workers, is_canceled):
+                if is_canceled and is_canceled():
+                    raise OperationCanceled()
+                f_out.write(data)
+                if progress:
+                    done = f_in.tell()
+                    progress(int(done * 100 / max(1, size)),
+                             f"正在解密数据库... ({done // (1024 * 1024)}/{size // (1024 * 1024)} MB)")
+        replace_file_atomically(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_encrypted_database(path, password, workers=None, progress=None, is_canceled=None):
+    """将加密数据库直接解密到内存并通过 deserialize 打开，不落地明文文件，返回内存连接"""
+    if not hasattr(sqlite3.Connection, 'deserialize'):
+        raise RuntimeError("在内存中打开加密数据库需要 Python 3.11 及以上版本")
+    
+    size = os.path.getsize(path)
+    buffer = bytearray()
+    with open(path, 'rb') as f:
+        for data in decrypted_file_chunks(f, password, workers or default_crypto_workers(size), is_canceled):
+            if is_canceled and is_canceled():
+                raise OperationCanceled()
+            buffer += data
+            if progress:
+                done = f.tell()
+                progress(int(done * 100 / max(1, size)),
+                         f"正在解密数据库... ({done // (1024 * 1024)}/{size // (1024 * 1024)} MB)")
+    
+    if not buffer.startswith(b"SQLite format 3\x00"):
+        raise ValueError("密码错误或文件不是加密的数据库")
+    
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    conn.deserialize(buffer)
+    return conn
+
+
+def save_encrypted_database(conn, path, password, chunk_size=1024 * 1024, workers=None,
+                            progress=None, is_canceled=None):
+    """serialize 内存数据库并重新加密，写入临时文件后原子替换 path"""
+    data = conn.serialize()
+    view = memoryview(data)
+    workers = workers or default_crypto_workers(len(data))
+    
+    def chunks():
+        for offset in range(0, len(data), chunk_size):
+            if progress:
+                progress(int(offset * 100 / max(1, len(data))), "正在加密并保存数据库...")
+            yield bytes(view[offset:offset + chunk_size])
+    
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'wb') as f_out:
+            encrypt_chunks(chunks(), f_out, password, chunk_size, workers, is_canceled)
+        replace_file_atomically(temp_path, path)
+    finally:
+        view.release()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class BulkLoadProfile:
+    """批量导入期间临时使用 synchronous=OFF、journal_mode=MEMORY，结束后恢复原设置
+    
+    需在事务之外进入；导入中途断电可能损坏数据库，仅在可重新导入的场景下启用。
+    """
+    def __init__(self, conn, enabled=True):
+        self.conn = conn
+        self.enabled = enabled
+        self.saved = None
+    
+    def __enter__(self):
+        if self.enabled:
+            self.saved = (self.conn.execute("PRAGMA synchronous").fetchone()[0],
+                          self.conn.execute("PRAGMA journal_mode").fetchone()[0])
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute("PRAGMA journal_mode=MEMORY")
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.saved:
+            synchronous, journal_mode = self.saved
+            self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        return False
+
+
+CSV_INTEGER_PATTERN = re.compile(r"[+-]?\d+")
+CSV_REAL_PATTERN = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+CSV_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}$")
+CSV_DATETIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$")
+
+
+def quote_identifier(name):
+    """为 SQL 标识符加双引号，允许表名、列名中出现空格、关键字等"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def detect_file_encoding(file_path, candidates=('utf-8', 'gbk'), sample_size=1024 * 1024):
+    """根据文件开头的样本检测编码，带 BOM 的 UTF-8 返回 utf-8-sig，都不匹配时返回 latin-1"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    
+    for encoding in candidates:
+        try:
+            # 样本末尾可能截断多字节字符，使用增量解码器且不结束输入
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+def sniff_csv_format(file_path, encoding, sample_size=64 * 1024):
+    """用 csv.Sniffer 检测分隔符等格式，返回 (reader 参数字典, 是否有表头)
+    
+    返回普通字典而不是 Dialect 类，便于传给其他进程。
+    """
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        sample = f.read(sample_size)
+    
+    try:
+        sniffer = csv.Sniffer()
+        dialect = sniffer.sniff(sample, delimiters=",;\t|")
+        has_header = sniffer.has_header(sample)
+    except csv.Error:
+        dialect, has_header = csv.excel, True
+    
+    params = {
+        'delimiter': dialect.delimiter,
+        'quotechar': dialect.quotechar or '"',
+        # 样本中没有出现成对引号时 Sniffer 会判定为 False，没有转义字符时按标准 CSV 处理
+        'doublequote': dialect.doublequote or not dialect.escapechar,
+        'escapechar': dialect.escapechar,
+        'skipinitialspace': dialect.skipinitialspace
+    }
+    return params, has_header
+
+
+def sanitize_column_names(headers):
+    """整理表头：去掉首尾空白，空列名改为 columnN，重名（不区分大小写）时追加序号"""
+    names = []
+    seen = set()
+    for i, header in enumerate(headers, 1):
+        base = header.strip() or f"column{i}"
+        name, n = base, 2
+        while name.lower() in seen:
+            name, n = f"{base}_{n}", n + 1
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+
+def reservoir_sample(rows, k, rng=None):
+    """从任意长度的行序列中等概率抽取 k 行（Algorithm L），返回 (样本, 总行数)
+    
+    按几何分布跳过行，被跳过的行只经过 C 实现的 csv 解析，不进入 Python 循环。
+    """
+    rng = rng or random.Random()
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, k))
+    total = len(sample)
+    if total < k or k <= 0:
+        return sample, total
+    
+    w = math.exp(math.log(rng.random()) / k)
+    while True:
+        skip = int(math.log(rng.random()) / math.log(1 - w)) if w < 1 else 0
+        skipped = sum(1 for _ in itertools.islice(rows, skip))
+        total += skipped
+        row = next(rows, None)
+        if skipped < skip or row is None:
+            return sample, total
+        total += 1
+        sample[rng.randrange(k)] = row
+        w *= math.exp(math.log(rng.random()) / k)
+
+
+def infer_value_type(value):
+    """推断单个非空值的类型；有前导零的数字按文本处理，避免丢失前导零
+    
+    只有普通的十进制写法才视为数字，nan、inf、1_000 等 float() 接受的写法按文本处理。
+    """
+    if CSV_INTEGER_PATTERN.fullmatch(value):
+        digits = value.lstrip('+-')
+        return "TEXT" if len(digits) > 1 and digits.startswith('0') else "INTEGER"
+    if CSV_REAL_PATTERN.fullmatch(value):
+        return "REAL"
+    if CSV_DATE_PATTERN.match(value):
+        return "DATE"
+    if CSV_DATETIME_PATTERN.match(value):
+        return "DATETIME"
+    return "TEXT"
+
+
+def infer_column_types(sample, column_count):
+    """根据样本推断每列的类型并统计空值率、最大长度，返回字典列表"""
+    columns = []
+    for i in range(column_count):
+        values = [row[i] if i < len(row) else "" for row in sample]
+        non_empty = [value for value in values if value]
+        types = set(infer_value_type(value) for value in non_empty)
+        
+        if not types:
+            col_type = "TEXT"
+        elif len(types) == 1:
+            col_type = types.pop()
+        elif types <= {"INTEGER", "REAL"}:
+            col_type = "REAL"
+        elif types <= {"DATE", "DATETIME"}:
+            col_type = "DATETIME"
+        else:
+            col_type = "TEXT"
+        
+        columns.append({
+            'type': col_type,
+            'null_rate': 1 - len(non_empty) / len(values) if values else 0.0,
+            'max_length': max((len(value) for value in values), default=0),
+            'example': non_empty[0] if non_empty else ""
+        })
+    return columns
+
+
+def analyze_csv_file(file_path, encoding=None, has_header=None, sample_size=1000, rng=None):
+    """分析 CSV 文件：检测编码与格式、整理表头，并按蓄水池样本推断列类型
+    
+    encoding、has_header 为 None 时自动检测。
+    返回包含 encoding、dialect、has_header、columns（name/type/null_rate/max_length/example）
+    与 row_count 的字典。
+    """
+    encoding = encoding or detect_file_encoding(file_path)
+    dialect, sniffed_header = sniff_csv_format(file_path, encoding)
+    if has_header is None:
+        has_header = sniffed_header
+    
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        reader = csv.reader(f, **dialect)
+        first_row = next(reader, [])
+        rows = reader if has_header else itertools.chain([first_row], reader)
+        sample, row_count = reservoir_sample((row for row in rows if row), sample_size, rng)
+    
+    column_count = max([len(first_row)] + [len(row) for row in sample])
+    headers = first_row if has_header else []
+    names = sanitize_column_names(list(headers) + [""] * (column_count - len(headers)))
+    
+    columns = infer_column_types(sample, column_count)
+    for name, column in zip(names, columns):
+        column['name'] = name
+    
+    return {
+        'encoding': encoding,
+        'dialect': dialect,
+        'has_header': has_header,
+        'columns': columns,
+        'row_count': row_count
+    }
+
+
+def iter_csv_batches(reader, column_count, batch_size):
+    """将 CSV 行按批次分组，空字符串及缺少的末尾字段转为 NULL"""
+    batch = []
+    for row in reader:
+        if len(row) != column_count:
+            if not row:
+                continue
+            if len(row) > column_count:
+                raise ValueError(f"第 {reader.line_num} 行有 {len(row)} 列，多于表头的 {column_count} 列")
+            row = row + [""] * (column_count - len(row))
+        batch.append([cell if cell else None for cell in row])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def find_csv_record_boundaries(file_path, chunk_size, quotechar='"', encoding='utf-8', skip_first_record=False):
+    """按约 chunk_size 字节将 CSV 文件切分在记录边界上，返回分界偏移列表（含首尾）
+    
+    用 bytes.count 统计引号个数的奇偶判断是否位于引号内，引号内的换行不会被当作分界；
+    成对转义的引号不改变奇偶。skip_first_record 时第一个偏移为表头之后。
+    """
+    quote = quotechar.encode(encoding)
+    file_size = os.path.getsize(file_path)
+    boundaries = [0]
+    in_quotes = False
+    seeking = skip_first_record
+    next_target = 0 if skip_first_record else chunk_size
+    pos = 0
+    
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            i = 0
+            while True:
+                if not seeking:
+                    if next_target >= pos + len(block):
+                        in_quotes ^= bool(block.count(quote, i) & 1)
+                        break
+                    target = next_target - pos
+                    in_quotes ^= bool(block.count(quote, i, target) & 1)
+                    i = target
+                    seeking = True
+                
+                newline = block.find(b"\n", i)
+                if newline < 0:
+                    in_quotes ^= bool(block.count(quote, i) & 1)
+                    break
+                in_quotes ^= bool(block.count(quote, i, newline) & 1)
+                i = newline + 1
+                if not in_quotes:
+                    if skip_first_record:
+                        boundaries[0] = pos + i
+                    else:
+                        boundaries.append(pos + i)
+                    skip_first_record = False
+                    seeking = False
+                    next_target = pos + i + chunk_size
+            pos += len(block)
+    
+    if skip_first_record:
+        # 只有表头没有数据
+        boundaries[0] = file_size
+    if boundaries[-1] < file_size:
+        boundaries.append(file_size)
+    return boundaries
+
+
+def convert_csv_value(value, col_type):
+    """按列类型将文本转换为整数或浮点数；不是普通十进制数字的文本（如 nan、1_000）保留原文本"""
+    if col_type == "INTEGER" and CSV_INTEGER_PATTERN.fullmatch(value):
+        return int(value)
+    if col_type == "REAL" and CSV_REAL_PATTERN.fullmatch(value):
+        return float(value)
+    return value
+
+
+def parse_csv_chunk(file_path, start, end, encoding, dialect, column_types):
+    """解析文件中 [start, end) 范围的 CSV 记录并转换类型（在工作进程中运行），返回 (行列表, 字节数)"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    
+    column_count = len(column_types)
+    reader = csv.reader(io.StringIO(text, newline=''), **(dialect or {}))
+    converters = [(i, col_type) for i, col_type in enumerate(column_types) if col_type in ("INTEGER", "REAL")]
+    rows = []
+    for row in reader:
+        if len(row) != column_count:
+            if not row:
+                continue
+            if len(row) > column_count:
+                raise ValueError(f"文件偏移 {start} 起的数据块第 {reader.line_num} 行有 {len(row)} 列，"
+                                 f"多于表头的 {column_count} 列")
+            row = row + [""] * (column_count - len(row))
+        row = [cell if cell else None for cell in row]
+        for i, col_type in converters:
+            if row[i] is not None:
+                row[i] = convert_csv_value(row[i], col_type)
+        rows.append(row)
+    return rows, end - start
+
+
+def iter_csv_serial_batches(f, reader, column_count, batch_size):
+    """单进程读取，生成 (行批次, 已读取字节数)"""
+    for batch in iter_csv_batches(reader, column_count, batch_size):
+        yield batch, f.buffer.tell()
+
+
+def iter_csv_parallel_batches(file_path, column_types, encoding, dialect, has_header, workers,
+                              chunk_size=16 * 1024 * 1024, ordered=True, is_canceled=None):
+    """多进程解析：在记录边界上切块，进程池并行解析与类型转换，生成 (行批次, 已处理字节数)
+    
+    在途块数限制为工作进程数的两倍，内存占用与文件大小无关；ordered 为 False 时
+    按完成顺序返回，不等待较慢的块。
+    """
+    quotechar = (dialect or {}).get('quotechar') or '"'
+    boundaries = find_csv_record_boundaries(file_path, chunk_size, quotechar, encoding, has_header)
+    ranges = list(zip(boundaries, boundaries[1:]))
+    done = boundaries[0]
+    
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = collections.deque()
+        try:
+            for start, end in ranges:
+                if is_canceled and is_canceled():
+                    raise OperationCanceled()
+                pending.append(pool.submit(parse_csv_chunk, file_path, start, end, encoding, dialect, column_types))
+                
+                while len(pending) >= workers * 2:
+                    if ordered:
+                        future = pending.popleft()
+                    else:
+                        completed, _ = concurrent.futures.wait(
+                            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        future = completed.pop()
+                        pending.remove(future)
+                    rows, size = future.result()
+                    done += size
+                    yield rows, done
+            
+            while pending:
+                rows, size = pending.popleft().result()
+                done += size
+                yield rows, done
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def import_csv_file(conn, file_path, table_name, columns, encoding='utf-8', dialect=None, has_header=True,
+                    batch_size=10000, bulk_load=False, workers=1, ordered=True, progress=None, is_canceled=None):
+    """流式导入 CSV 文件，返回导入的行数
+    
+    columns 为 [(列名, 类型), ...]，通常来自 analyze_csv_file 并经用户确认。
+    workers 大于 1 时由多个进程并行解析，仍由当前连接单线程写入。
+    按批次 executemany 写入，整个导入在一个事务中完成，取消或出错时全部回滚。
+    """
+    require_idle_connection(conn)
+    size = os.path.getsize(file_path)
+    count = 0
+    start = time.time()
+    # 使用反斜杠转义的 CSV 无法按引号奇偶切分，只能单进程解析
+    parallel = workers > 1 and not (dialect or {}).get('escapechar')
+    
+    with open(file_path, 'r', encoding=encoding, newline='') as f, BulkLoadProfile(conn, bulk_load):
+        if parallel:
+            batches = iter_csv_parallel_batches(
+                file_path, [col_type for _, col_type in columns], encoding, dialect, has_header,
+                workers, ordered=ordered, is_canceled=is_canceled)
+        else:
+            reader = csv.reader(f, **(dialect or {}))
+            if has_header:
+                next(reader, None)
+            batches = iter_csv_serial_batches(f, reader, len(columns), batch_size)
+        
+        conn.execute("BEGIN")
+        try:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table_name)} ("
+                         + ", ".join(f"{quote_identifier(name)} {col_type}" for name, col_type in columns) + ")")
+            insert_sql = (f"INSERT INTO {quote_identifier(table_name)} "
+                          f"({', '.join(quote_identifier(name) for name, _ in columns)}) "
+                          f"VALUES ({', '.join(['?'] * len(columns))})")
+            
+            for batch, bytes_done in batches:
+                if is_canceled and is_canceled():
+                    raise OperationCanceled()
+                conn.executemany(insert_sql, batch)
+                count += len(batch)
+                
+                if progress:
+                    rate = count / max(time.time() - start, 0.001)
+                    progress(int(bytes_done * 100 / max(1, size)), f"已导入 {count} 行 ({rate:.0f} 行/秒)")
+            
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            batches.close()
+    
+    return count
+
+
+def jsonl_value(value):
+    """将 JSON 值转换为 SQLite 值：对象和数组保存为 JSON 文本，布尔值保存为 0/1"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def iter_jsonl_records(f):
+    """逐行解析 JSON Lines（二进制方式读取），跳过空行，生成 (对象, 行号, 已读取字节数)"""
+    bytes_done = 0
+    for line_no, line in enumerate(f, 1):
+        bytes_done += len(line)
+        if line_no == 1 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"第 {line_no} 行不是有效的 JSON: {str(e)}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"第 {line_no} 行不是 JSON 对象")
+        yield record, line_no, bytes_done
+
+
+def analyze_jsonl_file(file_path, sample_size=1000):
+    """读取前 sample_size 条记录，按键首次出现的顺序得到列，并推断列类型
+    
+    返回 {'columns': [{'key', 'name', 'type', 'null_rate', 'example'}, ...], 'sampled': 记录数}。
+    """
+    keys = {}
+    records = 0
+    with open(file_path, 'rb') as f:
+        for record, _, _ in iter_jsonl_records(f):
+            records += 1
+            for key, value in record.items():
+                keys.setdefault(key, []).append(value)
+            if records >= sample_size:
+                break
+    
+    sanitized = sanitize_column_names(list(keys))
+    columns = []
+    for (key, values), name in zip(keys.items(), sanitized):
+        kinds = {type(jsonl_value(value)) for value in values if value is not None}
+        if kinds and kinds <= {int}:
+            col_type = "INTEGER"
+        elif kinds and kinds <= {int, float}:
+            col_type = "REAL"
+        else:
+            col_type = "TEXT"
+        non_null = [value for value in values if value is not None]
+        columns.append({
+            'key': key,
+            'name': name,
+            'type': col_type,
+            'null_rate': 1 - len(non_null) / max(1, records),
+            'example': str(jsonl_value(non_null[0])) if non_null else "",
+        })
+    return {'columns': columns, 'sampled': records}
+
+
+def import_jsonl_file(conn, file_path, table_name, columns, batch_size=10000, bulk_load=False,
+                      progress=None, is_canceled=None):
+    """流式导入 JSON Lines 文件，返回导入的行数
+    
+    columns 为 [(JSON 键, 列名, 类型), ...]，通常来自 analyze_jsonl_file 并经用户确认；
+    未列出的键被忽略，缺少的键写入 NULL。表不存在时按 columns 创建。
+    按批次 executemany 写入，整个导入在一个事务中完成，取消或出错时全部回滚。
+    """
+    require_idle_connection(conn)
+    size = os.path.getsize(file_path)
+    keys = [key for key, _, _ in columns]
+    count = 0
+    start = time.time()
+    
+    with open(file_path, 'rb') as f, BulkLoadProfile(conn, bulk_load):
+        conn.execute("BEGIN")
+        try:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table_name)} ("
+                         + ", ".join(f"{quote_identifier(name)} {col_type}" for _, name, col_type in columns) + ")")
+            insert_sql = (f"INSERT INTO {quote_identifier(table_name)} "
+                          f"({', '.join(quote_identifier(name) for _, name, _ in columns)}) "
+                          f"VALUES ({', '.join(['?'] * len(columns))})")
+            
+            batch = []
+            bytes_done = 0
+            for record, _, bytes_done in iter_jsonl_records(f):
+                batch.append([jsonl_value(record.get(key)) for key in keys])
+                if len(batch) < batch_size:
+                    continue
+                if is_canceled and is_canceled():
+                    raise OperationCanceled()
+                conn.executemany(insert_sql, batch)
+                count += len(batch)
+                batch = []
+                
+                if progress:
+                    rate = count / max(time.time() - start, 0.001)
+                    progress(int(bytes_done * 100 / max(1, size)), f"已导入 {count} 行 ({rate:.0f} 行/秒)")
+            
+            if batch:
+                conn.executemany(insert_sql, batch)
+                count += len(batch)
+            
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    
+    return count
+
+
+SQL_TRANSACTION_CONTROL = re.compile(
+    r"(\s*--[^\n]*\n)*\s*(BEGIN(\s+(DEFERRED|IMMEDIATE|EXCLUSIVE))?|COMMIT|END)(\s+TRANSACTION)?\s*;\s*$", re.IGNORECASE)
+
+
+SQL_LEADING_TRIVIA = re.compile(r"(?:\s+|--[^\n]*|/\*.*?(?:\*/|\Z))*", re.DOTALL)
+
+
+def iter_sql_statements(f):
+    """逐行读取 SQL 脚本，用 sqlite3.complete_statement 切分出完整语句，生成 (语句, 起始行号)
+    
+    只在出现分号的行上检查语句是否完整，一行中的多条语句也会被分开。
+    起始行号是语句中第一个不属于空白和注释的字符所在的行。
+    """
+    pending = ""
+    pending_line = None  # pending 第一个字符所在的行号
+    
+    def start_line(statement):
+        offset = SQL_LEADING_TRIVIA.match(statement).end()
+        if offset == len(statement):
+            # 只有注释（如脚本末尾的注释）时取第一个非空白字符
+            offset = len(statement) - len(statement.lstrip())
+        return pending_line + statement.count('\n', 0, offset)
+    
+    for line_no, line in enumerate(f, 1):
+        if not pending:
+            if not line.strip():
+                continue
+            pending_line = line_no
+        
+        checked = len(pending)
+        pending += line
+        position = pending.find(';', checked)
+        while position >= 0:
+            if sqlite3.complete_statement(pending[:position + 1]):
+                # 语句后面的同行注释一并归入该语句
+                end = len(pending) if not pending[position + 1:].strip() else position + 1
+                statement = pending[:end]
+                yield statement, start_line(statement)
+                pending = pending[end:]
+                if not pending.strip():
+                    pending = ""
+                    break
+                pending_line += statement.count('\n')
+                position = pending.find(';')
+            else:
+                position = pending.find(';', position + 1)
+    
+    if pending.strip():
+        yield pending, start_line(pending)
+
+
+def import_sql_file(conn, file_path, encoding=None, savepoint_every=1000, keep_partial=False,
+                    bulk_load=False, progress=None, is_canceled=None):
+    """流式执行 SQL 脚本，返回执行的语句数
+    
+    所有语句在一个事务中执行（脚本自带的 BEGIN/COMMIT 被忽略），每 savepoint_every
+    条语句设置一个保存点。出错或取消时默认全部回滚；keep_partial 为 True 时回滚到
+    最近的保存点并提交之前已完成的部分。出错时抛出带行号的 SqlImportError。
+    """
+    require_idle_connection(conn)
+    encoding = encoding or detect_file_encoding(file_path)
+    size = os.path.getsize(file_path)
+    count = 0
+    start = time.time()
+    
+    with open(file_path, 'r', encoding=encoding) as f, BulkLoadProfile(conn, bulk_load):
+        conn.execute("BEGIN")
+        conn.execute("SAVEPOINT sql_import")
+        try:
+            for statement, line_no in iter_sql_statements(f):
+                if SQL_TRANSACTION_CONTROL.match(statement):
+                    continue
+                if is_canceled and is_canceled():
+                    raise OperationCanceled()
+                
+                try:
+                    conn.execute(statement)
+                except sqlite3.Error as e:
+                    raise SqlImportError(line_no, statement, e) from e
+                count += 1
+                
+                if count % savepoint_every == 0:
+                    conn.execute("RELEASE sql_import")
+                    conn.execute("SAVEPOINT sql_import")
+                    
+                    if progress:
+                        elapsed = max(time.time() - start, 0.001)
+                        done = f.buffer.tell()
+                        progress(int(done * 100 / max(1, size)),
+                                 f"已执行 {count} 条语句 ({count / elapsed:.0f} 条/秒, "
+                                 f"{done / elapsed / (1024 * 1024):.1f} MB/秒)")
+            
+            conn.execute("RELEASE sql_import")
+            conn.execute("COMMIT")
+        except BaseException:
+            if keep_partial and conn.in_transaction:
+                conn.execute("ROLLBACK TO sql_import")
+                conn.execute("RELEASE sql_import")
+                conn.execute("COMMIT")
+            elif conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+    
+    return count
+
+
+def sql_text_literal(value):
+    """文本字面量；含 NUL 字符的文本无法直接写入 SQL 语句，改用 CAST(X'..' AS TEXT)"""
+    if '\x00' in value:
+        return f"CAST(X'{value.encode('utf-8').hex()}' AS TEXT)"
+    return "'" + value.replace("'", "''") + "'"
+
+
+def sql_real_literal(value):
+    """浮点数字面量；repr 保证往返精确，无穷大写成溢出的常量，NaN 在 SQLite 中即为 NULL"""
+    if value != value:
+        return "NULL"
+    if value in (float('inf'), float('-inf')):
+        return "9e999" if value > 0 else "-9e999"
+    return repr(value)
+
+
+SQL_LITERAL_WRITERS = {
+    type(None): lambda value: "NULL",
+    int: str,
+    bool: lambda value: str(int(value)),
+    float: sql_real_literal,
+    str: sql_text_literal,
+    bytes: lambda value: f"X'{value.hex()}'",
+    memoryview: lambda value: f"X'{value.hex()}'",
+}
+
+
+def sql_literal(value):
+    """将 Python 值转换为 SQL 字面量，BLOB 写为 X'..' 十六进制"""
+    return SQL_LITERAL_WRITERS[type(value)](value)
+
+
+def open_export_file(file_path, encoding='utf-8', newline=None, compress=None, buffer_size=1024 * 1024):
+    """打开导出文件：使用大块写缓冲；compress 为 None 时按 .gz 扩展名决定是否 gzip 压缩"""
+    if compress is None:
+        compress = file_path.lower().endswith('.gz')
+    if compress:
+        raw = gzip.GzipFile(file_path, 'wb', compresslevel=6)
+        return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size), encoding=encoding, newline=newline)
+    return open(file_path, 'w', encoding=encoding, newline=newline, buffering=buffer_size)
+
+
+def list_export_tables(conn, tables=None):
+    """返回要导出的用户表；tables 为 None 时为全部用户表"""
+    all_tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return all_tables if tables is None else [table for table in all_tables if table in tables]
+
+
+class ReadSnapshot:
+    """在一个读事务中导出，各表数据来自同一快照，期间其他连接的写入不可见"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.started = False
+    
+    def __enter__(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+            self.started = True
+        # BEGIN 是延迟的，第一次读取时才真正获取快照
+        self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.started:
+            self.conn.execute("COMMIT")
+        return False
+
+
+class ExportRowCounter:
+    """累计已导出的行数，并以百分比和行/秒报告进度"""
+    def __init__(self, total_rows, progress=None):
+        self.total_rows = max(1, total_rows)
+        self.progress = progress
+        self.exported = 0
+        self.start = time.time()
+        self.lock = threading.Lock()
+    
+    def __call__(self, count):
+        # 并行导出时由多个工作线程同时调用
+        with self.lock:
+            self.exported += count
+            exported = self.exported
+        if self.progress:
+            rate = exported / max(time.time() - self.start, 0.001)
+            self.progress(int(exported * 100 / self.total_rows),
+                          f"已导出 {exported}/{self.total_rows} 行 ({rate:.0f} 行/秒)")
+
+
+def count_table_rows(conn, tables):
+    """统计各表的行数，用于计算导出进度"""
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table)}").fetchone()[0]
+            for table in tables}
+
+
+def write_table_sql(f, conn, table, on_rows=None, is_canceled=None):
+    """以多行 INSERT 流式写出表数据，返回行数"""
+    cursor = conn.execute(f"SELECT * FROM {quote_identifier(table)}")
+    return write_cursor_sql(f, cursor, table, on_rows=on_rows, is_canceled=is_canceled)
+
+
+def write_cursor_sql(f, cursor, table, fetch_size=2000, max_statement_size=1024 * 1024,
+                     on_rows=None, is_canceled=None):
+    """将游标结果写为插入 table 的多行 INSERT，每条语句不超过 max_statement_size 字节，返回行数"""
+    columns = [description[0] for description in cursor.description]
+    prefix = f"INSERT INTO {quote_identifier(table)} ({', '.join(quote_identifier(c) for c in columns)}) VALUES\n"
+    writers = SQL_LITERAL_WRITERS
+    
+    count = 0
+    values = []
+    size = 0
+    
+    def write_statement():
+        f.write(prefix)
+        f.write(",\n".join(values))
+        f.write(";\n")
+        values.clear()
+    
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        
+        for row in rows:
+            value = "(" + ",".join([writers[type(item)](item) for item in row]) + ")"
+            values.append(value)
+            size += len(value)
+            if size >= max_statement_size:
+                write_statement()
+                size = 0
+        
+        count += len(rows)
+        if on_rows:
+            on_rows(len(rows))
+    
+    if values:
+        write_statement()
+    return count
+
+
+def export_database_sql(conn, file_path, tables=None, compress=None, progress=None, is_canceled=None):
+    """流式导出为 SQL 脚本（可 gzip 压缩），返回导出的行数
+    
+    tables 为 None 时导出整个数据库（含索引、视图、触发器），否则只导出指定表及其索引、触发器。
+    整个导出在一个读事务中完成，得到一致的快照。
+    """
+    selected = list_export_tables(conn, tables)
+    
+    with ReadSnapshot(conn):
+        totals = count_table_rows(conn, selected)
+        on_rows = ExportRowCounter(sum(totals.values()), progress)
+        
+        with open_export_file(file_path, compress=compress) as f:
+            write_sql_header(f)
+            for table in selected:
+                write_table_sql_section(f, conn, table, totals[table], on_rows, is_canceled)
+            write_sql_footer(f, conn, selected, tables is None)
+    
+    return on_rows.exported
+
+
+def write_sql_header(f):
+    """写入 SQL 脚本头部注释并开始事务"""
+    f.write("-- SQLite 数据库导出\n")
+    f.write(f"-- 导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    f.write("BEGIN TRANSACTION;\n\n")
+
+
+def write_table_sql_section(f, conn, table, row_count, on_rows=None, is_canceled=None):
+    """写入一个表的建表语句和数据"""
+    create_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+    f.write(f"-- 表: {table} ({row_count} 行)\n")
+    f.write(f"{create_sql};\n")
+    write_table_sql(f, conn, table, on_rows=on_rows, is_canceled=is_canceled)
+    f.write("\n")
+
+
+def write_sql_footer(f, conn, selected, include_views=True):
+    """写入所选表的索引、触发器（以及视图）并提交事务"""
+    # 索引、视图、触发器放在数据之后，避免导入时逐行维护索引
+    for kind, title in (('index', "索引"), ('view', "视图"), ('trigger', "触发器")):
+        if kind == 'view' and not include_views:
+            continue
+        objects = [sql for tbl_name, sql in conn.execute(
+            "SELECT tbl_name, sql FROM sqlite_master WHERE type=? AND sql IS NOT NULL ORDER BY name", (kind,))
+            if kind == 'view' or tbl_name in selected]
+        if objects:
+            f.write(f"-- {title}\n")
+            for sql in objects:
+                f.write(f"{sql};\n")
+            f.write("\n")
+    
+    f.write("COMMIT;\n")
+
+
+EXPORT_FILE_NAME_INVALID_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def export_file_name(table, used_names, extension=".csv"):
+    """根据表名生成合法且不重复的文件名（Windows 文件名不区分大小写）"""
+    base = EXPORT_FILE_NAME_INVALID_CHARS.sub('_', table).strip(' .') or "table"
+    name = base
+    suffix = 2
+    while name.lower() in used_names:
+        name = f"{base}_{suffix}"
+        suffix += 1
+    used_names.add(name.lower())
+    return name + extension
+
+
+def write_table_csv(f, conn, table, dialect=None, header=True, on_rows=None, is_canceled=None):
+    """流式写出一个表的 CSV，返回行数"""
+    cursor = conn.execute(f"SELECT * FROM {quote_identifier(table)}")
+    return write_cursor_csv(f, cursor, dialect, header, on_rows=on_rows, is_canceled=is_canceled)
+
+
+def write_cursor_csv(f, cursor, dialect=None, header=True, fetch_size=2000, on_rows=None, is_canceled=None):
+    """按 fetchmany 批次将游标结果写为 CSV，BLOB 写为十六进制文本，返回行数"""
+    writer = csv.writer(f, **(dialect or {}))
+    if header:
+        writer.writerow([description[0] for description in cursor.description])
+    
+    count = 0
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        
+        if any(type(value) is bytes for row in rows for value in row):
+            rows = [[value.hex() if type(value) is bytes else value for value in row] for row in rows]
+        writer.writerows(rows)
+        
+        count += len(rows)
+        if on_rows:
+            on_rows(len(rows))
+    
+    return count
+
+
+def export_tables_csv(conn, target, tables=None, bundle='directory', compress=None, encoding='utf-8',
+                      dialect=None, header=True, progress=None, is_canceled=None):
+    """流式导出为 CSV，每个表一个文件，返回导出的行数
+    
+    bundle: file 将单个表写入 target 文件；directory 在 target 目录中每表写一个文件；
+    zip 打包为 target 压缩包。compress 为 True 时各文件 gzip 压缩（None 表示按 .gz 扩展名决定）。
+    """
+    def write(f, conn, table, on_rows, is_canceled):
+        write_table_csv(f, conn, table, dialect, header, on_rows=on_rows, is_canceled=is_canceled)
+    
+    return export_tables_text(conn, target, tables, ".csv", write, bundle, compress, encoding, progress, is_canceled)
+
+
+def jsonl_default(value):
+    """JSON 无法表示的 BLOB 写为十六进制文本"""
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"无法转换为 JSON 的值: {value!r}")
+
+
+def write_cursor_jsonl(f, cursor, fetch_size=2000, on_rows=None, is_canceled=None):
+    """按 fetchmany 批次将游标结果写为 JSON Lines，每行一个以列名为键的对象，返回行数"""
+    names = [description[0] for description in cursor.description]
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=jsonl_default).encode
+    
+    count = 0
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        
+        f.write("\n".join([encode(dict(zip(names, row))) for row in rows]))
+        f.write("\n")
+        
+        count += len(rows)
+        if on_rows:
+            on_rows(len(rows))
+    
+    return count
+
+
+def write_table_jsonl(f, conn, table, on_rows=None, is_canceled=None):
+    """将一个表写为 JSON Lines"""
+    cursor = conn.execute(f"SELECT * FROM {quote_identifier(table)}")
+    return write_cursor_jsonl(f, cursor, on_rows=on_rows, is_canceled=is_canceled)
+
+
+def export_tables_jsonl(conn, target, tables=None, bundle='directory', compress=None,
+                        progress=None, is_canceled=None):
+    """流式导出为 JSON Lines，每个表一个文件，返回导出的行数；bundle、compress 与 CSV 导出相同"""
+    def write(f, conn, table, on_rows, is_canceled):
+        write_table_jsonl(f, conn, table, on_rows, is_canceled)
+    
+    return export_tables_text(conn, target, tables, ".jsonl", write, bundle, compress, 'utf-8', progress, is_canceled)
+
+
+def export_tables_text(conn, target, tables, extension, write_table, bundle='directory', compress=None,
+                       encoding='utf-8', progress=None, is_canceled=None):
+    """将各表写入单个文件、目录或 zip 压缩包，write_table(f, conn, table, on_rows, is_canceled) 写出一个表"""
+    selected = list_export_tables(conn, tables)
+    if bundle == 'file' and len(selected) != 1:
+        raise ValueError("导出为单个文件时只能选择一个表")
+    
+    with ReadSnapshot(conn):
+        on_rows = ExportRowCounter(sum(count_table_rows(conn, selected).values()), progress)
+        used_names = set()
+        
+        if bundle == 'file':
+            with open_export_file(target, encoding, '', compress) as f:
+                write_table(f, conn, selected[0], on_rows, is_canceled)
+        elif bundle == 'zip':
+            with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+                for table in selected:
+                    raw = archive.open(export_file_name(table, used_names, extension), 'w', force_zip64=True)
+                    with io.TextIOWrapper(io.BufferedWriter(raw, 1024 * 1024), encoding=encoding, newline='') as f:
+                        write_table(f, conn, table, on_rows, is_canceled)
+        else:
+            os.makedirs(target, exist_ok=True)
+            for table in selected:
+                file_name = export_file_name(table, used_names, extension + ".gz" if compress else extension)
+                with open_export_file(os.path.join(target, file_name), encoding, '', bool(compress)) as f:
+                    write_table(f, conn, table, on_rows, is_canceled)
+    
+    return on_rows.exported
+
+
+COLUMNAR_EXPORT_EXTENSIONS = {'parquet': ".parquet", 'arrow': ".arrow"}
+
+
+def load_pyarrow():
+    """按需加载可选依赖 pyarrow（Parquet/Arrow IPC 导出），未安装时返回 None"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def column_affinity(declared_type):
+    """按 SQLite 的规则由声明类型确定列亲和性"""
+    declared = (declared_type or "").upper()
+    if "INT" in declared:
+        return "INTEGER"
+    if "CHAR" in declared or "CLOB" in declared or "TEXT" in declared:
+        return "TEXT"
+    if not declared or "BLOB" in declared:
+        return "BLOB"
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return "REAL"
+    return "NUMERIC"
+
+
+def arrow_column_type(pa, declared_type):
+    """声明类型对应的 Arrow 类型；无法由声明确定时返回 None，由第一批数据决定
+    
+    日期时间在 SQLite 中通常以文本保存，按字符串导出。NUMERIC 亲和性的列（DECIMAL、BOOLEAN 等）
+    可能全部是整数，转为浮点会丢失 2**53 以上的精度，因此同样由数据决定。
+    """
+    declared = (declared_type or "").upper()
+    if ("DATE" in declared or "TIME" in declared) and "INT" not in declared:
+        return pa.string()
+    affinity = column_affinity(declared_type)
+    if affinity == "INTEGER":
+        return pa.int64()
+    if affinity == "TEXT":
+        return pa.string()
+    if affinity == "REAL":
+        return pa.float64()
+    return None
+
+
+def query_storage_classes(conn, sql, column_count):
+    """扫描一遍查询结果，返回每列出现过的存储类型集合（typeof 的结果）；语句无法作为子查询时返回 None
+    
+    SQLite 同一列可以混存不同类型的值，只看声明类型或第一批数据时，后面的值可能无法写入已确定的列类型。
+    """
+    names = [f"c{index}" for index in range(column_count)]
+    try:
+        row = conn.execute(f"WITH export_rows({', '.join(names)}) AS ({sql}) SELECT "
+                           + ", ".join(f"group_concat(DISTINCT typeof({name}))" for name in names)
+                           + " FROM export_rows").fetchone()
+    except sqlite3.Error:
+        return None
+    return [set(value.split(",")) - {"null"} if value else set() for value in row]
+
+
+def arrow_storage_type(pa, declared_type, storage_classes):
+    """由列中实际出现的存储类型确定 Arrow 类型：整数与浮点混存为 float64，与文本或二进制混存为字符串"""
+    declared = arrow_column_type(pa, declared_type)
+    if not storage_classes:
+        return declared or pa.string()
+    if storage_classes == {"integer"}:
+        actual = pa.int64()
+    elif storage_classes <= {"integer", "real"}:
+        actual = pa.float64()
+    elif storage_classes == {"text"}:
+        actual = pa.string()
+    elif storage_classes == {"blob"}:
+        actual = pa.binary()
+    else:
+        actual = pa.string()
+    # 声明为日期时间等按字符串导出的列保持字符串；REAL 列中的整数按 float64 导出
+    if declared is not None and (declared == actual or pa.types.is_string(declared)
+                                 or (pa.types.is_floating(declared) and actual == pa.int64())):
+        return declared
+    return actual
+
+
+def infer_arrow_type(pa, values):
+    """根据一批值推断 Arrow 类型；类型混杂时按字符串导出"""
+    kinds = {type(value) for value in values if value is not None}
+    if kinds <= {int}:
+        return pa.int64() if kinds else pa.string()
+    if kinds <= {int, float}:
+        return pa.float64()
+    if kinds == {bytes}:
+        return pa.binary()
+    return pa.string()
+
+
+def arrow_column(pa, values, arrow_type, name):
+    """将一列值转换为 Arrow 数组；与列类型不符的值按无损方式转换，无法转换时报错"""
+    if pa.types.is_integer(arrow_type):
+        # Arrow 会把带小数的浮点数直接截断为整数，需要先检查
+        bad = next((value for value in values if type(value) is float and not value.is_integer()), None)
+        if bad is not None:
+            raise ValueError(f"列 {name} 的值 {bad!r} 无法转换为 {arrow_type}")
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        pass
+    
+    if pa.types.is_string(arrow_type):
+        values = [value.hex() if type(value) is bytes else value if value is None or type(value) is str
+                  else str(value) for value in values]
+    elif pa.types.is_binary(arrow_type):
+        values = [value.encode('utf-8') if type(value) is str else value for value in values]
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError) as e:
+        error = e
+    
+    def convertible(value):
+        try:
+            pa.scalar(value, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            return False
+        return True
+    
+    bad = next((value for value in values if value is not None and not convertible(value)), None)
+    if bad is None:
+        raise ValueError(f"列 {name} 无法转换为 {arrow_type}：{error}")
+    raise ValueError(f"列 {name} 的值 {bad!r} 无法转换为 {arrow_type}")
+
+
+def write_cursor_columnar(cursor, file_path, file_format='parquet', declared_types=None, batch_size=65536,
+                          storage_classes=None, on_rows=None, is_canceled=None):
+    """将游标结果按批转换为 Arrow 记录批次，写入 Parquet（每批一个行组）或 Arrow IPC 文件，返回行数
+    
+    storage_classes 为 query_storage_classes 的结果时按每列实际出现的类型确定列类型；
+    否则由声明类型或第一批数据决定，之后出现的其他类型的值可能无法写入。
+    """
+    pa = load_pyarrow()
+    if pa is None:
+        raise RuntimeError("Parquet/Arrow 导出需要安装 pyarrow 模块")
+    
+    names = [description[0] for description in cursor.description]
+    declared_types = declared_types or [None] * len(names)
+    if storage_classes is not None:
+        types = [arrow_storage_type(pa, declared, classes)
+                 for declared, classes in zip(declared_types, storage_classes)]
+    else:
+        types = [arrow_column_type(pa, declared) for declared in declared_types]
+    schema = None
+    writer = None
+    sink = None
+    count = 0
+    
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if schema is None:
+                columns = list(zip(*rows)) if rows else [()] * len(names)
+                types = [arrow_type or infer_arrow_type(pa, column) for arrow_type, column in zip(types, columns)]
+                schema = pa.schema([pa.field(name, arrow_type) for name, arrow_type in zip(names, types)])
+                if file_format == 'parquet':
+                    writer = pa.parquet.ParquetWriter(file_path, schema, compression='zstd')
+                else:
+                    sink = pa.OSFile(file_path, 'wb')
+                    writer = pa.ipc.new_file(sink, schema)
+            if not rows:
+                break
+            if is_canceled and is_canceled():
+                raise OperationCanceled()
+            
+            columns = zip(*rows)
+            batch = pa.record_batch([arrow_column(pa, list(column), arrow_type, name)
+                                     for column, arrow_type, name in zip(columns, types, names)], schema=schema)
+            if file_format == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]), row_group_size=len(rows))
+            else:
+                writer.write_batch(batch)
+            
+            count += len(rows)
+            if on_rows:
+                on_rows(len(rows))
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+    
+    return count
+
+
+def write_table_columnar(conn, table, file_path, file_format='parquet', on_rows=None, is_canceled=None):
+    """按表的声明类型和各列实际存储的类型导出一个表为 Parquet 或 Arrow IPC 文件"""
+    declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_xinfo({quote_identifier(table)})")}
+    sql = f"SELECT * FROM {quote_identifier(table)}"
+    cursor = conn.execute(sql)
+    declared_types = [declared.get(description[0]) for description in cursor.description]
+    storage_classes = query_storage_classes(conn, sql, len(cursor.description))
+    return write_cursor_columnar(cursor, file_path, file_format, declared_types, storage_classes=storage_classes,
+                                 on_rows=on_rows, is_canceled=is_canceled)
+
+
+def export_tables_columnar(conn, target, tables=None, bundle='directory', file_format='parquet',
+                           progress=None, is_canceled=None):
+    """导出为 Parquet 或 Arrow IPC，每个表一个文件，返回导出的行数
+    
+    bundle: file 将单个表写入 target 文件；directory 在 target 目录中每表写一个文件。
+    """
+    if load_pyarrow() is None:
+        raise RuntimeError("Parquet/Arrow 导出需要安装 pyarrow 模块")
+    selected = list_export_tables(conn, tables)
+    if bundle == 'file' and len(selected) != 1:
+        raise ValueError("导出为单个文件时只能选择一个表")
+    
+    with ReadSnapshot(conn):
+        on_rows = ExportRowCounter(sum(count_table_rows(conn, selected).values()), progress)
+        if bundle == 'file':
+            write_table_columnar(conn, selected[0], target, file_format, on_rows, is_canceled)
+        else:
+            os.makedirs(target, exist_ok=True)
+            used_names = set()
+            for table in selected:
+                file_path = os.path.join(target, export_file_name(table, used_names,
+                                                                  COLUMNAR_EXPORT_EXTENSIONS[file_format]))
+                write_table_columnar(conn, table, file_path, file_format, on_rows, is_canceled)
+    
+    return on_rows.exported
+
+
+def export_query(conn, sql, file_path, format='csv', options=None, progress=None, is_canceled=None):
+    """在读事务中重新执行查询，将带类型的结果流式写入文件，返回导出的行数
+    
+    format 为 csv、jsonl、sql、parquet 或 arrow。options 中 CSV 可指定 encoding、dialect、header，
+    SQL 可指定 table_name（INSERT 的目标表名）。文本格式按 .gz 扩展名决定是否压缩。
+    先统计结果行数以显示进度，统计失败时只显示已导出行数。
+    """
+    options = options or {}
+    sql = sql.strip().rstrip(';')
+    
+    with ReadSnapshot(conn):
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+        except sqlite3.Error:
+            total = 0
+        on_rows = ExportRowCounter(total, progress)
+        cursor = conn.execute(sql)
+        if cursor.description is None:
+            raise ValueError("该语句没有返回结果")
+        
+        if format in COLUMNAR_EXPORT_EXTENSIONS:
+            storage_classes = query_storage_classes(conn, sql, len(cursor.description))
+            return write_cursor_columnar(cursor, file_path, format, storage_classes=storage_classes,
+                                         on_rows=on_rows, is_canceled=is_canceled)
+        
+        with open_export_file(file_path, options.get('encoding', 'utf-8'), '') as f:
+            if format == 'jsonl':
+                return write_cursor_jsonl(f, cursor, on_rows=on_rows, is_canceled=is_canceled)
+            if format == 'sql':
+                table = options.get('table_name', "query_result")
+                columns = ", ".join(quote_identifier(description[0]) for description in cursor.description)
+                f.write("".join(f"-- {line}\n" for line in f"查询结果导出: {sql}".splitlines()))
+                f.write(f"-- 导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+                f.write("BEGIN TRANSACTION;\n")
+                f.write(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table)} ({columns});\n")
+                count = write_cursor_sql(f, cursor, table, on_rows=on_rows, is_canceled=is_canceled)
+                f.write("COMMIT;\n")
+                return count
+            return write_cursor_csv(f, cursor, options.get('dialect'), options.get('header', True),
+                                    on_rows=on_rows, is_canceled=is_canceled)
+
+
+def table_exporter(format):
+    """返回导出格式对应的单连接导出函数"""
+    if format == 'csv':
+        return export_tables_csv
+    if format == 'jsonl':
+        return export_tables_jsonl
+    if format in COLUMNAR_EXPORT_EXTENSIONS:
+        return lambda *args, **kwargs: export_tables_columnar(*args, file_format=format, **kwargs)
+    return export_database_sql
+
+
+def export_plan(file_path, single_table=False):
+    """由导出文件名确定导出格式、目标路径和选项，返回 (格式, 目标路径, 选项)
+    
+    导出单个表时直接写入该文件。导出多个表时 .sql 写为一个脚本，.zip 为 CSV 压缩包，
+    其他格式每个表写入以所选文件名（去掉扩展名）命名的目录；无法识别的扩展名按 CSV 处理。
+    """
+    lower_path = file_path.lower()
+    if lower_path.endswith(('.sql', '.sql.gz')):
+        return 'sql', file_path, {}
+    
+    extension = os.path.splitext(lower_path)[1]
+    for file_format, format_extension in COLUMNAR_EXPORT_EXTENSIONS.items():
+        if extension == format_extension:
+            if single_table:
+                return file_format, file_path, {'bundle': 'file'}
+            return file_format, os.path.splitext(file_path)[0], {'bundle': 'directory'}
+    
+    if lower_path.endswith(('.jsonl', '.jsonl.gz')):
+        if single_table:
+            return 'jsonl', file_path, {'bundle': 'file'}
+        return ('jsonl', re.sub(r'\.jsonl(\.gz)?$', '', file_path, flags=re.IGNORECASE),
+                {'bundle': 'directory', 'compress': lower_path.endswith('.gz')})
+    
+    if single_table:
+        return 'csv', file_path, {'bundle': 'file'}
+    if lower_path.endswith('.zip'):
+        return 'csv', file_path, {'bundle': 'zip'}
+    return ('csv', re.sub(r'(\.csv)?(\.gz)?$', '', file_path, flags=re.IGNORECASE),
+            {'bundle': 'directory', 'compress': lower_path.endswith('.gz')})
+
+
+class SnapshotConnections:
+    """打开多个只读连接，并让它们的读事务处于同一个快照
+    
+    先以 BEGIN IMMEDIATE 取得保留锁，使其他连接在此期间无法提交；各只读连接开始读事务后再释放。
+    WAL 和回滚日志模式下都成立。取不到保留锁时（数据库正被长时间写入）只打开一个连接，
+    单个连接的读事务本身就是一致的。连接通过 pool 队列借出和归还。
+    """
+    def __init__(self, db_path, count, timeout=5.0):
+        self.db_path = db_path
+        self.count = max(1, count)
+        self.timeout = timeout
+        self.connections = []
+        self.pool = queue.Queue()
+    
+    def __enter__(self):
+        uri = f"{pathlib.Path(os.path.abspath(self.db_path)).as_uri()}?mode=ro"
+        lock_conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        try:
+            count = self.count
+            try:
+                lock_conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                count = 1
+            
+            for _ in range(count):
+                conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+                self.connections.append(conn)
+                conn.execute("BEGIN")
+                conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        except Exception:
+            self.close()
+            raise
+        finally:
+            if lock_conn.in_transaction:
+                lock_conn.execute("ROLLBACK")
+            lock_conn.close()
+        
+        for conn in self.connections:
+            self.pool.put(conn)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        self.connections = []
+
+
+def append_file(out, path):
+    """将临时分段文件追加到输出文件后删除"""
+    with open(path, 'rb') as f:
+        shutil.copyfileobj(f, out, 1024 * 1024)
+    os.remove(path)
+
+
+def default_export_workers(table_count):
+    """并行导出的线程数：读取和压缩时 SQLite、zlib 都会释放 GIL，线程数可略多于 CPU 核数"""
+    return max(1, min(table_count, (os.cpu_count() or 1) + 1, 8))
+
+
+def export_tables_parallel(db_path, target, tables=None, format='sql', workers=None, options=None,
+                           progress=None, is_canceled=None):
+    """多线程导出多个表，返回导出的行数
+    
+    每个工作线程使用独立的只读连接，所有连接处于同一快照。SQL 格式下各表先写入临时分段文件，
+    再按表名顺序拼接（gzip 的多个成员直接拼接仍是合法的 gzip 文件）；CSV、JSONL、Parquet、Arrow
+    目录格式各表直接写入自己的文件；压缩包格式各表先写入临时文件，再按顺序加入压缩包。
+    """
+    options = dict(options or {})
+    failed = threading.Event()
+    
+    def canceled():
+        return failed.is_set() or bool(is_canceled and is_canceled())
+    
+    with SnapshotConnections(db_path, workers or os.cpu_count() or 1) as snapshot:
+        conn = snapshot.pool.get()
+        selected = list_export_tables(conn, tables)
+        totals = count_table_rows(conn, selected)
+        snapshot.pool.put(conn)
+        
+        # 只有一个连接或一个表时并行没有意义
+        if len(snapshot.connections) == 1 or len(selected) <= 1 or options.get('bundle') == 'file':
+            return table_exporter(format)(snapshot.connections[0], target, tables, **options,
+                                          progress=progress, is_canceled=is_canceled)
+        
+        on_rows = ExportRowCounter(sum(totals.values()), progress)
+        bundle = options.pop('bundle', 'directory')
+        compress = options.pop('compress', None)
+        if compress is None:
+            compress = format == 'sql' and target.lower().endswith('.gz')
+        
+        if format != 'sql' and bundle == 'directory':
+            os.makedirs(target, exist_ok=True)
+            work_dir = target
+        else:
+            work_dir = f"{target}.parts"
+            os.makedirs(work_dir, exist_ok=True)
+        
+        used_names = set()
+        if format == 'sql':
+            file_names = {table: f"{index:05d}.sql" for index, table in enumerate(selected)}
+        elif format in ('csv', 'jsonl'):
+            extension = f".{format}.gz" if compress and bundle != 'zip' else f".{format}"
+            file_names = {table: export_file_name(table, used_names, extension) for table in selected}
+        else:
+            file_names = {table: export_file_name(table, used_names, COLUMNAR_EXPORT_EXTENSIONS[format])
+                          for table in selected}
+        
+        def export_table(table):
+            conn = snapshot.pool.get()
+            try:
+                path = os.path.join(work_dir, file_names[table])
+                if format == 'sql':
+                    with open_export_file(path, compress=compress) as f:
+                        write_table_sql_section(f, conn, table, totals[table], on_rows, canceled)
+                elif format in COLUMNAR_EXPORT_EXTENSIONS:
+                    write_table_columnar(conn, table, path, format, on_rows, canceled)
+                elif format == 'jsonl':
+                    with open_export_file(path, 'utf-8', '', compress and bundle != 'zip') as f:
+                        write_table_jsonl(f, conn, table, on_rows, canceled)
+                else:
+                    with open_export_file(path, options.get('encoding', 'utf-8'), '',
+                                          compress and bundle != 'zip') as f:
+                        write_table_csv(f, conn, table, options.get('dialect'), options.get('header', True),
+                                        on_rows=on_rows, is_canceled=canceled)
+                return path
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                snapshot.pool.put(conn)
+        
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(snapshot.connections)) as pool:
+                futures = [pool.submit(export_table, table) for table in selected]
+                try:
+                    if format == 'sql':
+                        header = os.path.join(work_dir, "header.sql")
+                        with open_export_file(header, compress=compress) as f:
+                            write_sql_header(f)
+                        
+                        with open(target, 'wb') as out:
+                            append_file(out, header)
+                            # 按顺序拼接已完成的分段，尽早释放临时文件占用的磁盘空间
+                            for future in futures:
+                                append_file(out, future.result())
+                            
+                            footer = os.path.join(work_dir, "footer.sql")
+                            conn = snapshot.pool.get()
+                            try:
+                                with open_export_file(footer, compress=compress) as f:
+                                    write_sql_footer(f, conn, selected, tables is None)
+                            finally:
+                                snapshot.pool.put(conn)
+                            append_file(out, footer)
+                    elif bundle == 'zip':
+                        with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+                            for table, future in zip(selected, futures):
+                                path = future.result()
+                                archive.write(path, file_names[table])
+                                os.remove(path)
+                    else:
+                        for future in futures:
+                            future.result()
+                except BaseException:
+                    failed.set()
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            if work_dir != target:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return on_rows.exported
+
+
+COPY_FORMATS = [
+    ('tsv', "制表符分隔 (TSV)"),
+    ('csv', "CSV"),
+    ('markdown', "Markdown 表格"),
+    ('json', "JSON"),
+    ('insert', "INSERT 语句"),
+]
+
+
+def copy_text_value(value):
+    """复制为文本时的单元格内容：NULL 为空，BLOB 为十六进制"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def markdown_cell(value):
+    """Markdown 表格单元格：转义竖线，换行改为 <br>"""
+    return copy_text_value(value).replace("|", "\\|").replace("\r\n", "<br>").replace("\n", "<br>")
+
+
+def format_rows(columns, rows, format='tsv', table_name="table", header=True):
+    """将行数据格式化为复制用的文本
+    
+    format 为 tsv、csv、markdown、json 或 insert。TSV/CSV 中含分隔符、引号或换行的值按 CSV 规则加引号，
+    可直接粘贴到电子表格。
+    """
+    if format in ('tsv', 'csv'):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, dialect='excel-tab' if format == 'tsv' else 'excel', lineterminator='\n')
+        if header:
+            writer.writerow(columns)
+        writer.writerows([[copy_text_value(value) for value in row] for row in rows])
+        return buffer.getvalue().rstrip("\n")
+    
+    if format == 'markdown':
+        lines = ["| " + " | ".join(markdown_cell(column) for column in columns) + " |",
+                 "|" + "|".join(" --- " for _ in columns) + "|"]
+        lines.extend("| " + " | ".join([markdown_cell(value) for value in row]) + " |" for row in rows)
+        return "\n".join(lines)
+    
+    if format == 'json':
+        return json.dumps([dict(zip(columns, row)) for row in rows], ensure_ascii=False, indent=2,
+                          default=jsonl_default)
+    
+    if format == 'insert':
+        writers = SQL_LITERAL_WRITERS
+        prefix = f"INSERT INTO {quote_identifier(table_name)} ({', '.join(quote_identifier(c) for c in columns)}) VALUES ("
+        return "\n".join([prefix + ", ".join([writers[type(value)](value) for value in row]) + ");" for row in rows])
+    
+    raise ValueError(f"不支持的复制格式: {format}")
+
+
+def estimate_text_size(columns, rows, sample_size=100):
+    """按前若干行估算格式化后的文本大小（字节）"""
+    sample = rows[:sample_size]
+    if not sample:
+        return 0
+    sample_size = sum(len(copy_text_value(value)) + 1 for row in sample for value in row)
+    return sample_size * len(rows) // len(sample)
+
+
+PASTE_MODES = [
+    ('insert', "插入"),
+    ('ignore', "插入，主键或唯一约束冲突时跳过"),
+    ('upsert', "插入，主键冲突时更新已有记录"),
+]
+
+
+def parse_clipboard_table(text):
+    """解析从电子表格或本程序复制的表格文本：含制表符时按 TSV，否则按 CSV（自动识别逗号或分号）"""
+    text = text.strip("\r\n")
+    if not text:
+        return []
+    first_line = text.split("\n", 1)[0]
+    if "\t" in first_line:
+        dialect = 'excel-tab'
+    else:
+        dialect = 'excel'
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;")
+        except csv.Error:
+            pass
+    return [row for row in csv.reader(io.StringIO(text), dialect) if any(cell.strip() for cell in row)]
+
+
+def map_paste_columns(table_columns, first_row):
+    """按表头把粘贴的列映射到表的列，返回 (首行是否表头, [(粘贴列序号, 表列名), ...])
+    
+    首行没有任何单元格与列名相同（不区分大小写）时视为数据，按顺序对应表的各列。
+    """
+    names = {name.lower(): name for name in table_columns}
+    matches = [names.get(cell.strip().lower()) for cell in first_row]
+    if any(matches):
+        return True, [(index, name) for index, name in enumerate(matches) if name]
+    return False, list(enumerate(table_columns[:len(first_row)]))
+
+
+def coerce_paste_value(value, affinity):
+    """按列亲和性转换粘贴的文本：空单元格为 NULL，数值列中可解析的数字转换为 int/float"""
+    if value == "":
+        return None
+    if affinity in ("INTEGER", "REAL", "NUMERIC"):
+        text = value.strip()
+        if CSV_INTEGER_PATTERN.fullmatch(text):
+            number = int(text)
+            # 超出 64 位整数范围时与 SQLite 一样按浮点数保存
+            return float(number) if affinity == "REAL" or abs(number) >= 2 ** 63 else number
+        if not CSV_REAL_PATTERN.fullmatch(text):
+            # nan、inf、1_000 等 float() 接受的写法保留原文本
+            return value
+        number = float(text)
+        if affinity != "REAL" and number.is_integer() and abs(number) < 2 ** 63:
+            return int(number)
+        return number
+    return value
+
+
+def paste_rows(conn, table, rows, mode='insert'):
+    """将粘贴的行按表头映射、类型转换后在一个事务中用 executemany 写入表，返回 (写入的行数, 映射)
+    
+    mode: insert 普通插入；ignore 冲突时跳过；upsert 主键冲突时更新映射到的其他列。
+    连接上已有未提交的事务时写入该事务，由调用方决定何时提交。
+    """
+    if not rows:
+        raise ValueError("剪贴板中没有表格数据")
+    
+    table_info = conn.execute(f"PRAGMA table_info({quote_identifier(table)})").fetchall()
+    table_columns = [col[1] for col in table_info]
+    affinities = {col[1]: column_affinity(col[2]) for col in table_info}
+    primary_keys = [col[1] for col in sorted(table_info, key=lambda col: col[5]) if col[5] > 0]
+    
+    has_header, mapping = map_paste_columns(table_columns, rows[0])
+    if not mapping:
+        raise ValueError("无法将粘贴的列对应到表的列")
+    if has_header:
+        rows = rows[1:]
+    
+    names = [name for _, name in mapping]
+    sql = (f"INSERT {'OR IGNORE ' if mode == 'ignore' else ''}INTO {quote_identifier(table)} "
+           f"({', '.join(quote_identifier(name) for name in names)}) VALUES ({', '.join(['?'] * len(names))})")
+    if mode == 'upsert':
+        if not primary_keys or not set(primary_keys) <= set(names):
+            raise ValueError("按主键更新需要表有主键，并且粘贴的数据包含全部主键列")
+        updates = [name for name in names if name not in primary_keys]
+        conflict = f" ON CONFLICT ({', '.join(quote_identifier(name) for name in primary_keys)}) DO "
+        sql += conflict + ("UPDATE SET " + ", ".join(f"{quote_identifier(name)} = excluded.{quote_identifier(name)}"
+                                                     for name in updates) if updates else "NOTHING")
+    
+    column_affinities = [(index, affinities[name]) for index, name in mapping]
+    values = [[coerce_paste_value(row[index] if index < len(row) else "", affinity)
+               for index, affinity in column_affinities] for row in rows]
+    
+    changes = conn.total_changes
+    # 调用方已有未提交的事务时只用保存点，不替调用方提交
+    own_transaction = not conn.in_transaction
+    conn.execute("SAVEPOINT paste_rows")
+    try:
+        conn.executemany(sql, values)
+        conn.execute("RELEASE paste_rows")
+    except BaseException:
+        conn.execute("ROLLBACK TO paste_rows")
+        conn.execute("RELEASE paste_rows")
+        raise
+    if own_transaction and conn.in_transaction:
+        conn.commit()
+    return conn.total_changes - changes, mapping
+
+
+TABLE_COPY_POLICIES = [
+    ('ignore', "跳过主键或唯一约束冲突的行"),
+    ('replace', "替换冲突的行 (INSERT OR REPLACE)"),
+    ('upsert', "按主键更新冲突的行 (UPSERT)"),
+]
+
+SQL_CREATE_TABLE_NAME = re.compile(
+    r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|[^\s(]+)\s*', re.IGNORECASE)
+SQL_CREATE_INDEX_NAME = re.compile(
+    r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|\S+)\s+ON\s+'
+    r'(?:"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|[^\s(]+)\s*', re.IGNORECASE)
+
+
+def create_table_like(conn, source_schema, target_schema, table, target_table=None):
+    """按源表的建表语句在目标库中创建表及其索引（索引使用 IF NOT EXISTS）"""
+    target_table = target_table or table
+    create_sql = conn.execute(
+        f"SELECT sql FROM {quote_identifier(source_schema)}.sqlite_master WHERE type='table' AND name=?",
+        (table,)).fetchone()[0]
+    target = f"{quote_identifier(target_schema)}.{quote_identifier(target_table)}"
+    conn.execute(SQL_CREATE_TABLE_NAME.sub(lambda m: f"CREATE TABLE {target} ", create_sql, count=1))
+    for index_name, index_sql in conn.execute(
+            f"SELECT name, sql FROM {quote_identifier(source_schema)}.sqlite_master "
+            "WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (table,)).fetchall():
+        conn.execute(SQL_CREATE_INDEX_NAME.sub(
+            lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS "
+                      f"{quote_identifier(target_schema)}.{quote_identifier(index_name)} "
+                      f"ON {quote_identifier(target_table)} ", index_sql, count=1))
+
+
+def copy_attached_table(conn, source_schema, target_schema, table, target_table=None, policy='ignore', create=True,
+                        chunk_rows=50000, progress=None, is_canceled=None):
+    """在同一连接的两个数据库（main 或 ATTACH 的库）之间用 INSERT ... SELECT 复制表，返回写入的行数
+    
+    数据不经过 Python；按 rowid 键集分块执行以便显示进度和取消。目标表不存在且 create 为 True 时，
+    按源表的建表语句和索引创建。只复制两个表中同名的列。整个复制在一个事务中完成，取消或出错时全部回滚。
+    """
+    target_table = target_table or table
+    source = f"{quote_identifier(source_schema)}.{quote_identifier(table)}"
+    target = f"{quote_identifier(target_schema)}.{quote_identifier(target_table)}"
+    
+    def table_info(schema, name):
+        return conn.execute(f"PRAGMA {quote_identifier(schema)}.table_info({quote_identifier(name)})").fetchall()
+    
+    source_info = table_info(source_schema, table)
+    if not source_info:
+        raise ValueError(f"源数据库中没有表 {table}")
+    
+    conn.execute("BEGIN")
+    try:
+        target_info = table_info(target_schema, target_table)
+        if not target_info:
+            if not create:
+                raise ValueError(f"目标数据库中没有表 {target_table}")
+            create_table_like(conn, source_schema, target_schema, table, target_table)
+            target_info = table_info(target_schema, target_table)
+        
+        source_columns = {col[1].lower() for col in source_info}
+        columns = [col[1] for col in target_info if col[1].lower() in source_columns]
+        if not columns:
+            raise ValueError("源表和目标表没有同名的列")
+        column_list = ", ".join(quote_identifier(name) for name in columns)
+        
+        sql = f"INSERT {'OR IGNORE ' if policy == 'ignore' else 'OR REPLACE ' if policy == 'replace' else ''}"
+        sql += f"INTO {target} ({column_list}) SELECT {column_list} FROM {source} WHERE "
+        conflict = ""
+        if policy == 'upsert':
+            primary_keys = [col[1] for col in sorted(target_info, key=lambda col: col[5]) if col[5] > 0]
+            if not primary_keys or not set(primary_keys) <= set(columns):
+                raise ValueError("按主键更新需要目标表有主键，并且源表包含全部主键列")
+            updates = [name for name in columns if name not in primary_keys]
+            # INSERT ... SELECT 带 UPSERT 子句时 SELECT 必须有 WHERE，已满足
+            conflict = f" ON CONFLICT ({', '.join(quote_identifier(name) for name in primary_keys)}) DO "
+            conflict += ("UPDATE SET " + ", ".join(f"{quote_identifier(name)} = excluded.{quote_identifier(name)}"
+                                                   for name in updates) if updates else "NOTHING")
+        
+        changes = conn.total_changes
+        try:
+            low = conn.execute(f"SELECT MIN(rowid) FROM {source}").fetchone()[0]
+        except sqlite3.OperationalError:
+            # WITHOUT ROWID 表无法按 rowid 分块，一次复制
+            conn.execute(sql + "true" + conflict)
+        else:
+            if low is not None:
+                # 按 rowid 键集分块：每块的上界取之后第 chunk_rows 行的 rowid，
+                # rowid 稀疏时也不会执行空块，进度按已读取的行数计算
+                total = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+                # 第一块从最小 rowid 开始（含），避免 low - 1 超出 64 位整数范围
+                last, after, done = low, ">=", 0
+                while True:
+                    if is_canceled and is_canceled():
+                        raise OperationCanceled()
+                    row = conn.execute(f"SELECT rowid FROM {source} WHERE rowid {after} ? ORDER BY rowid LIMIT 1 OFFSET ?",
+                                       (last, chunk_rows - 1)).fetchone()
+                    if row is None:
+                        conn.execute(sql + f"rowid {after} ?" + conflict, (last,))
+                        done = total
+                    else:
+                        conn.execute(sql + f"rowid {after} ? AND rowid <= ?" + conflict, (last, row[0]))
+                        last, after, done = row[0], ">", done + chunk_rows
+                    if progress:
+                        copied = conn.total_changes - changes
+                        progress(int(min(done, total) * 100 / max(total, 1)), f"已写入 {copied} 行")
+                    if row is None:
+                        break
+        
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    
+    return conn.total_changes - changes
+
+
+class AttachedDatabases:
+    """在一个连接上同时访问两个数据库，进入后 source、target 为两个库在该连接上的模式名
+    
+    默认在源数据库的新连接上 ATTACH 目标数据库；在内存中打开的加密数据库无法被 ATTACH，
+    此时传入其共享连接（source_conn 或 target_conn），由该连接 ATTACH 另一个数据库文件。
+    """
+    def __init__(self, source_path, target_path, source_conn=None, target_conn=None, alias="other"):
+        if source_conn is not None and target_conn is not None:
+            raise ValueError("两个数据库都在内存中打开，无法同时访问")
+        
+        if target_conn is not None:
+            self.conn, self.attach_path, self.source, self.target = target_conn, source_path, alias, "main"
+        else:
+            self.conn, self.attach_path, self.source, self.target = source_conn, target_path, "main", alias
+        self.alias = alias
+        self.source_path = source_path
+        self.own_conn = self.conn is None
+        self.attached = False
+    
+    def __enter__(self):
+        if self.own_conn:
+            self.conn = sqlite3.connect(self.source_path, isolation_level=None, timeout=30)
+        else:
+            # ATTACH 不能在事务中执行
+            require_idle_connection(self.conn)
+        
+        try:
+            self.conn.execute(f"ATTACH DATABASE ? AS {self.alias}", (self.attach_path,))
+            self.attached = True
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self.attached:
+            self.conn.execute(f"DETACH DATABASE {self.alias}")
+            self.attached = False
+        if self.own_conn:
+            self.conn.close()
+
+
+def copy_table_to_database(source_path, target_path, table, target_table=None, policy='ignore', create=True,
+                           source_conn=None, target_conn=None, progress=None, is_canceled=None):
+    """将表复制或合并到另一个数据库，返回写入的行数"""
+    with AttachedDatabases(source_path, target_path, source_conn, target_conn, "copy_other") as databases:
+        return copy_attached_table(databases.conn, databases.source, databases.target, table, target_table,
+                                   policy, create, progress=progress, is_canceled=is_canceled)
+
+
+class RowDigest:
+    """行摘要聚合函数：对每行 quote() 拼接文本的哈希求和（模 2^64），结果与行的顺序无关
+    
+    使用 Python 内置的字符串哈希，速度快，但不同进程的结果不同，只能在同一连接内比较。
+    """
+    def __init__(self):
+        self.value = 0
+    
+    def step(self, text):
+        self.value += hash(text)
+    
+    def finalize(self):
+        value = self.value & 0xFFFFFFFFFFFFFFFF
+        return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def register_diff_functions(conn):
+    """注册比较数据库使用的 row_digest 聚合函数以及 text_digest、key_bucket 函数"""
+    conn.create_aggregate("row_digest", 1, RowDigest)
+    conn.create_function("text_digest", 1, lambda text: 0 if text is None else hash(text), deterministic=True)
+    conn.create_function("key_bucket", 2, lambda buckets, text: hash(text) % buckets, deterministic=True)
+
+
+class TableDiff:
+    """单个表的比较结果，记录目标库相对源库需要的修改；键为主键值的元组，没有主键的表为 (rowid,)
+    
+    status 为 same、changed、only_source（目标库没有该表）、only_target（源库没有该表）
+    或 schema（两边主键不同，无法按行比较）。
+    """
+    def __init__(self, table, status, key_columns=None, columns=None, message=""):
+        self.table = table
+        self.status = status
+        self.key_columns = key_columns or []
+        self.columns = columns or []
+        self.message = message
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+    
+    def summary(self):
+        """一行文字说明"""
+        if self.status == 'only_source':
+            text = "仅存在于源数据库"
+        elif self.status == 'only_target':
+            text = "仅存在于目标数据库"
+        elif self.status == 'schema':
+            text = "表结构不同，无法按行比较"
+        elif self.status == 'same':
+            text = "相同"
+        else:
+            text = f"新增 {len(self.inserted)} 行，修改 {len(self.updated)} 行，删除 {len(self.deleted)} 行"
+        return f"{self.table}: {text}" + (f"（{self.message}）" if self.message else "")
+
+
+def diff_key_columns(conn, schema, table):
+    """返回表的键列和是否可以按 rowid 区间比较
+    
+    INTEGER PRIMARY KEY 即 rowid，没有主键的表以 rowid 作为键；其他主键和 WITHOUT ROWID 表按主键哈希分桶比较。
+    """
+    info = conn.execute(f"PRAGMA {quote_identifier(schema)}.table_info({quote_identifier(table)})").fetchall()
+    primary_keys = [col for col in sorted(info, key=lambda col: col[5]) if col[5] > 0]
+    try:
+        conn.execute(f"SELECT rowid FROM {quote_identifier(schema)}.{quote_identifier(table)} LIMIT 0")
+    except sqlite3.OperationalError:
+        return [col[1] for col in primary_keys], False
+    
+    if not primary_keys:
+        return ["rowid"], True
+    if len(primary_keys) == 1 and primary_keys[0][2].upper() == "INTEGER":
+        return [primary_keys[0][1]], True
+    return [col[1] for col in primary_keys], False
+
+
+def quote_concat_expression(columns):
+    """各列 quote() 后以逗号拼接的表达式；quote() 的结果区分类型且可以还原，拼接后不会混淆"""
+    return " || ',' || ".join(f"quote({quote_identifier(name)})" for name in columns)
+
+
+def compare_row_texts(diff, source_rows, target_rows):
+    """比较同一键区间内两边的 {键: 行文本}，把差异记入 diff"""
+    for key, text in source_rows.items():
+        target_text = target_rows.get(key)
+        if target_text is None:
+            diff.inserted.append(key)
+        elif target_text != text:
+            diff.updated.append(key)
+    diff.deleted.extend(key for key in target_rows if key not in source_rows)
+
+
+def split_range(low, high, parts):
+    """将整数闭区间等分为不超过 parts 段"""
+    width = max(1, -(-(high - low + 1) // parts))
+    return [(start, min(start + width - 1, high)) for start in range(low, high + 1, width)]
+
+
+def diff_rowid_table(conn, source, target, diff, row_expression, leaf_rows=256, fanout=16,
+                     progress=None, is_canceled=None):
+    """按 rowid 区间分层比较：先比较各区间的行数和摘要，只对不同的区间继续细分，区间足够小时逐行比较
+    
+    每个区间只沿 rowid 的 B 树读取该区间的行；顶层区间约 leaf_rows * fanout 行，内容相同的表只读一遍。
+    """
+    key_list = ", ".join(quote_identifier(name) for name in diff.key_columns)
+    bounds = [conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {name}").fetchone() for name in (source, target)]
+    lows = [low for low, _ in bounds if low is not None]
+    if not lows:
+        return
+    low, high = min(lows), max(high for _, high in bounds if high is not None)
+    top_ranges = split_range(low, high, min(65536, max(fanout, (high - low + 1) // (leaf_rows * fanout))))
+    
+    # 区间内的行文本在 SQLite 中按 rowid 顺序拼接后只调用一次 Python 计算哈希，比逐行聚合快；
+    # 拼接顺序不影响结果的正确性，最终总是逐行比较
+    digest_sql = (f"SELECT COUNT(*), text_digest(group_concat(row_text, char(10))) FROM "
+                  f"(SELECT {row_expression} AS row_text FROM {{}} WHERE rowid BETWEEN ? AND ? ORDER BY rowid)")
+    rows_sql = f"SELECT {key_list}, {row_expression} FROM {{}} WHERE rowid BETWEEN ? AND ?"
+    
+    for done, top_range in enumerate(top_ranges, 1):
+        stack = [top_range]
+        while stack:
+            if is_canceled and is_canceled():
+                raise OperationCanceled()
+            
+            start, end = stack.pop()
+            source_count, source_digest = conn.execute(digest_sql.format(source), (start, end)).fetchone()
+            target_count, target_digest = conn.execute(digest_sql.format(target), (start, end)).fetchone()
+            if source_count == target_count and source_digest == target_digest:
+                continue
+            
+            if min(source_count, target_count) == 0 or max(source_count, target_count) <= leaf_rows \
+                    or end - start < fanout:
+                source_rows = {tuple(row[:-1]): row[-1] for row in conn.execute(rows_sql.format(source), (start, end))}
+                target_rows = {tuple(row[:-1]): row[-1] for row in conn.execute(rows_sql.format(target), (start, end))}
+                compare_row_texts(diff, source_rows, target_rows)
+            else:
+                stack.extend(reversed(split_range(start, end, fanout)))
+        
+        if progress and done * 100 // len(top_ranges) != (done - 1) * 100 // len(top_ranges):
+            progress(done * 100 // len(top_ranges), None)
+
+
+def diff_bucketed_table(conn, source, target, diff, row_expression, leaf_rows=256, progress=None, is_canceled=None):
+    """按主键哈希分桶比较：一次分组扫描得到各桶的行数和摘要，再按桶顺序读取不同的桶逐行比较"""
+    key_list = ", ".join(quote_identifier(name) for name in diff.key_columns)
+    key_expression = quote_concat_expression(diff.key_columns)
+    counts = [conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in (source, target)]
+    buckets = min(65536, max(1, max(counts) // leaf_rows))
+    bucket_expression = f"key_bucket({buckets}, {key_expression})"
+    
+    digests = []
+    for name in (source, target):
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        digests.append({bucket: (count, digest) for bucket, count, digest in conn.execute(
+            f"SELECT {bucket_expression} AS bucket, COUNT(*), row_digest({row_expression}) FROM {name} "
+            "GROUP BY bucket")})
+        if progress:
+            progress(len(digests) * 40, None)
+    
+    changed = sorted(bucket for bucket in set(digests[0]) | set(digests[1])
+                     if digests[0].get(bucket) != digests[1].get(bucket))
+    if not changed:
+        return
+    
+    # 两边按桶排序后同步遍历，内存中只保留一个桶的行
+    rows_sql = (f"SELECT {bucket_expression} AS bucket, {key_list}, {row_expression} FROM {{}} "
+                f"WHERE bucket IN ({', '.join(map(str, changed))}) ORDER BY bucket")
+    source_groups = itertools.groupby(conn.execute(rows_sql.format(source)), key=lambda row: row[0])
+    target_groups = itertools.groupby(conn.cursor().execute(rows_sql.format(target)), key=lambda row: row[0])
+    source_bucket, source_group = next(source_groups, (None, None))
+    target_bucket, target_group = next(target_groups, (None, None))
+    while source_bucket is not None or target_bucket is not None:
+        if is_canceled and is_canceled():
+            raise OperationCanceled()
+        
+        source_rows = {}
+        target_rows = {}
+        if target_bucket is None or (source_bucket is not None and source_bucket <= target_bucket):
+            bucket = source_bucket
+        else:
+            bucket = target_bucket
+        if source_bucket == bucket:
+            source_rows = {tuple(row[1:-1]): row[-1] for row in source_group}
+            source_bucket, source_group = next(source_groups, (None, None))
+        if target_bucket == bucket:
+            target_rows = {tuple(row[1:-1]): row[-1] for row in target_group}
+            target_bucket, target_group = next(target_groups, (None, None))
+        compare_row_texts(diff, source_rows, target_rows)
+
+
+def diff_attached_tables(conn, source_schema, target_schema, tables=None, leaf_rows=256, fanout=16,
+                         progress=None, is_canceled=None):
+    """比较同一连接上两个数据库中的表，返回 TableDiff 列表
+    
+    只比较两边都有的列；两边主键不同的表标记为 schema，只在一边存在的表标记为 only_source 或 only_target。
+    """
+    register_diff_functions(conn)
+    
+    def table_names(schema):
+        return {row[0] for row in conn.execute(
+            f"SELECT name FROM {quote_identifier(schema)}.sqlite_master "
+            "WHERE type='table' AND name NOT LIKE 'sqlite_%'")}
+    
+    source_tables = table_names(source_schema)
+    target_tables = table_names(target_schema)
+    names = sorted(source_tables | target_tables)
+    if tables is not None:
+        names = [name for name in names if name in tables]
+    
+    diffs = []
+    for index, table in enumerate(names):
+        if table not in target_tables:
+            diffs.append(TableDiff(table, 'only_source'))
+            continue
+        if table not in source_tables:
+            diffs.append(TableDiff(table, 'only_target'))
+            continue
+        
+        key_columns, by_rowid = diff_key_columns(conn, source_schema, table)
+        if (key_columns, by_rowid) != diff_key_columns(conn, target_schema, table) or not key_columns:
+            diffs.append(TableDiff(table, 'schema', message="主键不同"))
+            continue
+        
+        source_columns = [col[1] for col in conn.execute(
+            f"PRAGMA {quote_identifier(source_schema)}.table_info({quote_identifier(table)})")]
+        target_columns = {col[1].lower() for col in conn.execute(
+            f"PRAGMA {quote_identifier(target_schema)}.table_info({quote_identifier(table)})")}
+        columns = [name for name in source_columns if name.lower() in target_columns]
+        message = ""
+        if len(columns) != len(source_columns) or len(columns) != len(target_columns):
+            message = "只比较了两边都有的列"
+        
+        diff = TableDiff(table, 'changed', key_columns, columns, message)
+        row_expression = quote_concat_expression(([] if key_columns[0] in columns else key_columns) + columns)
+        source = f"{quote_identifier(source_schema)}.{quote_identifier(table)}"
+        target = f"{quote_identifier(target_schema)}.{quote_identifier(table)}"
+        
+        def table_progress(percent, _, index=index, table=table):
+            if progress:
+                progress((index * 100 + percent) // len(names), f"正在比较表 {table}...")
+        
+        table_progress(0, None)
+        if by_rowid:
+            diff_rowid_table(conn, source, target, diff, row_expression, leaf_rows, fanout,
+                             progress=table_progress, is_canceled=is_canceled)
+        else:
+            diff_bucketed_table(conn, source, target, diff, row_expression, leaf_rows,
+                                progress=table_progress, is_canceled=is_canceled)
+        if not (diff.inserted or diff.updated or diff.deleted):
+            diff.status = 'same'
+        diffs.append(diff)
+    
+    if progress:
+        progress(100, "比较完成")
+    return diffs
+
+
+def key_condition(key_columns):
+    """按键定位一行的 WHERE 条件（使用 IS，键值为 NULL 时也能匹配）"""
+    return " AND ".join(f"{quote_identifier(name)} IS ?" for name in key_columns)
+
+
+def diff_insert_columns(diff):
+    """同步插入行时写入的列；没有主键的表同时写入 rowid，使两边的键保持一致"""
+    return ([] if diff.key_columns[0] in diff.columns else diff.key_columns) + diff.columns
+
+
+def write_sync_script(f, conn, source_schema, target_schema, diffs, fetch_size=500, is_canceled=None):
+    """写出使目标库与源库一致的 SQL 脚本（在目标库上执行），返回语句数
+    
+    仅存在于源库的表连同索引和数据一起创建；仅存在于目标库的表不会删除，只写一行注释。
+    """
+    count = 0
+    f.write(f"-- 同步脚本，生成于 {datetime.now().isoformat(timespec='seconds')}\n")
+    f.write("BEGIN TRANSACTION;\n")
+    for diff in diffs:
+        if diff.status == 'same':
+            continue
+        table = quote_identifier(diff.table)
+        source = f"{quote_identifier(source_schema)}.{table}"
+        if diff.status == 'only_source':
+            f.write(f"\n-- 表 {diff.table}: 仅存在于源数据库\n")
+            for (sql,) in conn.execute(
+                    f"SELECT sql FROM {quote_identifier(source_schema)}.sqlite_master "
+                    "WHERE tbl_name=? AND sql IS NOT NULL ORDER BY type = 'table' DESC", (diff.table,)):
+                f.write(f"{sql};\n")
+                count += 1
+            write_cursor_sql(f, conn.execute(f"SELECT * FROM {source}"), diff.table, is_canceled=is_canceled)
+            continue
+        if diff.status != 'changed':
+            f.write(f"\n-- {diff.summary()}，未同步\n")
+            continue
+        
+        f.write(f"\n-- {diff.summary()}\n")
+        condition = key_condition(diff.key_columns)
+        for key in diff.deleted:
+            values = " AND ".join(f"{quote_identifier(name)} IS {sql_literal(value)}"
+                                  for name, value in zip(diff.key_columns, key))
+            f.write(f"DELETE FROM {table} WHERE {values};\n")
+            count += 1
+        
+        insert_columns = diff_insert_columns(diff)
+        column_list = ", ".join(quote_identifier(name) for name in insert_columns)
+        select_sql = f"SELECT {column_list} FROM {source} WHERE {condition}"
+        for keys, updating in ((diff.updated, True), (diff.inserted, False)):
+            for start in range(0, len(keys), fetch_size):
+                if is_canceled and is_canceled():
+                    raise OperationCanceled()
+                for key in keys[start:start + fetch_size]:
+                    row = conn.execute(select_sql, key).fetchone()
+                    literals = [sql_literal(value) for value in row]
+                    if updating:
+                        assignments = ", ".join(f"{quote_identifier(name)} = {literal}"
+                                                for name, literal in zip(insert_columns, literals))
+                        where = " AND ".join(f"{quote_identifier(name)} IS {sql_literal(value)}"
+                                             for name, value in zip(diff.key_columns, key))
+                        f.write(f"UPDATE {table} SET {assignments} WHERE {where};\n")
+                    else:
+                        f.write(f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(literals)});\n")
+                    count += 1
+    f.write("\nCOMMIT;\n")
+    return count
+
+
+def apply_sync(conn, source_schema, target_schema, diffs, is_canceled=None):
+    """在一个事务中按比较结果修改目标库使其与源库一致，数据由 SQL 直接从源库读取，返回修改的行数
+    
+    仅存在于源库的表连同索引和数据一起创建；仅存在于目标库的表不会删除。
+    """
+    changes = conn.total_changes
+    conn.execute("BEGIN")
+    try:
+        for diff in diffs:
+            if is_canceled and is_canceled():
+                raise OperationCanceled()
+            source = f"{quote_identifier(source_schema)}.{quote_identifier(diff.table)}"
+            target = f"{quote_identifier(target_schema)}.{quote_identifier(diff.table)}"
+            if diff.status == 'only_source':
+                create_table_like(conn, source_schema, target_schema, diff.table)
+                conn.execute(f"INSERT INTO {target} SELECT * FROM {source}")
+                continue
+            if diff.status != 'changed':
+                continue
+            
+            condition = key_condition(diff.key_columns)
+            insert_columns = diff_insert_columns(diff)
+            column_list = ", ".join(quote_identifier(name) for name in insert_columns)
+            conn.executemany(f"DELETE FROM {target} WHERE {condition}", diff.deleted)
+            conn.executemany(f"UPDATE {target} SET ({column_list}) = (SELECT {column_list} FROM {source} "
+                             f"WHERE {condition}) WHERE {condition}", (key + key for key in diff.updated))
+            conn.executemany(f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {source} "
+                             f"WHERE {condition}", diff.inserted)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.total_changes - changes
+
+
+def format_diff_report(diffs, limit=20):
+    """将比较结果整理为文字报告，每类差异最多列出 limit 个键"""
+    lines = []
+    for diff in diffs:
+        lines.append(diff.summary())
+        for title, keys in (("新增", diff.inserted), ("修改", diff.updated), ("删除", diff.deleted)):
+            if keys:
+                shown = ", ".join("(" + ", ".join(map(repr, key)) + ")" for key in keys[:limit])
+                more = f" 等 {len(keys)} 行" if len(keys) > limit else ""
+                lines.append(f"    {title} {', '.join(diff.key_columns)}: {shown}{more}")
+    return "\n".join(lines) if lines else "没有可比较的表"
+
+
+def diff_databases(source_path, target_path, tables=None, sync_script=None, apply=False, leaf_rows=256, fanout=16,
+                   source_conn=None, target_conn=None, progress=None, is_canceled=None):
+    """比较两个数据库中同名表的数据，返回 TableDiff 列表
+    
+    sync_script 不为空时写出使目标库与源库一致的 SQL 脚本；apply 为 True 时直接修改目标库。
+    """
+    with AttachedDatabases(source_path, target_path, source_conn, target_conn, "diff_other") as databases:
+        snapshot_conn = databases.conn
+        snapshot_conn.execute("BEGIN")
+        try:
+            diffs = diff_attached_tables(snapshot_conn, databases.source, databases.target, tables, leaf_rows, fanout,
+                                         progress=progress, is_canceled=is_canceled)
+            if sync_script:
+                if progress:
+                    progress(100, "正在生成同步脚本...")
+                with open_export_file(sync_script) as f:
+                    write_sync_script(f, snapshot_conn, databases.source, databases.target, diffs,
+                                      is_canceled=is_canceled)
+        finally:
+            snapshot_conn.execute("ROLLBACK")
+        
+        if apply:
+            if progress:
+                progress(100, "正在同步目标数据库...")
+            apply_sync(snapshot_conn, databases.source, databases.target, diffs, is_canceled=is_canceled)
+        return diffs
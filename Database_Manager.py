@@ -2,9 +2,10 @@ import os
 import sys
 import csv
 import sqlite3
-import zlib
-import hashlib
 import json
+import codecs
+import pathlib
+import time
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                            QTableView, QPushButton, QLabel, QLineEdit, QMessageBox,
@@ -24,133 +25,460 @@ from PyQt5.QtCore import (Qt, QSize, QSettings, QFileInfo, QRegularExpression,
                          QSortFilterProxyModel, QTimer, pyqtSignal, QThread, QObject,
                          QStringListModel, QRectF, QPointF, QDateTime, QCoreApplication)
 
+from Database_Engine import (ProjectInfo, OperationCanceled, CronSchedule, backup_job_due, run_backup_job,
+                             perform_backup, verify_backup, restore_backup_online, is_encrypted_file,
+                             encrypt_file, decrypt_file, load_encrypted_database, save_encrypted_database,
+                             load_zstandard, load_pyarrow, quote_identifier, analyze_csv_file, import_csv_file,
+                             analyze_jsonl_file, import_jsonl_file, import_sql_file, COLUMNAR_EXPORT_EXTENSIONS,
+                             export_plan, export_query, export_tables_parallel, default_export_workers,
+                             table_exporter, estimate_text_size, COPY_FORMATS, format_rows, PASTE_MODES,
+                             parse_clipboard_table, map_paste_columns, paste_rows, TABLE_COPY_POLICIES,
+                             copy_table_to_database, diff_databases, format_diff_report)
 
-class ProjectInfo:
-    """项目信息元数据（集中管理所有项目相关信息）"""
-    VERSION = "3.0.0"
-    BUILD_DATE = "2025-05-26"
-    AUTHOR = "杜玛"
-    LICENSE = "MIT"
-    COPYRIGHT = "© 永久 杜玛"
-    URL = "https://github.com/duma520"
-    MAINTAINER_EMAIL = "support@duma520.com"
-    NAME = "SQLite 数据库管理器 Pro"
-    DESCRIPTION = "增强版 SQLite 数据库管理器，支持多种高级功能"
-    HELP_TEXT = """
-使用说明:
 
-1. 文件菜单:
-   - 打开/关闭数据库
-   - 备份/恢复数据库
-   - 导入/导出数据
-   - 多数据库管理
+class DatabaseBackupThread(QThread):
+    """数据库备份线程
+    
+    mode: full 使用在线备份 API 完整复制；incremental 只写入变化的页；
+    gzip/zstd 生成流式压缩备份。
+    """
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
 
-2. 编辑菜单:
-   - SQL查询历史
-   - 数据编辑功能
+    def __init__(self, source_path, dest_path, pages_per_step=1024, sleep_ms=10,
+                 mode='full', parent=None):
+        super().__init__(parent)
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.pages_per_step = pages_per_step
+        self.sleep_ms = sleep_ms
+        self.mode = mode
+        self.canceled = False
 
-3. 视图菜单:
-   - 自定义界面布局
-   - 切换主题
-   - 数据可视化
+    def run(self):
+        try:
+            _, note = perform_backup(
+                self.source_path, self.dest_path, self.mode,
+                pages_per_step=self.pages_per_step, sleep_ms=self.sleep_ms,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
 
-4. 工具菜单:
-   - 数据库优化
-   - 完整性检查
-   - 加密/解密
+            self.progress.emit(100, "备份完成")
+            self.finished.emit(True, f"备份完成{note}")
+        
+        except OperationCanceled:
+            self.finished.emit(False, "备份已取消")
+        except Exception as e:
+            self.finished.emit(False, f"备份失败: {str(e)}")
 
-5. 帮助菜单:
-   - 查看帮助文档
-   - 检查更新
-"""
+    def cancel(self):
+        """取消备份操作"""
+        self.canceled = True
 
-    @classmethod
-    def get_metadata(cls) -> dict:
-        """获取主要元数据字典"""
-        return {
-            'version': cls.VERSION,
-            'author': cls.AUTHOR,
-            'license': cls.LICENSE,
-            'url': cls.URL
-        }
 
-    @classmethod
-    def get_header(cls) -> str:
-        """生成标准化的项目头信息"""
-        return f"{cls.NAME} {cls.VERSION} | {cls.LICENSE} License | {cls.URL}"
+class ScheduledBackupThread(QThread):
+    """计划备份线程：依次执行到期的备份任务"""
+    job_finished = pyqtSignal(str, bool, str)
+    
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs
+        self.canceled = False
+    
+    def run(self):
+        for job in self.jobs:
+            if self.canceled:
+                break
+            try:
+                dest_path, note = run_backup_job(job, is_canceled=lambda: self.canceled)
+                self.job_finished.emit(job['name'], True, f"已备份到 {os.path.basename(dest_path)}{note}")
+            except OperationCanceled:
+                self.job_finished.emit(job['name'], False, "备份已取消")
+            except Exception as e:
+                self.job_finished.emit(job['name'], False, f"备份失败: {str(e)}")
+    
+    def cancel(self):
+        """取消计划备份"""
+        self.canceled = True
 
 
-class DatabaseBackupThread(QThread):
-    """数据库备份线程"""
+class BackupVerifyThread(QThread):
+    """备份验证线程"""
     progress = pyqtSignal(int, str)
     finished = pyqtSignal(bool, str)
-
-    def __init__(self, source_path, dest_path, parent=None):
+    
+    def __init__(self, backup_path, quick_check=False, parent=None):
         super().__init__(parent)
-        self.source_path = source_path
-        self.dest_path = dest_path
+        self.backup_path = backup_path
+        self.quick_check = quick_check
         self.canceled = False
+    
+    def run(self):
+        try:
+            ok, report = verify_backup(
+                self.backup_path, self.quick_check,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "验证完成")
+            self.finished.emit(ok, "\n".join(report))
+        except OperationCanceled:
+            self.finished.emit(False, "验证已取消")
+        except Exception as e:
+            self.finished.emit(False, f"验证失败: {str(e)}")
+    
+    def cancel(self):
+        """取消验证操作"""
+        self.canceled = True
+
 
+class DatabaseRestoreThread(QThread):
+    """数据库恢复线程：在已打开的连接上在线恢复，无需关闭数据库"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, backup_path, target_conn, work_dir, pages_per_step=1024, parent=None):
+        super().__init__(parent)
+        self.backup_path = backup_path
+        self.target_conn = target_conn
+        self.work_dir = work_dir
+        self.pages_per_step = pages_per_step
+        self.canceled = False
+    
     def run(self):
         try:
-            # 创建备份文件
-            if os.path.exists(self.dest_path):
-                os.remove(self.dest_path)
+            pages = restore_backup_online(
+                self.backup_path, self.target_conn, self.work_dir, self.pages_per_step,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "恢复完成")
+            self.finished.emit(True, f"数据库恢复成功，共恢复 {pages} 页")
+        except OperationCanceled:
+            self.finished.emit(False, "恢复已取消，数据库保持原状")
+        except Exception as e:
+            self.finished.emit(False, f"恢复失败: {str(e)}")
+    
+    def cancel(self):
+        """取消恢复操作"""
+        self.canceled = True
 
-            # 连接源数据库
-            source_conn = sqlite3.connect(self.source_path)
-            source_conn.execute("BEGIN IMMEDIATE")
-            
-            # 连接目标数据库
-            dest_conn = sqlite3.connect(self.dest_path)
-            
-            # 备份数据
-            with dest_conn:
-                for line in source_conn.iterdump():
-                    if self.canceled:
-                        break
-                    
-                    dest_conn.execute(line)
-                    self.progress.emit(50, "正在备份数据...")
-            
-            if not self.canceled:
-                # 计算校验和
-                self.progress.emit(80, "计算校验和...")
-                checksum = self.calculate_checksum(self.dest_path)
-                
-                # 保存备份元数据
-                backup_info = {
-                    'source': self.source_path,
-                    'timestamp': datetime.now().isoformat(),
-                    'checksum': checksum,
-                    'version': ProjectInfo.VERSION
-                }
-                
-                with open(f"{self.dest_path}.meta", 'w') as f:
-                    json.dump(backup_info, f)
-                
-                self.finished.emit(True, "备份完成")
+
+class EncryptedDatabaseThread(QThread):
+    """在内存中打开（conn 为 None 时）或保存加密数据库"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, db_path, password, conn=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.password = password
+        self.conn = conn
+        self.canceled = False
+    
+    def run(self):
+        action = '打开' if self.conn is None else '保存'
+        try:
+            if self.conn is None:
+                self.conn = load_encrypted_database(
+                    self.db_path, self.password,
+                    progress=self.progress.emit, is_canceled=lambda: self.canceled)
             else:
-                self.finished.emit(False, "备份已取消")
-                
+                save_encrypted_database(
+                    self.conn, self.db_path, self.password,
+                    progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, f"{action}完成")
+            self.finished.emit(True, f"{action}完成")
+        except OperationCanceled:
+            self.finished.emit(False, f"{action}已取消")
         except Exception as e:
-            self.finished.emit(False, f"备份失败: {str(e)}")
+            self.finished.emit(False, f"{action}加密数据库失败: {str(e)}")
+    
+    def cancel(self):
+        """取消操作"""
+        self.canceled = True
+
+
+class CopyFormatThread(QThread):
+    """在后台格式化大量复制内容，完成后由界面线程写入剪贴板"""
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, columns, rows, format='tsv', table_name="table", parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.rows = rows
+        self.format = format
+        self.table_name = table_name
+    
+    def run(self):
+        try:
+            self.finished.emit(True, format_rows(self.columns, self.rows, self.format, self.table_name))
+        except Exception as e:
+            self.finished.emit(False, f"复制失败: {str(e)}")
+
+
+class JsonlImportThread(QThread):
+    """JSON Lines 导入线程"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, conn, file_path, table_name, columns, batch_size=10000, bulk_load=False, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.file_path = file_path
+        self.table_name = table_name
+        self.columns = columns
+        self.batch_size = batch_size
+        self.bulk_load = bulk_load
+        self.canceled = False
+    
+    def run(self):
+        try:
+            start = time.time()
+            count = import_jsonl_file(
+                self.conn, self.file_path, self.table_name, self.columns,
+                batch_size=self.batch_size, bulk_load=self.bulk_load,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "导入完成")
+            self.finished.emit(True, f"已从 {self.file_path} 导入 {count} 行，用时 {time.time() - start:.1f} 秒")
+        except OperationCanceled:
+            self.finished.emit(False, "导入已取消，数据未写入")
+        except Exception as e:
+            self.finished.emit(False, f"导入失败: {str(e)}")
+    
+    def cancel(self):
+        """取消导入"""
+        self.canceled = True
+
+
+class CsvImportThread(QThread):
+    """CSV 导入线程"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, conn, file_path, table_name, columns, encoding='utf-8', dialect=None, has_header=True,
+                 batch_size=10000, bulk_load=False, workers=1, ordered=True, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.file_path = file_path
+        self.table_name = table_name
+        self.columns = columns
+        self.encoding = encoding
+        self.dialect = dialect
+        self.has_header = has_header
+        self.batch_size = batch_size
+        self.bulk_load = bulk_load
+        self.workers = workers
+        self.ordered = ordered
+        self.canceled = False
+    
+    def run(self):
+        try:
+            start = time.time()
+            count = import_csv_file(
+                self.conn, self.file_path, self.table_name, self.columns,
+                encoding=self.encoding, dialect=self.dialect, has_header=self.has_header,
+                batch_size=self.batch_size, bulk_load=self.bulk_load,
+                workers=self.workers, ordered=self.ordered,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "导入完成")
+            self.finished.emit(True, f"已从 {self.file_path} 导入 {count} 行，用时 {time.time() - start:.1f} 秒")
+        except OperationCanceled:
+            self.finished.emit(False, "导入已取消，数据未写入")
+        except Exception as e:
+            self.finished.emit(False, f"导入失败: {str(e)}")
+    
+    def cancel(self):
+        """取消导入"""
+        self.canceled = True
+
+
+class SqlImportThread(QThread):
+    """SQL 脚本导入线程"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, conn, file_path, savepoint_every=1000, keep_partial=False, bulk_load=False, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.file_path = file_path
+        self.savepoint_every = savepoint_every
+        self.keep_partial = keep_partial
+        self.bulk_load = bulk_load
+        self.canceled = False
+    
+    def run(self):
+        partial = "，此前已完成的部分已提交" if self.keep_partial else "，所有修改已回滚"
+        try:
+            start = time.time()
+            count = import_sql_file(
+                self.conn, self.file_path, savepoint_every=self.savepoint_every,
+                keep_partial=self.keep_partial, bulk_load=self.bulk_load,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "导入完成")
+            self.finished.emit(True, f"已从 {self.file_path} 执行 {count} 条语句，用时 {time.time() - start:.1f} 秒")
+        except OperationCanceled:
+            self.finished.emit(False, f"导入已取消{partial}")
+        except Exception as e:
+            self.finished.emit(False, f"导入失败{partial}:\n{str(e)}")
+    
+    def cancel(self):
+        """取消导入"""
+        self.canceled = True
+
+
+class QueryExportThread(QThread):
+    """查询结果导出线程：在独立的连接上重新执行查询，流式写入文件"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, db_path, sql, file_path, format='csv', options=None, conn=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.sql = sql
+        self.file_path = file_path
+        self.format = format
+        self.options = options
+        self.conn = conn
+        self.canceled = False
+    
+    def run(self):
+        conn = self.conn
+        try:
+            start = time.time()
+            if conn is None:
+                uri = f"{pathlib.Path(os.path.abspath(self.db_path)).as_uri()}?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, isolation_level=None)
+            count = export_query(conn, self.sql, self.file_path, self.format, self.options,
+                                 progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "导出完成")
+            self.finished.emit(True, f"已导出 {count} 行到 {self.file_path}，用时 {time.time() - start:.1f} 秒")
+        except OperationCanceled:
+            self.finished.emit(False, "导出已取消")
+        except Exception as e:
+            self.finished.emit(False, f"导出失败: {str(e)}")
         finally:
-            if 'source_conn' in locals():
-                source_conn.close()
-            if 'dest_conn' in locals():
-                dest_conn.close()
+            if conn is not None and conn is not self.conn:
+                conn.close()
+    
+    def cancel(self):
+        """取消导出"""
+        self.canceled = True
 
-    def calculate_checksum(self, file_path):
-        """计算文件校验和"""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
 
+class DataExportThread(QThread):
+    """数据导出线程
+    
+    数据库文件由多个线程并行导出；传入 conn 时（内存中打开的加密数据库）使用该连接依次导出。
+    """
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, db_path, file_path, tables=None, format='sql', options=None, conn=None,
+                 workers=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.file_path = file_path
+        self.tables = tables
+        self.format = format
+        self.options = options or {}
+        self.conn = conn
+        self.workers = workers
+        self.canceled = False
+    
+    def run(self):
+        try:
+            start = time.time()
+            if self.conn is not None:
+                count = table_exporter(self.format)(
+                    self.conn, self.file_path, self.tables, **self.options,
+                    progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            else:
+                count = export_tables_parallel(
+                    self.db_path, self.file_path, self.tables, self.format, self.workers, self.options,
+                    progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "导出完成")
+            self.finished.emit(True, f"已导出 {count} 行到 {self.file_path}，用时 {time.time() - start:.1f} 秒")
+        except OperationCanceled:
+            self.finished.emit(False, "导出已取消")
+        except Exception as e:
+            self.finished.emit(False, f"导出失败: {str(e)}")
+    
     def cancel(self):
-        """取消备份操作"""
+        """取消导出"""
+        self.canceled = True
+
+
+class TableCopyThread(QThread):
+    """跨数据库复制表线程：在 SQLite 内部执行 INSERT ... SELECT，数据不经过 Python"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, source_path, target_path, table, target_table=None, policy='ignore', create=True,
+                 source_conn=None, target_conn=None, parent=None):
+        super().__init__(parent)
+        self.source_path = source_path
+        self.target_path = target_path
+        self.table = table
+        self.target_table = target_table or table
+        self.policy = policy
+        self.create = create
+        self.source_conn = source_conn
+        self.target_conn = target_conn
+        self.canceled = False
+    
+    def run(self):
+        try:
+            start = time.time()
+            count = copy_table_to_database(
+                self.source_path, self.target_path, self.table, self.target_table, self.policy, self.create,
+                source_conn=self.source_conn, target_conn=self.target_conn,
+                progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, "复制完成")
+            self.finished.emit(True, f"已向 {os.path.basename(self.target_path)} 的表 {self.target_table} "
+                                     f"写入 {count} 行，用时 {time.time() - start:.1f} 秒")
+        except OperationCanceled:
+            self.finished.emit(False, "复制已取消，目标数据库未被修改")
+        except Exception as e:
+            self.finished.emit(False, f"复制失败，目标数据库未被修改:\n{str(e)}")
+    
+    def cancel(self):
+        """取消复制"""
+        self.canceled = True
+
+
+class DatabaseDiffThread(QThread):
+    """数据库比较线程，可同时生成同步脚本或直接同步目标数据库"""
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, source_path, target_path, sync_script=None, apply=False, source_conn=None, target_conn=None,
+                 parent=None):
+        super().__init__(parent)
+        self.source_path = source_path
+        self.target_path = target_path
+        self.sync_script = sync_script
+        self.apply = apply
+        self.source_conn = source_conn
+        self.target_conn = target_conn
+        self.canceled = False
+    
+    def run(self):
+        try:
+            start = time.time()
+            diffs = diff_databases(self.source_path, self.target_path, sync_script=self.sync_script, apply=self.apply,
+                                   source_conn=self.source_conn, target_conn=self.target_conn,
+                                   progress=self.progress.emit,
+                                   is_canceled=lambda: self.canceled)
+            header = f"源数据库: {self.source_path}\n目标数据库: {self.target_path}\n"
+            header += f"比较用时 {time.time() - start:.1f} 秒"
+            if self.sync_script:
+                header += f"，同步脚本已保存到 {self.sync_script}"
+            if self.apply:
+                header += "，目标数据库已同步"
+            self.finished.emit(True, f"{header}\n\n{format_diff_report(diffs)}")
+        except OperationCanceled:
+            self.finished.emit(False, "比较已取消，目标数据库未被修改")
+        except Exception as e:
+            self.finished.emit(False, f"比较失败: {str(e)}")
+    
+    def cancel(self):
+        """取消比较"""
         self.canceled = True
 
 
@@ -167,53 +495,21 @@ class DatabaseEncryptThread(QThread):
         self.canceled = False
 
     def run(self):
+        action = '加密' if self.encrypt else '解密'
         try:
-            temp_path = f"{self.db_path}.tmp"
-            
             if self.encrypt:
-                self.progress.emit(10, "正在加密数据库...")
-                # 加密逻辑
-                # 这里只是示例，实际加密需要使用SQLCipher等库
-                with open(self.db_path, 'rb') as f_in:
-                    data = f_in.read()
-                
-                if self.canceled:
-                    self.finished.emit(False, "加密已取消")
-                    return
-                
-                # 简单的XOR加密（仅示例，生产环境应使用更强的加密）
-                key = hashlib.sha256(self.password.encode()).digest()
-                encrypted_data = bytes([data[i] ^ key[i % len(key)] for i in range(len(data))])
-                
-                with open(temp_path, 'wb') as f_out:
-                    f_out.write(encrypted_data)
-                
-                os.replace(temp_path, self.db_path)
-                self.finished.emit(True, "加密完成")
+                encrypt_file(self.db_path, self.db_path, self.password,
+                             progress=self.progress.emit, is_canceled=lambda: self.canceled)
             else:
-                self.progress.emit(10, "正在解密数据库...")
-                # 解密逻辑
-                with open(self.db_path, 'rb') as f_in:
-                    encrypted_data = f_in.read()
-                
-                if self.canceled:
-                    self.finished.emit(False, "解密已取消")
-                    return
-                
-                # 简单的XOR解密（仅示例）
-                key = hashlib.sha256(self.password.encode()).digest()
-                data = bytes([encrypted_data[i] ^ key[i % len(key)] for i in range(len(encrypted_data))])
-                
-                with open(temp_path, 'wb') as f_out:
-                    f_out.write(data)
-                
-                os.replace(temp_path, self.db_path)
-                self.finished.emit(True, "解密完成")
-                
+                decrypt_file(self.db_path, self.db_path, self.password,
+                             progress=self.progress.emit, is_canceled=lambda: self.canceled)
+            self.progress.emit(100, f"{action}完成")
+            self.finished.emit(True, f"{action}完成")
+        
+        except OperationCanceled:
+            self.finished.emit(False, f"{action}已取消，文件保持原状")
         except Exception as e:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            self.finished.emit(False, f"{'加密' if self.encrypt else '解密'}失败: {str(e)}")
+            self.finished.emit(False, f"{action}失败: {str(e)}")
 
     def cancel(self):
         """取消加密/解密操作"""
@@ -341,12 +637,36 @@ class SQLCompleter(QCompleter):
         self.setModel(model)
 
 
+class RowStoreModel(QStandardItemModel):
+    """同时保存原始行数据的表格模型
+    
+    rows 保存带类型的原始值，复制等操作直接读取，不必逐个单元格调用 data() 取显示文本。
+    """
+    def __init__(self, columns=(), rows=(), table_name=None, parent=None):
+        super().__init__(parent)
+        self.set_rows(columns, rows, table_name)
+    
+    def set_rows(self, columns, rows, table_name=None):
+        """替换模型中的全部数据"""
+        self.clear()
+        self.columns = list(columns)
+        self.rows = list(rows)
+        self.table_name = table_name
+        self.setHorizontalHeaderLabels(self.columns)
+        
+        for row in self.rows:
+            items = [QStandardItem(str(item) if item is not None else "NULL") for item in row]
+            self.appendRow(items)
+
+
 class DatabaseTab(QWidget):
     """数据库标签页"""
     def __init__(self, db_path, parent=None):
         super().__init__(parent)
         self.db_path = db_path
         self.parent = parent
+        self.table_tabs = {}  # {table_name: (widget, model)}
+        self.system_tables_tab = None  # (widget, model)
         self.init_ui()
     
     def init_ui(self):
@@ -377,22 +697,43 @@ class DatabaseTab(QWidget):
         # 初始加载表
         self.load_tables()
     
+    def connect(self):
+        """获取数据库连接，返回 (连接, 用完后是否需要关闭)
+        
+        在内存中打开的加密数据库没有可读取的明文文件，使用主窗口的共享连接。
+        """
+        if self.db_path in getattr(self.parent, 'encrypted_databases', {}):
+            return self.parent.open_databases[self.db_path], False
+        return sqlite3.connect(self.db_path), True
+    
     def load_tables(self):
-        """加载数据库表"""
+        """加载数据库表（已有的标签页原地刷新，保持当前选中的标签页）"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn, owned = self.connect()
             cursor = conn.cursor()
             
             # 获取所有表名
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
             tables = [row[0] for row in cursor.fetchall()]
             
-            # 为每个表创建标签页
+            # 移除已不存在的表的标签页
+            for table in list(self.table_tabs):
+                if table not in tables:
+                    widget, _ = self.table_tabs.pop(table)
+                    self.tab_widget.removeTab(self.tab_widget.indexOf(widget))
+            
+            # 已打开的表重新加载数据，新表创建标签页
             for table in tables:
-                self.create_table_tab(table, conn)
+                if table in self.table_tabs:
+                    self.load_table_data(table, self.table_tabs[table][1], conn)
+                else:
+                    self.create_table_tab(table, conn)
             
-            # 添加系统表标签页
-            self.create_system_tables_tab(conn)
+            # 系统表标签页
+            if self.system_tables_tab:
+                self.load_system_tables_data(self.system_tables_tab[1], conn)
+            else:
+                self.create_system_tables_tab(conn)
             
             # 更新统计信息
             self.update_stats(conn)
@@ -400,7 +741,7 @@ class DatabaseTab(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"加载表失败:\n{str(e)}")
         finally:
-            if 'conn' in locals():
+            if 'conn' in locals() and owned:
                 conn.close()
     
     def create_table_tab(self, table_name, conn):
@@ -442,22 +783,9 @@ class DatabaseTab(QWidget):
             table_view.customContextMenuRequested.connect(
                 lambda pos, view=table_view, t=table_name: self.parent.show_table_context_menu(pos, view, t, self.db_path))
             
-            # 获取表数据
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            
-            cursor.execute(f"SELECT * FROM {table_name} LIMIT 1000")
-            data = cursor.fetchall()
-            
-            # 创建模型
-            model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(column_names)
-            
-            for row in data:
-                items = [QStandardItem(str(item) if item is not None else "NULL") for item in row]
-                model.appendRow(items)
+            # 创建模型并加载表数据
+            model = RowStoreModel()
+            self.load_table_data(table_name, model, conn)
             
             # 设置代理模型以支持排序
             proxy_model = QSortFilterProxyModel()
@@ -504,12 +832,29 @@ class DatabaseTab(QWidget):
             layout.addWidget(table_view)
             layout.addLayout(button_layout)
             
-            # 添加标签页
-            self.tab_widget.addTab(table_widget, table_name)
+            # 添加标签页，新表放在系统表标签页之前
+            system_index = self.tab_widget.indexOf(self.system_tables_tab[0]) if self.system_tables_tab else -1
+            if system_index >= 0:
+                self.tab_widget.insertTab(system_index, table_widget, table_name)
+            else:
+                self.tab_widget.addTab(table_widget, table_name)
+            self.table_tabs[table_name] = (table_widget, model)
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法加载表 {table_name}:\n{str(e)}")
     
+    def load_table_data(self, table_name, model, conn):
+        """加载（或重新加载）表数据到模型"""
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = cursor.fetchall()
+        column_names = [col[1] for col in columns]
+        
+        cursor.execute(f"SELECT * FROM {table_name} LIMIT 1000")
+        data = cursor.fetchall()
+        
+        model.set_rows(column_names, data, table_name)
+    
     def create_system_tables_tab(self, conn):
         """创建系统表标签页"""
         try:
@@ -526,18 +871,9 @@ class DatabaseTab(QWidget):
             # 系统表视图
             sys_tables_view = QTableView()
             
-            # 获取系统表数据
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM sqlite_master")
-            data = cursor.fetchall()
-            
-            # 创建模型
+            # 创建模型并加载系统表数据
             model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(["类型", "名称", "表名", "根页", "SQL"])
-            
-            for row in data:
-                items = [QStandardItem(str(item)) for item in row]
-                model.appendRow(items)
+            self.load_system_tables_data(model, conn)
             
             # 设置代理模型以支持排序
             proxy_model = QSortFilterProxyModel()
@@ -554,14 +890,28 @@ class DatabaseTab(QWidget):
             
             # 添加标签页
             self.tab_widget.addTab(sys_tables_widget, "系统表")
+            self.system_tables_tab = (sys_tables_widget, model)
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法加载系统表:\n{str(e)}")
     
+    def load_system_tables_data(self, model, conn):
+        """加载（或重新加载）系统表数据到模型"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM sqlite_master")
+        data = cursor.fetchall()
+        
+        model.clear()
+        model.setHorizontalHeaderLabels(["类型", "名称", "表名", "根页", "SQL"])
+        
+        for row in data:
+            items = [QStandardItem(str(item)) for item in row]
+            model.appendRow(items)
+    
     def show_table_structure(self, table_name, db_path):
         """显示表结构"""
         try:
-            conn = sqlite3.connect(db_path)
+            conn, owned = self.connect()
             cursor = conn.cursor()
             
             # 获取表结构信息
@@ -667,7 +1017,7 @@ class DatabaseTab(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法获取表结构:\n{str(e)}")
         finally:
-            if 'conn' in locals():
+            if 'conn' in locals() and owned:
                 conn.close()
     
     def update_stats(self, conn):
@@ -701,7 +1051,11 @@ class DatabaseTab(QWidget):
             self.db_stats_label.setText("统计信息不可用")
     
     def close_tab(self, index):
-        """关闭标签页"""
+        """关闭标签页（刷新时会重新打开）"""
+        widget = self.tab_widget.widget(index)
+        self.table_tabs = {name: tab for name, tab in self.table_tabs.items() if tab[0] is not widget}
+        if self.system_tables_tab and self.system_tables_tab[0] is widget:
+            self.system_tables_tab = None
         self.tab_widget.removeTab(index)
 
 
@@ -719,6 +1073,8 @@ class DatabaseManager(QMainWindow):
         # 初始化数据库连接
         self.current_db_path = None
         self.open_databases = {}  # {db_path: conn}
+        self.encrypted_databases = {}  # {db_path: (password, 已保存时的 total_changes)}，在内存中打开的加密数据库
+        self.last_query = None  # (db_path, sql)，最近一次成功执行的查询，导出查询结果时重新执行
         
         # 初始化UI
         self.init_ui()
@@ -730,6 +1086,9 @@ class DatabaseManager(QMainWindow):
         # 初始化系统托盘
         self.init_system_tray()
         
+        # 初始化计划备份
+        self.init_backup_scheduler()
+        
         # 如果提供了数据库路径，直接打开
         if db_path:
             QTimer.singleShot(100, lambda: self.open_database(db_path))
@@ -875,6 +1234,16 @@ class DatabaseManager(QMainWindow):
         self.open_action.triggered.connect(self.open_database_dialog)
         file_menu.addAction(self.open_action)
         
+        self.open_encrypted_action = QAction(QIcon.fromTheme("document-decrypt"), "打开加密数据库...", self)
+        self.open_encrypted_action.triggered.connect(lambda: self.open_encrypted_database_dialog())
+        file_menu.addAction(self.open_encrypted_action)
+        
+        self.save_encrypted_action = QAction(QIcon.fromTheme("document-save"), "保存加密数据库", self)
+        self.save_encrypted_action.setShortcut(QKeySequence.Save)
+        self.save_encrypted_action.setEnabled(False)
+        self.save_encrypted_action.triggered.connect(self.save_encrypted_database_dialog)
+        file_menu.addAction(self.save_encrypted_action)
+        
         self.close_action = QAction(QIcon.fromTheme("window-close"), "关闭数据库", self)
         self.close_action.setEnabled(False)
         self.close_action.triggered.connect(self.close_current_database)
@@ -892,6 +1261,10 @@ class DatabaseManager(QMainWindow):
         self.restore_action.triggered.connect(self.restore_database_dialog)
         file_menu.addAction(self.restore_action)
         
+        self.verify_backup_action = QAction(QIcon.fromTheme("document-properties"), "验证备份...", self)
+        self.verify_backup_action.triggered.connect(self.verify_backup_dialog)
+        file_menu.addAction(self.verify_backup_action)
+        
         file_menu.addSeparator()
         
         self.export_action = QAction(QIcon.fromTheme("document-export"), "导出数据...", self)
@@ -978,6 +1351,15 @@ class DatabaseManager(QMainWindow):
         self.integrity_check_action.triggered.connect(self.check_database_integrity)
         tools_menu.addAction(self.integrity_check_action)
         
+        self.diff_action = QAction(QIcon.fromTheme("edit-find-replace"), "比较/同步数据库...", self)
+        self.diff_action.setEnabled(False)
+        self.diff_action.triggered.connect(self.diff_databases_dialog)
+        tools_menu.addAction(self.diff_action)
+        
+        self.backup_jobs_action = QAction(QIcon.fromTheme("appointment-new"), "计划备份...", self)
+        self.backup_jobs_action.triggered.connect(self.manage_backup_jobs_dialog)
+        tools_menu.addAction(self.backup_jobs_action)
+        
         tools_menu.addSeparator()
         
         self.encrypt_action = QAction(QIcon.fromTheme("document-encrypt"), "加密数据库...", self)
@@ -1050,6 +1432,57 @@ class DatabaseManager(QMainWindow):
         if reason == QSystemTrayIcon.DoubleClick:
             self.showNormal()
     
+    def notify(self, title, message, error=False):
+        """通过系统托盘显示通知，托盘不可用时显示在状态栏"""
+        if hasattr(self, 'tray_icon'):
+            icon = QSystemTrayIcon.Critical if error else QSystemTrayIcon.Information
+            self.tray_icon.showMessage(title, message, icon, 5000)
+        else:
+            self.status_bar.showMessage(f"{title}: {message}")
+    
+    def init_backup_scheduler(self):
+        """初始化计划备份：每分钟检查一次到期的任务"""
+        try:
+            self.backup_jobs = json.loads(self.settings.value("backupJobs", "[]"))
+        except ValueError:
+            self.backup_jobs = []
+        
+        self.scheduled_backup_thread = None
+        self.backup_scheduler_timer = QTimer(self)
+        self.backup_scheduler_timer.timeout.connect(self.run_due_backup_jobs)
+        self.backup_scheduler_timer.start(60 * 1000)
+    
+    def save_backup_jobs(self):
+        self.settings.setValue("backupJobs", json.dumps(self.backup_jobs))
+    
+    def run_due_backup_jobs(self, jobs=None):
+        """在后台线程中执行到期（或指定）的计划备份任务"""
+        if self.scheduled_backup_thread and self.scheduled_backup_thread.isRunning():
+            return
+        
+        now = datetime.now()
+        if jobs is None:
+            jobs = []
+            for job in self.backup_jobs:
+                try:
+                    if job.get('enabled', True) and backup_job_due(job, now):
+                        jobs.append(job)
+                except ValueError as e:
+                    self.status_bar.showMessage(f"计划备份 {job['name']} 配置无效: {str(e)}")
+        
+        if not jobs:
+            return
+        
+        for job in jobs:
+            job['last_run'] = now.isoformat()
+        self.save_backup_jobs()
+        
+        self.scheduled_backup_thread = ScheduledBackupThread([dict(job) for job in jobs])
+        self.scheduled_backup_thread.job_finished.connect(
+            lambda name, success, msg: self.notify(f"计划备份 - {name}", msg, not success))
+        # 低优先级运行，避免影响界面响应
+        self.scheduled_backup_thread.start(QThread.LowPriority)
+    
     def load_settings(self):
         # 恢复窗口大小和位置
         geometry = self.settings.value("windowGeometry")
@@ -1210,6 +1643,7 @@ class DatabaseManager(QMainWindow):
         self.restore_action.setEnabled(True)
         self.optimize_action.setEnabled(True)
         self.integrity_check_action.setEnabled(True)
+        self.diff_action.setEnabled(True)
         self.encrypt_action.setEnabled(True)
         self.decrypt_action.setEnabled(True)
         
@@ -1228,6 +1662,7 @@ class DatabaseManager(QMainWindow):
             self.restore_action.setEnabled(False)
             self.optimize_action.setEnabled(False)
             self.integrity_check_action.setEnabled(False)
+            self.diff_action.setEnabled(False)
             self.encrypt_action.setEnabled(False)
             self.decrypt_action.setEnabled(False)
             
@@ -1285,7 +1720,8 @@ class DatabaseManager(QMainWindow):
             self.settings.setValue("lastDir", os.path.dirname(file_path))
             self.open_database(file_path)
     
-    def open_database(self, db_path):
+    def open_database(self, db_path, conn=None):
+        """打开数据库；conn 不为空时使用已在内存中打开的连接（加密数据库）"""
         try:
             # 检查是否已经打开
             if db_path in self.open_databases:
@@ -1295,8 +1731,14 @@ class DatabaseManager(QMainWindow):
                 self.db_tab_widget.setCurrentIndex(index)
                 return
             
-            # 打开新数据库
-            conn = sqlite3.connect(db_path)
+            # 加密文件无法直接打开，转为输入密码后在内存中打开
+            if conn is None and os.path.isfile(db_path) and is_encrypted_file(db_path):
+                self.open_encrypted_database_dialog(db_path)
+                return
+            
+            # 打开新数据库（恢复等后台线程也会使用该连接）
+            if conn is None:
+                conn = sqlite3.connect(db_path, check_same_thread=False)
             conn.row_factory = sqlite3.Row
             self.open_databases[db_path] = conn
             
@@ -1325,6 +1767,11 @@ class DatabaseManager(QMainWindow):
         db_tab = self.db_tab_widget.widget(index)
         db_path = db_tab.db_path
         
+        # 内存中的加密数据库有未保存的修改时提示保存
+        if not self.confirm_close_encrypted_database(db_path):
+            return
+        self.encrypted_databases.pop(db_path, None)
+        
         # 关闭数据库连接
         if db_path in self.open_databases:
             self.open_databases[db_path].close()
@@ -1339,6 +1786,120 @@ class DatabaseManager(QMainWindow):
         
         self.status_bar.showMessage(f"已关闭数据库: {db_path}")
     
+    def open_encrypted_database_dialog(self, file_path=None):
+        """输入密码后将加密数据库解密到内存中打开，不生成明文文件"""
+        if not file_path:
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "打开加密数据库", 
+                self.settings.value("lastDir", ""),
+                "SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)"
+            )
+            if not file_path:
+                return
+            self.settings.setValue("lastDir", os.path.dirname(file_path))
+        
+        if file_path in self.open_databases:
+            self.open_database(file_path)
+            return
+        
+        password, ok = QInputDialog.getText(
+            self, "打开加密数据库", f"输入 {os.path.basename(file_path)} 的密码:", 
+            QLineEdit.Password
+        )
+        if not ok or not password:
+            return
+        
+        # 创建解密线程
+        self.encrypted_db_thread = EncryptedDatabaseThread(file_path, password)
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在解密数据库...", "取消", 0, 100, self)
+        progress.setWindowTitle("打开加密数据库")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        thread = self.encrypted_db_thread
+        
+        def on_finished(success, message):
+            progress.close()
+            if not success:
+                QMessageBox.critical(self, "错误", message)
+                return
+            self.encrypted_databases[file_path] = (password, thread.conn.total_changes)
+            self.open_database(file_path, thread.conn)
+            self.status_bar.showMessage(f"已在内存中打开加密数据库: {file_path}，修改后请保存")
+        
+        # 连接信号
+        thread.progress.connect(progress.setValue)
+        thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        thread.finished.connect(on_finished)
+        progress.canceled.connect(thread.cancel)
+        
+        thread.start()
+    
+    def save_encrypted_database_dialog(self):
+        """serialize 当前内存数据库并重新加密保存到原文件"""
+        db_path = self.current_db_path
+        if db_path not in self.encrypted_databases:
+            QMessageBox.information(self, "提示", "当前数据库不是在内存中打开的加密数据库，修改会直接写入文件")
+            return
+        
+        password, _ = self.encrypted_databases[db_path]
+        conn = self.open_databases[db_path]
+        
+        # 创建保存线程
+        self.encrypted_db_thread = EncryptedDatabaseThread(db_path, password, conn)
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在加密并保存数据库...", "取消", 0, 100, self)
+        progress.setWindowTitle("保存加密数据库")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        def on_finished(success, message):
+            progress.close()
+            if success:
+                self.encrypted_databases[db_path] = (password, conn.total_changes)
+                self.status_bar.showMessage(f"已保存加密数据库: {db_path}")
+            else:
+                QMessageBox.critical(self, "错误", message)
+        
+        # 连接信号
+        self.encrypted_db_thread.progress.connect(progress.setValue)
+        self.encrypted_db_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.encrypted_db_thread.finished.connect(on_finished)
+        progress.canceled.connect(self.encrypted_db_thread.cancel)
+        
+        self.encrypted_db_thread.start()
+    
+    def confirm_close_encrypted_database(self, db_path):
+        """关闭内存中的加密数据库前处理未保存的修改，返回是否可以关闭"""
+        if db_path not in self.encrypted_databases:
+            return True
+        
+        password, saved_changes = self.encrypted_databases[db_path]
+        conn = self.open_databases[db_path]
+        if conn.total_changes == saved_changes:
+            return True
+        
+        reply = QMessageBox.question(
+            self, "保存修改", 
+            f"加密数据库 {os.path.basename(db_path)} 有未保存的修改，是否保存?", 
+            QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel
+        )
+        if reply == QMessageBox.Cancel:
+            return False
+        if reply == QMessageBox.Save:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                save_encrypted_database(conn, db_path, password)
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"保存加密数据库失败:\n{str(e)}")
+                return False
+            finally:
+                QApplication.restoreOverrideCursor()
+        return True
+    
     def close_current_database(self):
         """关闭当前数据库"""
         current_index = self.db_tab_widget.currentIndex()
@@ -1360,7 +1921,9 @@ class DatabaseManager(QMainWindow):
             self.db_path_label.setText(f"数据库: {db_tab.db_path}")
             self.update_database_stats(db_tab.db_path)
             self.current_db_path = db_tab.db_path
+            self.save_encrypted_action.setEnabled(db_tab.db_path in self.encrypted_databases)
         else:
+            self.save_encrypted_action.setEnabled(False)
             self.db_path_label.setText("未打开数据库")
             self.db_stats_label.clear()
             self.current_db_path = None
@@ -1371,17 +1934,88 @@ class DatabaseManager(QMainWindow):
             QMessageBox.warning(self, "警告", "请先打开数据库")
             return
         
+        if self.current_db_path in self.encrypted_databases:
+            QMessageBox.information(self, "提示", "加密数据库在内存中打开，保存后直接复制加密文件即可备份")
+            return
+        
+        # 备份选项
+        dialog = QDialog(self)
+        dialog.setWindowTitle("备份选项")
+        
+        form_layout = QFormLayout()
+        dialog.setLayout(form_layout)
+        
+        mode_combo = QComboBox()
+        mode_combo.addItem("完整备份", "full")
+        mode_combo.addItem("增量备份（只保存变化的页）", "incremental")
+        mode_combo.addItem("压缩备份 (gzip)", "gzip")
+        if load_zstandard() is not None:
+            mode_combo.addItem("压缩备份 (zstd)", "zstd")
+        mode_combo.addItem("备份仓库（去重）", "repository")
+        mode_combo.setCurrentIndex(max(0, mode_combo.findData(self.settings.value("backupMode", "full"))))
+        mode_combo.setToolTip("增量备份与同目录下最近一次备份比较，只写入变化的页；\n"
+                              "备份仓库将数据分块去重保存，多个快照只保存一次相同的数据")
+        form_layout.addRow("备份方式:", mode_combo)
+        
+        pages_spin = QSpinBox()
+        pages_spin.setRange(1, 1000000)
+        pages_spin.setValue(self.settings.value("backupPagesPerStep", 1024, type=int))
+        pages_spin.setToolTip("每一步复制的页数，越小对其他写入者的影响越小")
+        form_layout.addRow("每步页数:", pages_spin)
+        
+        sleep_spin = QSpinBox()
+        sleep_spin.setRange(0, 10000)
+        sleep_spin.setSuffix(" 毫秒")
+        sleep_spin.setValue(self.settings.value("backupSleepMs", 10, type=int))
+        sleep_spin.setToolTip("两步之间的间隔，期间源数据库可被其他连接写入")
+        form_layout.addRow("步间间隔:", sleep_spin)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        form_layout.addRow(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        
+        mode = mode_combo.currentData()
+        self.settings.setValue("backupMode", mode)
+        self.settings.setValue("backupPagesPerStep", pages_spin.value())
+        self.settings.setValue("backupSleepMs", sleep_spin.value())
+        
+        # 增量备份需要与之前的备份并存，默认文件名带上时间戳
+        default_name = f"{os.path.basename(self.current_db_path)}.backup"
+        if mode == "incremental":
+            default_name = f"{os.path.basename(self.current_db_path)}.{datetime.now().strftime('%Y%m%d_%H%M%S')}.backup"
+        elif mode in ("gzip", "zstd"):
+            default_name = f"{os.path.basename(self.current_db_path)}{'.gz' if mode == 'gzip' else '.zst'}"
+        
         options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "备份数据库", 
-            f"{os.path.basename(self.current_db_path)}.backup",
-            "SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)", 
-            options=options
-        )
+        if mode == "repository":
+            # 备份仓库是一个目录，每次备份在其中新增一个快照
+            file_path = QFileDialog.getExistingDirectory(
+                self, "选择备份仓库目录", self.settings.value("backupRepository", ""))
+            if file_path:
+                self.settings.setValue("backupRepository", file_path)
+        else:
+            file_path, _ = QFileDialog.getSaveFileName(
+                self, "备份数据库", 
+                os.path.join(self.settings.value("lastBackupDir", ""), default_name),
+                "备份文件 (*.backup *.gz *.zst);;SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)", 
+                options=options
+            )
+            if file_path:
+                self.settings.setValue("lastBackupDir", os.path.dirname(file_path))
         
         if file_path:
+            
             # 创建备份线程
-            self.backup_thread = DatabaseBackupThread(self.current_db_path, file_path)
+            self.backup_thread = DatabaseBackupThread(
+                self.current_db_path, file_path,
+                pages_per_step=pages_spin.value(),
+                sleep_ms=sleep_spin.value(),
+                mode=mode
+            )
             
             # 创建进度对话框
             progress = QProgressDialog("正在备份数据库...", "取消", 0, 100, self)
@@ -1419,30 +2053,274 @@ class DatabaseManager(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "选择备份文件", 
             self.settings.value("lastBackupDir", ""),
-            "SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)", 
+            "备份文件 (*.backup *.gz *.zst);;备份仓库快照 (*.json);;SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)", 
             options=options
         )
         
         if file_path:
             self.settings.setValue("lastBackupDir", os.path.dirname(file_path))
             
+            db_path = self.current_db_path
+            conn = self.open_databases.get(db_path)
+            if conn is None:
+                QMessageBox.warning(self, "警告", "当前数据库连接不可用")
+                return
+            if not self.end_pending_transaction(db_path):
+                return
+            
+            # 创建进度对话框
+            progress = QProgressDialog("正在恢复数据库...", "取消", 0, 100, self)
+            progress.setWindowTitle("恢复数据库")
+            progress.setWindowModality(Qt.WindowModal)
+            progress.setAutoClose(True)
+            
+            # 创建恢复线程：先核对校验和，再通过在线备份 API 写回当前连接
+            self.restore_thread = DatabaseRestoreThread(
+                file_path, conn, os.path.dirname(os.path.abspath(db_path)),
+                int(self.settings.value("backupPagesPerStep", 1024)))
+            self.restore_thread.progress.connect(progress.setValue)
+            self.restore_thread.progress.connect(lambda v, msg: progress.setLabelText(msg))
+            self.restore_thread.finished.connect(progress.close)
+            self.restore_thread.finished.connect(
+                lambda success, msg: self.on_restore_finished(db_path, success, msg))
+            progress.canceled.connect(self.restore_thread.cancel)
+            
+            # 开始恢复
+            self.restore_thread.start()
+    
+    def on_restore_finished(self, db_path, success, message):
+        """恢复或复制表完成后原地刷新数据库标签页"""
+        if not success:
+            QMessageBox.critical(self, "错误", message)
+            return
+        
+        for i in range(self.db_tab_widget.count()):
+            db_tab = self.db_tab_widget.widget(i)
+            if db_tab.db_path == db_path:
+                db_tab.load_tables()
+        
+        self.update_database_stats(db_path)
+        QMessageBox.information(self, "成功", message)
+    
+    def manage_backup_jobs_dialog(self):
+        """计划备份任务管理对话框"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("计划备份")
+        dialog.resize(700, 400)
+        
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+        
+        job_list = QListWidget()
+        layout.addWidget(job_list)
+        
+        def refresh_job_list():
+            job_list.clear()
+            for job in self.backup_jobs:
+                schedule = f"cron: {job['cron']}" if job.get('cron') else f"每 {job.get('interval_minutes', 60)} 分钟"
+                retention = job.get('retention', {})
+                text = (f"{job['name']}: {os.path.basename(job['db_path'])} → {job['dest_dir']} "
+                        f"({schedule}, {job.get('mode', 'full')}, 保留 {retention.get('hourly', 24)} 小时/"
+                        f"{retention.get('daily', 7)} 天/{retention.get('weekly', 0)} 周)")
+                if job.get('last_run'):
+                    text += f" 上次: {job['last_run'][:16]}"
+                item = QListWidgetItem(text)
+                item.setData(Qt.UserRole, job['name'])
+                job_list.addItem(item)
+        
+        def selected_jobs():
+            names = [item.data(Qt.UserRole) for item in job_list.selectedItems()]
+            return [job for job in self.backup_jobs if job['name'] in names]
+        
+        def remove_jobs():
+            for job in selected_jobs():
+                self.backup_jobs.remove(job)
+            self.save_backup_jobs()
+            refresh_job_list()
+        
+        def run_jobs_now():
+            jobs = selected_jobs()
+            if jobs:
+                self.run_due_backup_jobs(jobs)
+                self.status_bar.showMessage("计划备份已在后台开始")
+        
+        def add_job():
+            job = self.edit_backup_job_dialog(dialog)
+            if job:
+                self.backup_jobs = [j for j in self.backup_jobs if j['name'] != job['name']] + [job]
+                self.save_backup_jobs()
+                refresh_job_list()
+        
+        button_layout = QHBoxLayout()
+        
+        add_button = QPushButton(QIcon.fromTheme("list-add"), "添加任务...")
+        add_button.clicked.connect(add_job)
+        button_layout.addWidget(add_button)
+        
+        remove_button = QPushButton(QIcon.fromTheme("list-remove"), "删除任务")
+        remove_button.clicked.connect(remove_jobs)
+        button_layout.addWidget(remove_button)
+        
+        run_button = QPushButton(QIcon.fromTheme("media-playback-start"), "立即运行")
+        run_button.clicked.connect(run_jobs_now)
+        button_layout.addWidget(run_button)
+        
+        button_layout.addStretch()
+        layout.addLayout(button_layout)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        
+        refresh_job_list()
+        dialog.exec_()
+    
+    def edit_backup_job_dialog(self, parent):
+        """新建计划备份任务，返回任务配置或 None"""
+        dialog = QDialog(parent)
+        dialog.setWindowTitle("添加计划备份")
+        
+        form_layout = QFormLayout()
+        dialog.setLayout(form_layout)
+        
+        name_edit = QLineEdit(f"任务{len(self.backup_jobs) + 1}")
+        form_layout.addRow("任务名称:", name_edit)
+        
+        db_edit = QLineEdit(self.current_db_path or "")
+        db_browse = QPushButton("浏览...")
+        db_browse.clicked.connect(lambda: db_edit.setText(QFileDialog.getOpenFileName(
+            dialog, "选择数据库", db_edit.text(),
+            "SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)")[0] or db_edit.text()))
+        db_layout = QHBoxLayout()
+        db_layout.addWidget(db_edit)
+        db_layout.addWidget(db_browse)
+        form_layout.addRow("数据库:", db_layout)
+        
+        dest_edit = QLineEdit(self.settings.value("lastBackupDir", ""))
+        dest_browse = QPushButton("浏览...")
+        dest_browse.clicked.connect(lambda: dest_edit.setText(
+            QFileDialog.getExistingDirectory(dialog, "选择备份目录", dest_edit.text()) or dest_edit.text()))
+        dest_layout = QHBoxLayout()
+        dest_layout.addWidget(dest_edit)
+        dest_layout.addWidget(dest_browse)
+        form_layout.addRow("备份目录:", dest_layout)
+        
+        mode_combo = QComboBox()
+        mode_combo.addItem("完整备份", "full")
+        mode_combo.addItem("增量备份", "incremental")
+        mode_combo.addItem("压缩备份 (gzip)", "gzip")
+        if load_zstandard() is not None:
+            mode_combo.addItem("压缩备份 (zstd)", "zstd")
+        form_layout.addRow("备份方式:", mode_combo)
+        
+        interval_spin = QSpinBox()
+        interval_spin.setRange(0, 60 * 24 * 31)
+        interval_spin.setValue(60)
+        interval_spin.setSuffix(" 分钟")
+        form_layout.addRow("备份间隔:", interval_spin)
+        
+        cron_edit = QLineEdit()
+        cron_edit.setPlaceholderText("可选，例如 0 */2 * * * (填写后忽略备份间隔)")
+        form_layout.addRow("cron 表达式:", cron_edit)
+        
+        hourly_spin = QSpinBox()
+        hourly_spin.setRange(0, 1000)
+        hourly_spin.setValue(24)
+        form_layout.addRow("保留每小时备份:", hourly_spin)
+        
+        daily_spin = QSpinBox()
+        daily_spin.setRange(0, 1000)
+        daily_spin.setValue(7)
+        form_layout.addRow("保留每天备份:", daily_spin)
+        
+        weekly_spin = QSpinBox()
+        weekly_spin.setRange(0, 1000)
+        weekly_spin.setValue(4)
+        form_layout.addRow("保留每周备份:", weekly_spin)
+        
+        rate_spin = QSpinBox()
+        rate_spin.setRange(0, 10000)
+        rate_spin.setValue(20)
+        rate_spin.setSuffix(" MB/s")
+        rate_spin.setToolTip("限制后台备份的读取速度，0 表示不限速")
+        form_layout.addRow("读取限速:", rate_spin)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        form_layout.addRow(button_box)
+        
+        while dialog.exec_() == QDialog.Accepted:
+            cron = cron_edit.text().strip()
             try:
-                # 关闭当前数据库
-                if self.current_db_path in self.open_databases:
-                    self.open_databases[self.current_db_path].close()
-                    del self.open_databases[self.current_db_path]
-                
-                # 复制备份文件
-                import shutil
-                shutil.copyfile(file_path, self.current_db_path)
-                
-                # 重新打开数据库
-                self.open_database(self.current_db_path)
-                
-                QMessageBox.information(self, "成功", "数据库恢复成功")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"恢复失败:\n{str(e)}")
+                if not name_edit.text().strip() or not db_edit.text() or not dest_edit.text():
+                    raise ValueError("请填写任务名称、数据库和备份目录")
+                if cron:
+                    CronSchedule(cron)
+                elif interval_spin.value() <= 0:
+                    raise ValueError("备份间隔必须大于 0")
+            except ValueError as e:
+                QMessageBox.warning(dialog, "警告", str(e))
+                continue
+            
+            return {
+                'name': name_edit.text().strip(),
+                'db_path': db_edit.text(),
+                'dest_dir': dest_edit.text(),
+                'mode': mode_combo.currentData(),
+                'interval_minutes': interval_spin.value(),
+                'cron': cron,
+                'retention': {
+                    'hourly': hourly_spin.value(),
+                    'daily': daily_spin.value(),
+                    'weekly': weekly_spin.value()
+                },
+                'rate_limit_mb': rate_spin.value(),
+                'enabled': True
+            }
+        
+        return None
+    
+    def verify_backup_dialog(self):
+        """备份验证对话框"""
+        options = QFileDialog.Options()
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择要验证的备份文件", 
+            self.settings.value("lastBackupDir", ""),
+            "备份文件 (*.backup *.gz *.zst);;备份仓库快照 (*.json);;SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)", 
+            options=options
+        )
+        
+        if not file_path:
+            return
+        
+        self.settings.setValue("lastBackupDir", os.path.dirname(file_path))
+        
+        reply = QMessageBox.question(
+            self, "验证备份", 
+            "除核对校验和外，是否同时对备份副本执行 PRAGMA quick_check?\n（需要还原出一份副本，耗时较长）", 
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        
+        # 创建验证线程
+        self.verify_thread = BackupVerifyThread(file_path, reply == QMessageBox.Yes)
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在验证备份...", "取消", 0, 100, self)
+        progress.setWindowTitle("验证备份")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        # 连接信号
+        self.verify_thread.progress.connect(progress.setValue)
+        self.verify_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.verify_thread.finished.connect(
+            lambda success, msg: QMessageBox.information(self, "验证通过", msg) if success else QMessageBox.critical(self, "验证未通过", msg))
+        self.verify_thread.finished.connect(progress.close)
+        progress.canceled.connect(self.verify_thread.cancel)
+        
+        # 开始验证
+        self.verify_thread.start()
     
     def optimize_database(self):
         """优化数据库"""
@@ -1516,20 +2394,153 @@ class DatabaseManager(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"完整性检查失败:\n{str(e)}")
     
+    def diff_databases_dialog(self):
+        """比较当前数据库与另一个数据库的数据，可生成同步脚本或直接同步目标数据库"""
+        if not self.current_db_path:
+            QMessageBox.warning(self, "警告", "请先打开数据库")
+            return
+        source_path = self.current_db_path
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("比较/同步数据库")
+        dialog.resize(560, 0)
+        
+        layout = QFormLayout()
+        dialog.setLayout(layout)
+        layout.addRow("源数据库:", QLabel(source_path))
+        
+        others = [path for path in self.open_databases if path != source_path]
+        target_edit = QLineEdit(others[0] if others else "")
+        target_browse = QPushButton("浏览...")
+        target_browse.clicked.connect(lambda: target_edit.setText(QFileDialog.getOpenFileName(
+            dialog, "选择目标数据库", target_edit.text(),
+            "SQLite数据库 (*.db *.sqlite *.sqlite3 *.db3);;所有文件 (*)")[0] or target_edit.text()))
+        target_layout = QHBoxLayout()
+        target_layout.addWidget(target_edit)
+        target_layout.addWidget(target_browse)
+        layout.addRow("目标数据库:", target_layout)
+        
+        script_check = QCheckBox("生成使目标数据库与源数据库一致的同步脚本")
+        layout.addRow(script_check)
+        
+        apply_check = QCheckBox("直接同步目标数据库（新增、修改、删除行，创建缺少的表）")
+        layout.addRow(apply_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addRow(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        target_path = target_edit.text().strip()
+        if not target_path or not os.path.exists(target_path):
+            QMessageBox.warning(self, "警告", "请选择存在的目标数据库文件")
+            return
+        if os.path.abspath(target_path) == os.path.abspath(source_path):
+            QMessageBox.warning(self, "警告", "源数据库和目标数据库不能相同")
+            return
+        if source_path in self.encrypted_databases and target_path in self.encrypted_databases:
+            QMessageBox.warning(self, "警告", "两个加密数据库都在内存中打开，无法直接比较")
+            return
+        
+        sync_script = None
+        if script_check.isChecked():
+            sync_script, _ = QFileDialog.getSaveFileName(
+                self, "保存同步脚本", self.settings.value("lastExportDir", ""),
+                "SQL文件 (*.sql *.sql.gz);;所有文件 (*)")
+            if not sync_script:
+                return
+            self.settings.setValue("lastExportDir", os.path.dirname(sync_script))
+        
+        if apply_check.isChecked():
+            reply = QMessageBox.question(
+                self, "确认同步", f"将修改目标数据库 {target_path}，使其数据与源数据库一致。是否继续？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        
+        # 界面连接上未结束的事务会阻塞比较线程
+        for path in (source_path, target_path):
+            if path in self.open_databases and not self.end_pending_transaction(path):
+                return
+        
+        # 内存中打开的加密数据库只能使用共享连接
+        source_conn = self.open_databases[source_path] if source_path in self.encrypted_databases else None
+        target_conn = self.open_databases[target_path] if target_path in self.encrypted_databases else None
+        self.diff_thread = DatabaseDiffThread(source_path, target_path, sync_script, apply_check.isChecked(),
+                                              source_conn, target_conn)
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在比较数据库...", "取消", 0, 100, self)
+        progress.setWindowTitle("比较数据库")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        def on_finished(success, message):
+            progress.close()
+            if not success:
+                QMessageBox.critical(self, "错误", message)
+                return
+            
+            if apply_check.isChecked():
+                for i in range(self.db_tab_widget.count()):
+                    db_tab = self.db_tab_widget.widget(i)
+                    if db_tab.db_path == target_path:
+                        db_tab.load_tables()
+                if target_path in self.open_databases:
+                    self.update_database_stats(target_path)
+            
+            result_dialog = QDialog(self)
+            result_dialog.setWindowTitle("比较结果")
+            result_dialog.resize(700, 450)
+            
+            result_layout = QVBoxLayout()
+            result_dialog.setLayout(result_layout)
+            
+            text_edit = QTextEdit()
+            text_edit.setReadOnly(True)
+            text_edit.setFont(QFont("Consolas", 10))
+            text_edit.setPlainText(message)
+            result_layout.addWidget(text_edit)
+            
+            result_buttons = QDialogButtonBox(QDialogButtonBox.Ok)
+            result_buttons.accepted.connect(result_dialog.accept)
+            result_layout.addWidget(result_buttons)
+            
+            result_dialog.exec_()
+        
+        # 连接信号
+        self.diff_thread.progress.connect(progress.setValue)
+        self.diff_thread.progress.connect(lambda v, msg: progress.setLabelText(msg))
+        self.diff_thread.finished.connect(on_finished)
+        progress.canceled.connect(self.diff_thread.cancel)
+        
+        # 开始比较
+        self.diff_thread.start()
+    
     def encrypt_database_dialog(self):
         """数据库加密对话框"""
         if not self.current_db_path:
             QMessageBox.warning(self, "警告", "请先打开数据库")
             return
         
+        if self.current_db_path in self.encrypted_databases:
+            QMessageBox.information(self, "提示", "该数据库已在内存中以加密方式打开，请先保存并关闭后再加密文件")
+            return
+        
         password, ok = QInputDialog.getText(
             self, "加密数据库", "输入加密密码:", 
             QLineEdit.Password
         )
         
         if ok and password:
+            # 加密后的文件无法再作为数据库使用，先关闭连接（同时合并 WAL）
+            db_path = self.current_db_path
+            self.close_current_database()
+            
             # 创建加密线程
-            self.encrypt_thread = DatabaseEncryptThread(self.current_db_path, password, True)
+            self.encrypt_thread = DatabaseEncryptThread(db_path, password, True)
             
             # 创建进度对话框
             progress = QProgressDialog("正在加密数据库...", "取消", 0, 100, self)
@@ -1554,14 +2565,22 @@ class DatabaseManager(QMainWindow):
             QMessageBox.warning(self, "警告", "请先打开数据库")
             return
         
+        if self.current_db_path in self.encrypted_databases:
+            QMessageBox.information(self, "提示", "该数据库已在内存中以加密方式打开，请先保存并关闭后再解密文件")
+            return
+        
         password, ok = QInputDialog.getText(
             self, "解密数据库", "输入解密密码:", 
             QLineEdit.Password
         )
         
         if ok and password:
+            # 解密会替换整个文件，先关闭连接，完成后重新打开
+            db_path = self.current_db_path
+            self.close_current_database()
+            
             # 创建解密线程
-            self.decrypt_thread = DatabaseEncryptThread(self.current_db_path, password, False)
+            self.decrypt_thread = DatabaseEncryptThread(db_path, password, False)
             
             # 创建进度对话框
             progress = QProgressDialog("正在解密数据库...", "取消", 0, 100, self)
@@ -1574,6 +2593,8 @@ class DatabaseManager(QMainWindow):
             self.decrypt_thread.progress.connect(lambda v, m: progress.setLabelText(m))
             self.decrypt_thread.finished.connect(
                 lambda success, msg: QMessageBox.information(self, "完成", msg) if success else QMessageBox.critical(self, "错误", msg))
+            self.decrypt_thread.finished.connect(
+                lambda success, msg: self.open_database(db_path) if success else None)
             self.decrypt_thread.finished.connect(progress.close)
             progress.canceled.connect(self.decrypt_thread.cancel)
             
@@ -1607,13 +2628,10 @@ class DatabaseManager(QMainWindow):
                 # 查询结果显示
                 data = cursor.fetchall()
                 column_names = [description[0] for description in cursor.description]
+                # 结束查询开启的读事务，共享连接不应一直停留在事务中
+                conn.commit()
                 
-                model = QStandardItemModel()
-                model.setHorizontalHeaderLabels(column_names)
-                
-                for row in data:
-                    items = [QStandardItem(str(item) if item is not None else "NULL") for item in row]
-                    model.appendRow(items)
+                model = RowStoreModel(column_names, data)
                 
                 # 设置代理模型以支持排序
                 proxy_model = QSortFilterProxyModel()
@@ -1629,6 +2647,9 @@ class DatabaseManager(QMainWindow):
                 # 尝试可视化数据
                 self.visualize_data(data, column_names)
                 
+                # 记录查询，导出结果时重新执行以得到完整、带类型的数据
+                self.last_query = (self.current_db_path, sql)
+                
                 self.status_bar.showMessage(f"查询成功，返回 {len(data)} 行")
             else:
                 # 非查询操作
@@ -1653,6 +2674,22 @@ class DatabaseManager(QMainWindow):
             self.sql_result_tab.setCurrentIndex(1)
             self.status_bar.showMessage("SQL执行失败")
     
+    def end_pending_transaction(self, db_path):
+        """共享连接上有未结束的事务时询问是否提交，返回是否可以继续
+        
+        引擎函数不会替界面提交或回滚事务，需要连接空闲的操作（粘贴、导入、恢复、复制等）开始前调用。
+        """
+        conn = self.open_databases[db_path]
+        if not conn.in_transaction:
+            return True
+        reply = QMessageBox.question(
+            self, "未提交的事务", f"数据库 {db_path} 的连接上有未提交的事务，需要先提交才能继续。是否提交？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return False
+        conn.commit()
+        return True
+    
     def visualize_data(self, data, column_names):
         """可视化数据"""
         if not data or not column_names:
@@ -1903,9 +2940,16 @@ class DatabaseManager(QMainWindow):
         
         menu.addSeparator()
         
-        copy_action = QAction(QIcon.fromTheme("edit-copy"), "复制选中内容", self)
-        copy_action.triggered.connect(lambda: self.copy_selected_content(view))
-        menu.addAction(copy_action)
+        self.add_copy_actions(menu, view)
+        
+        paste_action = QAction(QIcon.fromTheme("edit-paste"), "粘贴行...", self)
+        paste_action.triggered.connect(lambda: self.paste_into_table(table_name, db_path))
+        menu.addAction(paste_action)
+        
+        copy_table_action = QAction(QIcon.fromTheme("edit-copy"), "复制/合并表到其他数据库...", self)
+        copy_table_action.triggered.connect(lambda: self.copy_table_to_other_database(table_name, db_path))
+        copy_table_action.setEnabled(len(self.open_databases) > 1)
+        menu.addAction(copy_table_action)
         
         menu.exec_(view.viewport().mapToGlobal(pos))
     
@@ -1913,9 +2957,7 @@ class DatabaseManager(QMainWindow):
         """显示SQL结果上下文菜单"""
         menu = QMenu()
         
-        copy_action = QAction(QIcon.fromTheme("edit-copy"), "复制选中内容", self)
-        copy_action.triggered.connect(lambda: self.copy_selected_content(self.sql_result_table))
-        menu.addAction(copy_action)
+        self.add_copy_actions(menu, self.sql_result_table)
         
         export_action = QAction(QIcon.fromTheme("document-save-as"), "导出结果...", self)
         export_action.triggered.connect(self.export_query_results)
@@ -1959,86 +3001,303 @@ class DatabaseManager(QMainWindow):
         self.visualize_data(data, column_names)
         self.sql_result_tab.setCurrentIndex(2)
     
-    def copy_selected_content(self, view):
-        """复制选中内容"""
-        selection = view.selectionModel()
-        if not selection.hasSelection():
+    def copy_selected_content(self, view=None, format='tsv'):
+        """按指定格式复制选中内容（默认带表头的制表符分隔文本）
+        
+        表格模型保存了原始行数据时直接读取带类型的值；内容较多时在后台格式化，很大时先确认。
+        """
+        if not isinstance(view, QAbstractItemView):
+            # 从编辑菜单或快捷键触发时复制当前焦点控件的内容
+            view = QApplication.focusWidget()
+            if not isinstance(view, QAbstractItemView):
+                if hasattr(view, 'copy'):
+                    view.copy()
+                return
+        
+        selection = view.selectionModel()
+        if selection is None or not selection.hasSelection():
+            return
+        
+        # 由选择区域得到行、列，避免为每个单元格创建索引
+        rows = set()
+        cols = set()
+        for selection_range in selection.selection():
+            rows.update(range(selection_range.top(), selection_range.bottom() + 1))
+            cols.update(range(selection_range.left(), selection_range.right() + 1))
+        rows = sorted(rows)
+        cols = sorted(cols)
+        
+        model = view.model()
+        if isinstance(model, QSortFilterProxyModel):
+            source = model.sourceModel()
+            source_rows = [model.mapToSource(model.index(row, 0)).row() for row in rows]
+        else:
+            source = model
+            source_rows = rows
+        
+        if isinstance(source, RowStoreModel):
+            columns = [source.columns[col] for col in cols]
+            data = [[source.rows[row][col] for col in cols] for row in source_rows]
+            table_name = source.table_name or "query_result"
+        else:
+            columns = [str(source.headerData(col, Qt.Horizontal)) for col in cols]
+            data = [[source.data(source.index(row, col)) for col in cols] for row in source_rows]
+            table_name = "table"
+        
+        if len(data) * len(columns) < 50000:
+            QApplication.clipboard().setText(format_rows(columns, data, format, table_name))
+            return
+        
+        size = estimate_text_size(columns, data)
+        if size > 50 * 1024 * 1024:
+            reply = QMessageBox.question(
+                self, "确认复制",
+                f"选中了 {len(data)} 行、{len(columns)} 列，复制的内容约 {size / 1024 / 1024:.0f} MB，"
+                "可能占用较多内存。是否继续？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        
+        self.status_bar.showMessage(f"正在复制 {len(data)} 行...")
+        self.copy_thread = CopyFormatThread(columns, data, format, table_name)
+        self.copy_thread.finished.connect(self.on_copy_finished)
+        self.copy_thread.start()
+    
+    def on_copy_finished(self, success, text):
+        """后台格式化完成后写入剪贴板"""
+        if success:
+            QApplication.clipboard().setText(text)
+            self.status_bar.showMessage(f"已复制 {len(text)} 个字符")
+        else:
+            QMessageBox.critical(self, "错误", text)
+    
+    def add_copy_actions(self, menu, view):
+        """在上下文菜单中添加“复制选中内容”和“复制为”子菜单"""
+        copy_action = QAction(QIcon.fromTheme("edit-copy"), "复制选中内容", self)
+        copy_action.triggered.connect(lambda: self.copy_selected_content(view))
+        menu.addAction(copy_action)
+        
+        copy_as_menu = menu.addMenu("复制为")
+        for copy_format, title in COPY_FORMATS:
+            action = QAction(title, self)
+            action.triggered.connect(lambda _, f=copy_format: self.copy_selected_content(view, f))
+            copy_as_menu.addAction(action)
+    
+    def paste_content(self):
+        """粘贴内容：焦点在表数据视图时将剪贴板中的表格数据写入该表，否则粘贴到SQL编辑器"""
+        view = QApplication.focusWidget()
+        if isinstance(view, QTableView) and self.current_db_path:
+            model = view.model()
+            source = model.sourceModel() if isinstance(model, QSortFilterProxyModel) else model
+            if isinstance(source, RowStoreModel) and source.table_name:
+                self.paste_into_table(source.table_name, self.current_db_path)
+                return
+        
+        clipboard = QApplication.clipboard()
+        text = clipboard.text()
+        if text:
+            self.sql_editor.insertPlainText(text)
+    
+    def paste_into_table(self, table_name, db_path):
+        """将剪贴板中的 TSV/CSV 数据按表头映射后批量写入表"""
+        if db_path not in self.open_databases:
+            QMessageBox.warning(self, "警告", "请先打开数据库")
+            return
+        
+        rows = parse_clipboard_table(QApplication.clipboard().text())
+        if not rows:
+            QMessageBox.warning(self, "警告", "剪贴板中没有表格数据")
+            return
+        
+        conn = self.open_databases[db_path]
+        table_columns = [col[1] for col in conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})")]
+        has_header, mapping = map_paste_columns(table_columns, rows[0])
+        if not mapping:
+            QMessageBox.warning(self, "警告", "无法将粘贴的列对应到表的列")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"粘贴到表 {table_name}")
+        
+        layout = QFormLayout()
+        dialog.setLayout(layout)
+        
+        row_count = len(rows) - 1 if has_header else len(rows)
+        mapping_text = ", ".join(f"{rows[0][index] if has_header else index + 1} → {name}" for index, name in mapping)
+        mapping_label = QLabel(mapping_text if has_header else f"首行不是表头，按顺序对应: {mapping_text}")
+        mapping_label.setWordWrap(True)
+        layout.addRow("行数:", QLabel(str(row_count)))
+        layout.addRow("列映射:", mapping_label)
+        
+        mode_combo = QComboBox()
+        for mode, title in PASTE_MODES:
+            mode_combo.addItem(title, mode)
+        mode_combo.setCurrentIndex(max(0, mode_combo.findData(self.settings.value("pasteMode", "insert"))))
+        layout.addRow("写入方式:", mode_combo)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addRow(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self.settings.setValue("pasteMode", mode_combo.currentData())
+        if not self.end_pending_transaction(db_path):
+            return
+        
+        try:
+            start = time.time()
+            count, _ = paste_rows(conn, table_name, rows, mode_combo.currentData())
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"粘贴失败，未写入任何数据:\n{str(e)}")
+            return
+        
+        # 刷新当前数据库
+        current_index = self.db_tab_widget.currentIndex()
+        if current_index >= 0:
+            self.db_tab_widget.widget(current_index).load_tables()
+        self.status_bar.showMessage(f"已向表 {table_name} 写入 {count} 行，用时 {time.time() - start:.2f} 秒")
+    
+    def copy_table_to_other_database(self, table_name, db_path):
+        """将表复制或合并到另一个已打开的数据库"""
+        targets = [path for path in self.open_databases if path != db_path]
+        if not targets:
+            QMessageBox.warning(self, "警告", "请先打开目标数据库")
+            return
+        if db_path in self.encrypted_databases and all(path in self.encrypted_databases for path in targets):
+            QMessageBox.warning(self, "警告", "两个加密数据库都在内存中打开，无法直接复制")
             return
         
-        selected_indexes = view.selectionModel().selectedIndexes()
-        if not selected_indexes:
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"复制表 {table_name}")
+        
+        layout = QFormLayout()
+        dialog.setLayout(layout)
+        
+        target_combo = QComboBox()
+        for path in targets:
+            target_combo.addItem(os.path.basename(path), path)
+            target_combo.setItemData(target_combo.count() - 1, path, Qt.ToolTipRole)
+        layout.addRow("目标数据库:", target_combo)
+        
+        name_edit = QLineEdit(table_name)
+        layout.addRow("目标表:", name_edit)
+        
+        policy_combo = QComboBox()
+        for policy, title in TABLE_COPY_POLICIES:
+            policy_combo.addItem(title, policy)
+        policy_combo.setCurrentIndex(max(0, policy_combo.findData(self.settings.value("tableCopyPolicy", "ignore"))))
+        layout.addRow("冲突处理:", policy_combo)
+        
+        create_check = QCheckBox("目标表不存在时按源表结构创建（包括索引）")
+        create_check.setChecked(True)
+        layout.addRow(create_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addRow(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted:
             return
+        target_path = target_combo.currentData()
+        target_table = name_edit.text().strip() or table_name
+        self.settings.setValue("tableCopyPolicy", policy_combo.currentData())
         
-        # 获取行和列范围
-        rows = sorted(set(index.row() for index in selected_indexes))
-        cols = sorted(set(index.column() for index in selected_indexes))
+        if db_path in self.encrypted_databases and target_path in self.encrypted_databases:
+            QMessageBox.warning(self, "警告", "两个加密数据库都在内存中打开，无法直接复制")
+            return
         
-        # 获取表头
-        model = view.model()
-        headers = [model.headerData(col, Qt.Horizontal) for col in cols]
+        # 界面连接上未结束的事务会阻塞复制线程
+        for path in (db_path, target_path):
+            if not self.end_pending_transaction(path):
+                return
         
-        # 获取数据
-        data = []
-        for row in rows:
-            row_data = []
-            for col in cols:
-                index = model.index(row, col)
-                row_data.append(str(model.data(index)))
-            data.append(row_data)
+        # 内存中打开的加密数据库只能使用共享连接
+        source_conn = self.open_databases[db_path] if db_path in self.encrypted_databases else None
+        target_conn = self.open_databases[target_path] if target_path in self.encrypted_databases else None
+        self.table_copy_thread = TableCopyThread(
+            db_path, target_path, table_name, target_table, policy_combo.currentData(), create_check.isChecked(),
+            source_conn=source_conn, target_conn=target_conn)
         
-        # 格式化为文本
-        text = "\t".join(headers) + "\n"
-        for row in data:
-            text += "\t".join(row) + "\n"
+        # 创建进度对话框
+        progress = QProgressDialog(f"正在复制表 {table_name}...", "取消", 0, 100, self)
+        progress.setWindowTitle("复制表")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
         
-        # 复制到剪贴板
-        clipboard = QApplication.clipboard()
-        clipboard.setText(text.strip())
-    
-    def paste_content(self):
-        """粘贴内容到SQL编辑器"""
-        clipboard = QApplication.clipboard()
-        text = clipboard.text()
-        if text:
-            self.sql_editor.insertPlainText(text)
+        # 连接信号
+        self.table_copy_thread.progress.connect(progress.setValue)
+        self.table_copy_thread.progress.connect(lambda v, msg: progress.setLabelText(msg))
+        self.table_copy_thread.finished.connect(progress.close)
+        self.table_copy_thread.finished.connect(
+            lambda success, msg: self.on_restore_finished(target_path, success, msg))
+        progress.canceled.connect(self.table_copy_thread.cancel)
+        
+        # 开始复制
+        self.table_copy_thread.start()
     
     def export_query_results(self):
-        """导出查询结果"""
-        model = self.sql_result_table.model()
-        if not model or model.rowCount() == 0:
+        """导出查询结果：在后台连接上重新执行最近一次查询，流式写入文件"""
+        if not self.last_query or self.last_query[0] not in self.open_databases:
             QMessageBox.warning(self, "警告", "没有可导出的数据")
             return
+        db_path, sql = self.last_query
+        
+        filters = "CSV文件 (*.csv *.csv.gz);;JSON Lines文件 (*.jsonl *.jsonl.gz);;SQL文件 (*.sql *.sql.gz)"
+        if load_pyarrow() is not None:
+            filters += ";;Parquet文件 (*.parquet);;Arrow IPC文件 (*.arrow)"
         
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "导出查询结果", "", 
-            "CSV文件 (*.csv);;文本文件 (*.txt);;所有文件 (*)", 
+            self, "导出查询结果", self.settings.value("lastExportDir", ""), 
+            filters + ";;所有文件 (*)", 
             options=options
         )
         
-        if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                    writer = csv.writer(f)
-                    
-                    # 写入表头
-                    headers = [model.headerData(col, Qt.Horizontal) for col in range(model.columnCount())]
-                    writer.writerow(headers)
-                    
-                    # 写入数据
-                    for row in range(model.rowCount()):
-                        row_data = []
-                        for col in range(model.columnCount()):
-                            index = model.index(row, col)
-                            value = model.data(index)
-                            row_data.append(value if value is not None else "")
-                        
-                        writer.writerow(row_data)
-                
-                QMessageBox.information(self, "成功", f"查询结果已导出到 {file_path}")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"导出失败:\n{str(e)}")
+        if not file_path:
+            return
+        self.settings.setValue("lastExportDir", os.path.dirname(file_path))
+        
+        lower_path = file_path.lower()
+        export_options = {}
+        if lower_path.endswith(('.jsonl', '.jsonl.gz')):
+            file_format = 'jsonl'
+        elif lower_path.endswith(('.sql', '.sql.gz')):
+            file_format = 'sql'
+        else:
+            file_format = self.columnar_export_format(file_path) or 'csv'
+            if file_format == 'csv':
+                export_options = self.csv_export_options_dialog()
+                if export_options is None:
+                    return
+        
+        # 内存中打开的加密数据库只能使用共享连接
+        conn = self.open_databases[db_path] if db_path in self.encrypted_databases else None
+        self.query_export_thread = QueryExportThread(db_path, sql, file_path, file_format, export_options, conn)
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在导出查询结果...", "取消", 0, 100, self)
+        progress.setWindowTitle("导出查询结果")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        def on_finished(success, message):
+            progress.close()
+            if success:
+                QMessageBox.information(self, "成功", message)
+            else:
+                QMessageBox.critical(self, "错误", message)
+        
+        # 连接信号
+        self.query_export_thread.progress.connect(progress.setValue)
+        self.query_export_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.query_export_thread.finished.connect(on_finished)
+        progress.canceled.connect(self.query_export_thread.cancel)
+        
+        # 开始导出
+        self.query_export_thread.start()
     
     def create_table_dialog(self):
         """创建表对话框"""
@@ -2988,143 +4247,127 @@ class DatabaseManager(QMainWindow):
             QMessageBox.warning(self, "警告", "请先打开数据库")
             return
         
+        filters = ("SQL文件 (*.sql *.sql.gz);;CSV文件，每表一个 (*.csv *.csv.gz);;CSV压缩包 (*.zip);;"
+                   "JSON Lines文件，每表一个 (*.jsonl *.jsonl.gz)")
+        if load_pyarrow() is not None:
+            filters += ";;Parquet文件，每表一个 (*.parquet);;Arrow IPC文件，每表一个 (*.arrow)"
+        
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(
             self, "导出数据", 
             self.settings.value("lastExportDir", ""),
-            "SQL文件 (*.sql);;CSV文件 (*.csv);;所有文件 (*)", 
+            filters + ";;所有文件 (*)", 
             options=options
         )
         
         if file_path:
             self.settings.setValue("lastExportDir", os.path.dirname(file_path))
-            try:
-                if file_path.endswith('.sql'):
-                    self.export_to_sql(file_path)
-                else:
-                    self.export_to_csv(file_path)
-                
-                QMessageBox.information(self, "成功", f"数据已导出到 {file_path}")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"导出失败:\n{str(e)}")
+            file_format, target, export_options = export_plan(file_path)
+            if file_format == 'csv':
+                csv_options = self.csv_export_options_dialog()
+                if csv_options is None:
+                    return
+                export_options.update(csv_options)
+            self.start_export(self.current_db_path, target, format=file_format, options=export_options)
     
-    def export_to_sql(self, file_path):
-        """导出为SQL文件"""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write("-- SQLite 数据库导出\n")
-            f.write(f"-- 导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"-- 数据库: {self.current_db_path}\n\n")
-            
-            conn = self.open_databases[self.current_db_path]
-            cursor = conn.cursor()
-            
-            # 导出表结构
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-            tables_result = cursor.fetchall()
-            tables = [row[0] for row in tables_result] if tables_result else []
-            
-            for table in tables:
-                # 获取表结构SQL
-                cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table}'")
-                result = cursor.fetchone()
-                create_sql = result[0] if result else ""
-                
-                f.write(f"-- 表: {table}\n")
-                f.write(f"{create_sql};\n\n")
-                
-                # 获取表数据
-                cursor.execute(f"SELECT * FROM {table}")
-                data = cursor.fetchall()
-                
-                if data:
-                    # 获取列名
-                    cursor.execute(f"PRAGMA table_info({table})")
-                    columns_result = cursor.fetchall()
-                    columns = [col[1] for col in columns_result] if columns_result else []
-                    
-                    f.write(f"-- 数据: {table} ({len(data)} 行)\n")
-                    
-                    for row in data:
-                        values = []
-                        for value in row:
-                            if value is None:
-                                values.append("NULL")
-                            elif isinstance(value, (int, float)):
-                                values.append(str(value))
-                            else:
-                                escaped_value = str(value).replace("'", "''")
-                                values.append(f"'{escaped_value}'")
-                        
-                        f.write(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)});\n")
-                    
-                    f.write("\n")
-            
-            # 导出索引
-            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL ORDER BY name")
-            indexes_result = cursor.fetchall()
-            
-            if indexes_result:
-                f.write("-- 索引\n")
-                for idx in indexes_result:
-                    f.write(f"{idx[1]};\n")
-                
-                f.write("\n")
-            
-            # 导出视图
-            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='view' ORDER BY name")
-            views_result = cursor.fetchall()
-            
-            if views_result:
-                f.write("-- 视图\n")
-                for view in views_result:
-                    f.write(f"{view[1]};\n")
-                
-                f.write("\n")
-            
-            # 导出触发器
-            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger' ORDER BY name")
-            triggers_result = cursor.fetchall()
-            
-            if triggers_result:
-                f.write("-- 触发器\n")
-                for trigger in triggers_result:
-                    f.write(f"{trigger[1]};\n")
+    def columnar_export_format(self, file_path):
+        """根据扩展名判断是否导出为 Parquet/Arrow IPC，返回格式名或 None"""
+        extension = os.path.splitext(file_path)[1].lower()
+        for file_format, format_extension in COLUMNAR_EXPORT_EXTENSIONS.items():
+            if extension == format_extension:
+                return file_format
+        return None
     
-    def export_to_csv(self, file_path):
-        """导出为CSV文件"""
-        with open(file_path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            
-            conn = self.open_databases[self.current_db_path]
-            cursor = conn.cursor()
-            
-            # 获取所有表
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            for table in tables:
-                # 写入表名
-                writer.writerow([f"表: {table}"])
-                
-                # 获取表数据
-                cursor.execute(f"SELECT * FROM {table}")
-                data = cursor.fetchall()
-                
-                if data:
-                    # 获取列名
-                    cursor.execute(f"PRAGMA table_info({table})")
-                    columns = [col[1] for col in cursor.fetchall()]
-                    
-                    # 写入列名
-                    writer.writerow(columns)
-                    
-                    # 写入数据
-                    for row in data:
-                        writer.writerow(row)
-                
-                # 添加空行分隔表
-                writer.writerow([])
+    def csv_export_options_dialog(self):
+        """CSV导出选项：分隔符、引号、编码和表头；取消时返回 None"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("CSV导出选项")
+        
+        layout = QFormLayout()
+        dialog.setLayout(layout)
+        
+        delimiters = [("逗号", ','), ("制表符", '\t'), ("分号", ';'), ("竖线", '|')]
+        delimiter_combo = QComboBox()
+        delimiter_combo.addItems([name for name, _ in delimiters])
+        delimiter_combo.setCurrentIndex(int(self.settings.value("csvExportDelimiter", 0)))
+        layout.addRow("分隔符:", delimiter_combo)
+        
+        quote_all_check = QCheckBox("所有字段都加引号")
+        quote_all_check.setChecked(self.settings.value("csvExportQuoteAll", False, type=bool))
+        layout.addRow("", quote_all_check)
+        
+        encoding_combo = QComboBox()
+        encoding_combo.setEditable(True)
+        encoding_combo.addItems(["utf-8", "utf-8-sig", "gbk"])
+        encoding_combo.setCurrentText(self.settings.value("csvExportEncoding", "utf-8"))
+        encoding_combo.setToolTip("utf-8-sig 带 BOM，便于 Excel 正确识别中文")
+        layout.addRow("编码:", encoding_combo)
+        
+        header_check = QCheckBox("第一行写入列名")
+        header_check.setChecked(self.settings.value("csvExportHeader", True, type=bool))
+        layout.addRow("", header_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addRow(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        
+        encoding = encoding_combo.currentText().strip() or "utf-8"
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            QMessageBox.warning(self, "警告", f"不支持的编码: {encoding}")
+            return None
+        
+        self.settings.setValue("csvExportDelimiter", delimiter_combo.currentIndex())
+        self.settings.setValue("csvExportQuoteAll", quote_all_check.isChecked())
+        self.settings.setValue("csvExportEncoding", encoding)
+        self.settings.setValue("csvExportHeader", header_check.isChecked())
+        
+        dialect = {
+            'delimiter': delimiters[delimiter_combo.currentIndex()][1],
+            'quoting': csv.QUOTE_ALL if quote_all_check.isChecked() else csv.QUOTE_MINIMAL,
+        }
+        return {'encoding': encoding, 'dialect': dialect, 'header': header_check.isChecked()}
+    
+    def start_export(self, db_path, file_path, tables=None, format='sql', options=None):
+        """在后台线程中导出为 SQL 脚本或 CSV（.gz 扩展名时 gzip 压缩）
+        
+        多个表时各表在独立的只读连接上并行导出；内存中打开的加密数据库只能使用共享连接依次导出。
+        """
+        conn = self.open_databases[db_path] if db_path in self.encrypted_databases else None
+        if tables is None:
+            table_count = self.open_databases[db_path].execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type='table'").fetchone()[0]
+        else:
+            table_count = len(tables)
+        self.export_thread = DataExportThread(db_path, file_path, tables, format, options, conn,
+                                              default_export_workers(table_count))
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在导出数据...", "取消", 0, 100, self)
+        progress.setWindowTitle("导出数据")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        def on_finished(success, message):
+            progress.close()
+            if success:
+                QMessageBox.information(self, "成功", message)
+            else:
+                QMessageBox.critical(self, "错误", message)
+        
+        # 连接信号
+        self.export_thread.progress.connect(progress.setValue)
+        self.export_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.export_thread.finished.connect(on_finished)
+        progress.canceled.connect(self.export_thread.cancel)
+        
+        # 开始导出
+        self.export_thread.start()
     
     def export_table_data(self, table_name, db_path):
         """导出表数据"""
@@ -3132,92 +4375,26 @@ class DatabaseManager(QMainWindow):
             QMessageBox.warning(self, "警告", "请先打开数据库")
             return
         
+        filters = "CSV文件 (*.csv *.csv.gz);;SQL文件 (*.sql *.sql.gz);;JSON Lines文件 (*.jsonl *.jsonl.gz)"
+        if load_pyarrow() is not None:
+            filters += ";;Parquet文件 (*.parquet);;Arrow IPC文件 (*.arrow)"
+        
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(
             self, f"导出表 {table_name} 数据", 
             f"{table_name}.csv",
-            "CSV文件 (*.csv);;SQL文件 (*.sql);;所有文件 (*)", 
+            filters + ";;所有文件 (*)", 
             options=options
         )
         
         if file_path:
-            try:
-                if file_path.endswith('.sql'):
-                    self.export_table_to_sql(table_name, db_path, file_path)
-                else:
-                    self.export_table_to_csv(table_name, db_path, file_path)
-                
-                QMessageBox.information(self, "成功", f"表数据已导出到 {file_path}")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"导出失败:\n{str(e)}")
-    
-    def export_table_to_sql(self, table_name, db_path, file_path):
-        """导出表为SQL文件"""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write("-- SQLite 表数据导出\n")
-            f.write(f"-- 导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"-- 表: {table_name}\n")
-            f.write(f"-- 数据库: {db_path}\n\n")
-            
-            conn = self.open_databases[db_path]
-            cursor = conn.cursor()
-            
-            # 获取表结构SQL
-            cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-            result = cursor.fetchone()
-            create_sql = result[0] if result else ""
-            
-            f.write(f"{create_sql};\n\n")
-            
-            # 获取表数据
-            cursor.execute(f"SELECT * FROM {table_name}")
-            data = cursor.fetchall()
-            
-            if data:
-                # 获取列名
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns_result = cursor.fetchall()
-                columns = [col[1] for col in columns_result] if columns_result else []
-                
-                f.write(f"-- 数据: {table_name} ({len(data)} 行)\n")
-                
-                for row in data:
-                    values = []
-                    for value in row:
-                        if value is None:
-                            values.append("NULL")
-                        elif isinstance(value, (int, float)):
-                            values.append(str(value))
-                        else:
-                            escaped_value = str(value).replace("'", "''")
-                            values.append(f"'{escaped_value}'")
-                    
-                    f.write(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(values)});\n")
-    
-    def export_table_to_csv(self, table_name, db_path, file_path):
-        """导出表为CSV文件"""
-        with open(file_path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            
-            conn = self.open_databases[db_path]
-            cursor = conn.cursor()
-            
-            # 获取表数据
-            cursor.execute(f"SELECT * FROM {table_name}")
-            data = cursor.fetchall()
-            
-            if data:
-                # 获取列名
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [col[1] for col in cursor.fetchall()]
-                
-                # 写入列名
-                writer.writerow(columns)
-                
-                # 写入数据
-                for row in data:
-                    writer.writerow(row)
+            file_format, target, export_options = export_plan(file_path, single_table=True)
+            if file_format == 'csv':
+                csv_options = self.csv_export_options_dialog()
+                if csv_options is None:
+                    return
+                export_options.update(csv_options)
+            self.start_export(db_path, target, [table_name], file_format, export_options)
     
     def import_data_dialog(self):
         """导入数据对话框"""
@@ -3229,96 +4406,377 @@ class DatabaseManager(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "导入数据", 
             self.settings.value("lastImportDir", ""),
-            "SQL文件 (*.sql);;CSV文件 (*.csv);;所有文件 (*)", 
+            "SQL文件 (*.sql);;CSV文件 (*.csv);;JSON Lines文件 (*.jsonl *.ndjson);;所有文件 (*)", 
             options=options
         )
         
         if file_path:
             self.settings.setValue("lastImportDir", os.path.dirname(file_path))
-            try:
-                if file_path.endswith('.sql'):
-                    self.import_from_sql(file_path)
-                else:
-                    self.import_from_csv(file_path)
-                
-                # 刷新当前数据库
-                current_index = self.db_tab_widget.currentIndex()
-                if current_index >= 0:
-                    self.db_tab_widget.widget(current_index).load_tables()
-                
-                QMessageBox.information(self, "成功", f"数据已从 {file_path} 导入")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"导入失败:\n{str(e)}")
+            
+            # 在后台线程中导入，完成后由 on_import_finished 刷新
+            if file_path.endswith('.sql'):
+                self.import_from_sql(file_path)
+            elif file_path.lower().endswith(('.jsonl', '.ndjson')):
+                self.import_from_jsonl(file_path)
+            else:
+                self.import_from_csv(file_path)
+    
+    def on_import_finished(self, success, message):
+        """导入完成后刷新当前数据库并提示结果（失败时也可能保留了部分数据）"""
+        current_index = self.db_tab_widget.currentIndex()
+        if current_index >= 0:
+            self.db_tab_widget.widget(current_index).load_tables()
+        self.update_database_stats(self.current_db_path)
+        
+        if success:
+            QMessageBox.information(self, "成功", message)
+        else:
+            QMessageBox.critical(self, "错误", message)
     
     def import_from_sql(self, file_path):
-        """从SQL文件导入"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            sql_script = f.read()
+        """从SQL文件导入（逐条流式执行）"""
+        # 导入选项
+        dialog = QDialog(self)
+        dialog.setWindowTitle("SQL导入选项")
         
-        conn = self.open_databases[self.current_db_path]
-        cursor = conn.cursor()
-        cursor.execute("BEGIN")
-        cursor.executescript(sql_script)
-        conn.commit()
+        form_layout = QFormLayout()
+        dialog.setLayout(form_layout)
+        
+        savepoint_spin = QSpinBox()
+        savepoint_spin.setRange(1, 1000000)
+        savepoint_spin.setSingleStep(1000)
+        savepoint_spin.setValue(self.settings.value("sqlImportSavepointEvery", 1000, type=int))
+        savepoint_spin.setToolTip("每执行这么多条语句设置一个保存点")
+        form_layout.addRow("保存点间隔（语句数）:", savepoint_spin)
+        
+        keep_check = QCheckBox("出错或取消时保留已完成的部分（回滚到最近的保存点）")
+        keep_check.setChecked(self.settings.value("sqlImportKeepPartial", False, type=bool))
+        form_layout.addRow(keep_check)
+        
+        bulk_check = QCheckBox("导入期间使用批量加载模式 (synchronous=OFF, journal_mode=MEMORY)")
+        bulk_check.setChecked(self.settings.value("sqlImportBulkLoad", False, type=bool))
+        bulk_check.setToolTip("显著加快导入，但导入过程中断电可能损坏数据库")
+        form_layout.addRow(bulk_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        form_layout.addRow(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        
+        self.settings.setValue("sqlImportSavepointEvery", savepoint_spin.value())
+        self.settings.setValue("sqlImportKeepPartial", keep_check.isChecked())
+        self.settings.setValue("sqlImportBulkLoad", bulk_check.isChecked())
+        
+        if not self.end_pending_transaction(self.current_db_path):
+            return
+        
+        # 创建导入线程
+        self.import_thread = SqlImportThread(
+            self.open_databases[self.current_db_path], file_path,
+            savepoint_every=savepoint_spin.value(), keep_partial=keep_check.isChecked(),
+            bulk_load=bulk_check.isChecked())
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在导入SQL...", "取消", 0, 100, self)
+        progress.setWindowTitle("导入数据")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        # 连接信号
+        self.import_thread.progress.connect(progress.setValue)
+        self.import_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.import_thread.finished.connect(progress.close)
+        self.import_thread.finished.connect(self.on_import_finished)
+        progress.canceled.connect(self.import_thread.cancel)
+        
+        # 开始导入
+        self.import_thread.start()
     
     def import_from_csv(self, file_path):
-        """从CSV文件导入"""
+        """从CSV文件导入（先预览可编辑的表结构，再流式、分批写入）"""
+        # 导入选项
+        dialog = QDialog(self)
+        dialog.setWindowTitle("CSV导入 - 表结构预览")
+        dialog.resize(800, 560)
+        
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+        
+        form_layout = QFormLayout()
+        layout.addLayout(form_layout)
+        
         # 获取文件名作为表名
-        table_name = os.path.splitext(os.path.basename(file_path))[0]
+        table_edit = QLineEdit(os.path.splitext(os.path.basename(file_path))[0])
+        form_layout.addRow("表名:", table_edit)
+        
+        encoding_combo = QComboBox()
+        encoding_combo.setEditable(True)
+        encoding_combo.addItems(["utf-8", "utf-8-sig", "gbk", "latin-1"])
+        form_layout.addRow("编码:", encoding_combo)
+        
+        header_check = QCheckBox("首行为表头")
+        form_layout.addRow(header_check)
+        
+        sample_spin = QSpinBox()
+        sample_spin.setRange(10, 1000000)
+        sample_spin.setValue(self.settings.value("csvImportSampleSize", 1000, type=int))
+        sample_spin.setToolTip("从整个文件中等概率抽取的行数，用于推断列类型")
+        analyze_button = QPushButton("重新分析")
+        sample_layout = QHBoxLayout()
+        sample_layout.addWidget(sample_spin)
+        sample_layout.addWidget(analyze_button)
+        form_layout.addRow("样本行数:", sample_layout)
+        
+        format_label = QLabel()
+        form_layout.addRow("格式:", format_label)
+        
+        # 列定义，列名与类型可编辑
+        schema_view = QTableView()
+        schema_model = QStandardItemModel()
+        schema_view.setModel(schema_model)
+        schema_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        schema_view.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(schema_view)
+        
+        analysis = {}
+        
+        def analyze(encoding=None, has_header=None):
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                result = analyze_csv_file(file_path, encoding, has_header, sample_spin.value())
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"无法分析CSV文件:\n{str(e)}")
+                return
+            finally:
+                QApplication.restoreOverrideCursor()
+            
+            analysis.clear()
+            analysis.update(result)
+            if encoding_combo.findText(result['encoding']) < 0:
+                encoding_combo.addItem(result['encoding'])
+            encoding_combo.setCurrentText(result['encoding'])
+            header_check.setChecked(result['has_header'])
+            
+            delimiter = {'\t': "制表符", ' ': "空格"}.get(result['dialect']['delimiter'], result['dialect']['delimiter'])
+            format_label.setText(f"分隔符: {delimiter}    引号: {result['dialect']['quotechar']}    "
+                                 f"约 {result['row_count']} 行数据")
+            
+            schema_model.clear()
+            schema_model.setHorizontalHeaderLabels(["列名", "类型", "空值率", "最大长度", "示例"])
+            for column in result['columns']:
+                items = [QStandardItem(column['name']), QStandardItem(column['type']),
+                         QStandardItem(f"{column['null_rate']:.1%}"), QStandardItem(str(column['max_length'])),
+                         QStandardItem(column['example'])]
+                for item in items[2:]:
+                    item.setEditable(False)
+                schema_model.appendRow(items)
+            schema_view.resizeColumnsToContents()
+        
+        analyze_button.clicked.connect(lambda: analyze(encoding_combo.currentText(), header_check.isChecked()))
+        analyze()
+        if not analysis:
+            return
         
-        # 确认表名
-        table_name, ok = QInputDialog.getText(
-            self, "表名", "输入要导入的表名:", text=table_name
-        )
+        options_layout = QFormLayout()
+        layout.addLayout(options_layout)
+        
+        batch_spin = QSpinBox()
+        batch_spin.setRange(100, 1000000)
+        batch_spin.setSingleStep(1000)
+        batch_spin.setValue(self.settings.value("csvImportBatchSize", 10000, type=int))
+        batch_spin.setToolTip("每次 executemany 写入的行数")
+        options_layout.addRow("每批行数:", batch_spin)
+        
+        bulk_check = QCheckBox("导入期间使用批量加载模式 (synchronous=OFF, journal_mode=MEMORY)")
+        bulk_check.setChecked(self.settings.value("csvImportBulkLoad", False, type=bool))
+        bulk_check.setToolTip("显著加快导入，但导入过程中断电可能损坏数据库")
+        options_layout.addRow(bulk_check)
+        
+        workers_spin = QSpinBox()
+        workers_spin.setRange(1, os.cpu_count() or 1)
+        workers_spin.setValue(min(workers_spin.maximum(), self.settings.value("csvImportWorkers", 1, type=int)))
+        workers_spin.setToolTip("大于 1 时在记录边界上切分文件，由多个进程并行解析，适合很大的文件")
+        options_layout.addRow("解析进程数:", workers_spin)
+        
+        ordered_check = QCheckBox("保持原文件的行顺序")
+        ordered_check.setChecked(self.settings.value("csvImportOrdered", True, type=bool))
+        ordered_check.setToolTip("关闭后按解析完成的先后写入，吞吐量更高")
+        options_layout.addRow(ordered_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
         
-        if not ok or not table_name:
+        if dialog.exec_() != QDialog.Accepted or not table_edit.text():
             return
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            data = list(reader)
+        # 编码或表头设置改动后未重新分析时，按当前设置重新分析一次
+        if (encoding_combo.currentText() != analysis['encoding']
+                or header_check.isChecked() != analysis['has_header']):
+            analyze(encoding_combo.currentText(), header_check.isChecked())
         
-        # 创建表
-        conn = self.open_databases[self.current_db_path]
-        cursor = conn.cursor()
-        cursor.execute("BEGIN")
-        
-        # 尝试推断列类型
-        col_types = []
-        if data:
-            for i, value in enumerate(data[0]):
-                if not value:
-                    col_types.append("TEXT")
-                    continue
-                
-                try:
-                    int(value)
-                    col_types.append("INTEGER")
-                except ValueError:
-                    try:
-                        float(value)
-                        col_types.append("REAL")
-                    except ValueError:
-                        col_types.append("TEXT")
+        columns = [(schema_model.item(row, 0).text().strip() or f"column{row + 1}",
+                    schema_model.item(row, 1).text().strip())
+                   for row in range(schema_model.rowCount())]
         
-        # 构建CREATE TABLE语句
-        create_sql = f"CREATE TABLE IF NOT EXISTS {table_name} ("
-        create_sql += ", ".join(f"{header} {col_type}" for header, col_type in zip(headers, col_types))
-        create_sql += ")"
+        self.settings.setValue("csvImportSampleSize", sample_spin.value())
+        self.settings.setValue("csvImportBatchSize", batch_spin.value())
+        self.settings.setValue("csvImportBulkLoad", bulk_check.isChecked())
+        self.settings.setValue("csvImportWorkers", workers_spin.value())
+        self.settings.setValue("csvImportOrdered", ordered_check.isChecked())
         
-        cursor.execute(create_sql)
+        if not self.end_pending_transaction(self.current_db_path):
+            return
         
-        # 插入数据
-        insert_sql = f"INSERT INTO {table_name} ({', '.join(headers)}) VALUES ({', '.join(['?']*len(headers))})"
+        # 创建导入线程
+        self.import_thread = CsvImportThread(
+            self.open_databases[self.current_db_path], file_path, table_edit.text(), columns,
+            encoding=analysis['encoding'], dialect=analysis['dialect'], has_header=analysis['has_header'],
+            batch_size=batch_spin.value(), bulk_load=bulk_check.isChecked(),
+            workers=workers_spin.value(), ordered=ordered_check.isChecked())
         
-        for row in data:
-            # 处理空值
-            row = [None if not cell else cell for cell in row]
-            cursor.execute(insert_sql, row)
+        # 创建进度对话框
+        progress = QProgressDialog("正在导入CSV...", "取消", 0, 100, self)
+        progress.setWindowTitle("导入数据")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
         
-        conn.commit()
+        # 连接信号
+        self.import_thread.progress.connect(progress.setValue)
+        self.import_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.import_thread.finished.connect(progress.close)
+        self.import_thread.finished.connect(self.on_import_finished)
+        progress.canceled.connect(self.import_thread.cancel)
+        
+        # 开始导入
+        self.import_thread.start()
+    
+    def import_from_jsonl(self, file_path):
+        """从 JSON Lines 文件导入（按前 N 条记录推断表结构，可选择导入的键并修改列名、类型）"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("JSON Lines导入 - 表结构预览")
+        dialog.resize(800, 520)
+        
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+        
+        form_layout = QFormLayout()
+        layout.addLayout(form_layout)
+        
+        table_edit = QLineEdit(os.path.splitext(os.path.basename(file_path))[0])
+        table_edit.setToolTip("表已存在时按列名写入，不存在时按下面的列定义创建")
+        form_layout.addRow("表名:", table_edit)
+        
+        sample_spin = QSpinBox()
+        sample_spin.setRange(1, 1000000)
+        sample_spin.setValue(self.settings.value("jsonlImportSampleSize", 1000, type=int))
+        sample_spin.setToolTip("读取前 N 条记录确定列和类型，之后才出现的键会被忽略")
+        analyze_button = QPushButton("重新分析")
+        sample_layout = QHBoxLayout()
+        sample_layout.addWidget(sample_spin)
+        sample_layout.addWidget(analyze_button)
+        form_layout.addRow("样本记录数:", sample_layout)
+        
+        # 列映射：勾选要导入的键，列名与类型可编辑
+        schema_view = QTableView()
+        schema_model = QStandardItemModel()
+        schema_view.setModel(schema_model)
+        schema_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        schema_view.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(schema_view)
+        
+        def analyze():
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                result = analyze_jsonl_file(file_path, sample_spin.value())
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"无法分析JSON Lines文件:\n{str(e)}")
+                return False
+            finally:
+                QApplication.restoreOverrideCursor()
+            
+            schema_model.clear()
+            schema_model.setHorizontalHeaderLabels(["JSON 键", "列名", "类型", "空值率", "示例"])
+            for column in result['columns']:
+                key_item = QStandardItem(column['key'])
+                key_item.setCheckable(True)
+                key_item.setCheckState(Qt.Checked)
+                key_item.setEditable(False)
+                items = [key_item, QStandardItem(column['name']), QStandardItem(column['type']),
+                         QStandardItem(f"{column['null_rate']:.1%}"), QStandardItem(column['example'][:100])]
+                for item in items[3:]:
+                    item.setEditable(False)
+                schema_model.appendRow(items)
+            schema_view.resizeColumnsToContents()
+            return True
+        
+        analyze_button.clicked.connect(analyze)
+        if not analyze():
+            return
+        
+        options_layout = QFormLayout()
+        layout.addLayout(options_layout)
+        
+        batch_spin = QSpinBox()
+        batch_spin.setRange(100, 1000000)
+        batch_spin.setSingleStep(1000)
+        batch_spin.setValue(self.settings.value("jsonlImportBatchSize", 10000, type=int))
+        batch_spin.setToolTip("每次 executemany 写入的行数")
+        options_layout.addRow("每批行数:", batch_spin)
+        
+        bulk_check = QCheckBox("导入期间使用批量加载模式 (synchronous=OFF, journal_mode=MEMORY)")
+        bulk_check.setChecked(self.settings.value("jsonlImportBulkLoad", False, type=bool))
+        bulk_check.setToolTip("显著加快导入，但导入过程中断电可能损坏数据库")
+        options_layout.addRow(bulk_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        
+        if dialog.exec_() != QDialog.Accepted or not table_edit.text():
+            return
+        
+        columns = [(schema_model.item(row, 0).text(),
+                    schema_model.item(row, 1).text().strip() or f"column{row + 1}",
+                    schema_model.item(row, 2).text().strip())
+                   for row in range(schema_model.rowCount())
+                   if schema_model.item(row, 0).checkState() == Qt.Checked]
+        if not columns:
+            QMessageBox.warning(self, "警告", "请至少选择一个要导入的键")
+            return
+        
+        self.settings.setValue("jsonlImportSampleSize", sample_spin.value())
+        self.settings.setValue("jsonlImportBatchSize", batch_spin.value())
+        self.settings.setValue("jsonlImportBulkLoad", bulk_check.isChecked())
+        
+        if not self.end_pending_transaction(self.current_db_path):
+            return
+        
+        # 创建导入线程
+        self.import_thread = JsonlImportThread(
+            self.open_databases[self.current_db_path], file_path, table_edit.text(), columns,
+            batch_size=batch_spin.value(), bulk_load=bulk_check.isChecked())
+        
+        # 创建进度对话框
+        progress = QProgressDialog("正在导入JSON Lines...", "取消", 0, 100, self)
+        progress.setWindowTitle("导入数据")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(True)
+        
+        # 连接信号
+        self.import_thread.progress.connect(progress.setValue)
+        self.import_thread.progress.connect(lambda v, m: progress.setLabelText(m))
+        self.import_thread.finished.connect(progress.close)
+        self.import_thread.finished.connect(self.on_import_finished)
+        progress.canceled.connect(self.import_thread.cancel)
+        
+        # 开始导入
+        self.import_thread.start()
     
     def toggle_theme(self, checked):
         """切换主题"""
@@ -3406,8 +4864,19 @@ class DatabaseManager(QMainWindow):
     
     def closeEvent(self, event):
         """关闭事件"""
+        # 内存中的加密数据库有未保存的修改时提示保存
+        for db_path in list(self.encrypted_databases):
+            if not self.confirm_close_encrypted_database(db_path):
+                event.ignore()
+                return
+        
         self.save_settings()
         
+        # 停止正在运行的计划备份
+        if self.scheduled_backup_thread and self.scheduled_backup_thread.isRunning():
+            self.scheduled_backup_thread.cancel()
+            self.scheduled_backup_thread.wait()
+        
         # 关闭所有数据库连接
         for db_path, conn in self.open_databases.items():
             conn.close()
@@ -3441,9 +4910,9 @@ if __name__ == "__main__":
     # 检查图标文件是否存在，不存在则创建
     icon_path = "icon.ico"
     if not os.path.exists(icon_path):
-        from PIL import Image, ImageDraw, ImageFont
-        
         try:
+            from PIL import Image, ImageDraw, ImageFont
+            
             # 创建一个简单的图标
             img = Image.new('RGBA', (256, 256), (70, 130, 180, 255))
             draw = ImageDraw.Draw(img)
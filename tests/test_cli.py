@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import Database_CLI as cli
+
+
+class CliTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = self.path("app.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE log (user_id INTEGER, message TEXT);
+            CREATE VIEW user_names AS SELECT name FROM users;
+            CREATE TRIGGER users_log AFTER INSERT ON users BEGIN
+                INSERT INTO log VALUES (new.id, 'created');
+            END;
+            INSERT INTO users (name) VALUES ('a'), ('b');
+        """)
+        conn.close()
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+    
+    def run_cli(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return cli.main(["--quiet", *args])
+    
+    def test_export_whole_database_includes_views(self):
+        output = self.path("dump.sql")
+        self.assertEqual(self.run_cli("export", self.db_path, output), cli.EXIT_OK)
+        with open(output, encoding='utf-8') as f:
+            dump = f.read()
+        self.assertIn("CREATE VIEW user_names", dump)
+        self.assertIn("CREATE TRIGGER users_log", dump)
+        
+        restored = self.path("restored.db")
+        self.assertEqual(self.run_cli("import", restored, output), cli.EXIT_OK)
+        conn = sqlite3.connect(restored)
+        try:
+            self.assertEqual(conn.execute("SELECT name FROM user_names ORDER BY name").fetchall(), [('a',), ('b',)])
+        finally:
+            conn.close()
+    
+    def test_missing_database_is_not_created(self):
+        missing = self.path("missing.db")
+        self.assertEqual(self.run_cli("backup", missing, self.path("missing.backup")), cli.EXIT_ERROR)
+        self.assertFalse(os.path.exists(missing))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import Database_Engine as engine
+
+
+class ColumnarExportTest(unittest.TestCase):
+    """Parquet/Arrow 导出：列类型由各列实际存储的类型决定"""
+    
+    def setUp(self):
+        if engine.load_pyarrow() is None:
+            self.skipTest("未安装 pyarrow")
+        self.pa = engine.load_pyarrow()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE t (n NUMERIC, u, d DATE)")
+        # 第一批（batch_size 行）全部是整数，不同类型的值在之后的批次中才出现
+        self.conn.executemany("INSERT INTO t VALUES (?, ?, ?)",
+                              [(i, i, "2024-01-01") for i in range(100)] + [(2.5, "abc", 20240101)])
+    
+    def tearDown(self):
+        self.conn.close()
+        self.temp_dir.cleanup()
+    
+    def read_arrow(self, file_path):
+        with self.pa.OSFile(file_path, 'rb') as source:
+            return self.pa.ipc.open_file(source).read_all()
+    
+    def test_mixed_values_after_first_batch(self):
+        file_path = os.path.join(self.temp_dir.name, "t.arrow")
+        cursor = self.conn.execute("SELECT * FROM t")
+        count = engine.write_cursor_columnar(
+            cursor, file_path, 'arrow', ["NUMERIC", None, "DATE"], batch_size=10,
+            storage_classes=engine.query_storage_classes(self.conn, "SELECT * FROM t", 3))
+        self.assertEqual(count, 101)
+        
+        table = self.read_arrow(file_path)
+        self.assertEqual([str(field.type) for field in table.schema], ["double", "string", "string"])
+        self.assertEqual(table.slice(100).to_pylist(), [{'n': 2.5, 'u': "abc", 'd': "20240101"}])
+    
+    def test_query_export_with_mixed_values(self):
+        file_path = os.path.join(self.temp_dir.name, "q.arrow")
+        count = engine.export_query(self.conn, "SELECT u, n AS m FROM t WHERE n >= 50 OR n = 2.5", file_path, 'arrow')
+        self.assertEqual(count, 51)
+        self.assertEqual([str(field.type) for field in self.read_arrow(file_path).schema], ["string", "double"])
+    
+    def test_integer_numeric_column_stays_exact(self):
+        self.conn.execute("CREATE TABLE big (n NUMERIC)")
+        self.conn.execute("INSERT INTO big VALUES (?)", (2 ** 60,))
+        file_path = os.path.join(self.temp_dir.name, "big.arrow")
+        engine.write_table_columnar(self.conn, "big", file_path, 'arrow')
+        self.assertEqual(self.read_arrow(file_path).to_pylist(), [{'n': 2 ** 60}])
+
+
+
+class SqlStatementTest(unittest.TestCase):
+    """SQL 脚本切分：起始行号为第一个不属于空白和注释的字符所在的行"""
+    
+    def statements(self, text):
+        return [(statement.strip(), line_no) for statement, line_no in engine.iter_sql_statements(io.StringIO(text))]
+    
+    def test_start_line_skips_comment_after_previous_statement(self):
+        statements = self.statements("create table z(a); -- make z\ninsert into nope values(1);\n")
+        self.assertEqual([line_no for _, line_no in statements], [1, 2])
+    
+    def test_start_line_skips_leading_comments_and_blank_lines(self):
+        statements = self.statements("-- header\n\n/* multi\nline */\nselect 1; select 2;\nselect\n3;\n")
+        self.assertEqual([line_no for _, line_no in statements], [5, 5, 6])
+    
+    def test_import_error_reports_statement_line(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "script.sql")
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write("create table z(a); -- make z\ninsert into nope values(1);\n")
+            conn = sqlite3.connect(":memory:", isolation_level=None)
+            with self.assertRaises(engine.SqlImportError) as context:
+                engine.import_sql_file(conn, file_path)
+            conn.close()
+        self.assertEqual(context.exception.line_no, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()